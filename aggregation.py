@@ -0,0 +1,191 @@
+"""
+Aggregate per-document location mentions over dense location IDs.
+
+Aggregator state can be exported as a "partial" keyed by location key, so
+shards processed by independent workers can be merged deterministically.
+"""
+
+import glob
+import os
+from array import array
+from collections import Counter, defaultdict
+
+from checkpoint import CHECKPOINT_VERSION, load_checkpoint
+from cooccurrence import CooccurrenceCounter
+from gazetteer import LocationTable
+from postings import PostingsBuilder, decode_postings, encode_postings
+
+
+def doc_id_order(doc_id):
+    """Sort key giving MongoDB's _id order: numbers, then strings, then ObjectIds."""
+    if isinstance(doc_id, (int, float)):
+        return 0, doc_id
+    if isinstance(doc_id, str):
+        return 1, doc_id
+    return 2, str(doc_id)
+
+
+class MentionCounts:
+    """Document counts and sample document _ids, indexed by location ID."""
+
+    # Sample document IDs kept per location
+    SAMPLE_SIZE = 10
+
+    def __init__(self, size=0):
+        self.counts = array('L', [0]) * size
+        self.samples = defaultdict(list)
+        # Location IDs in the order they were first mentioned
+        self.order = []
+        self.documents = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def _grow(self, size):
+        self.counts.extend(array('L', [0]) * (size - len(self.counts)))
+
+    def add(self, doc_id, loc_ids):
+        """Count one document for each distinct location ID it mentions."""
+        counts = self.counts
+        for loc_id in loc_ids:
+            if loc_id >= len(counts):
+                self._grow(loc_id + 1)
+            n = counts[loc_id] + 1
+            counts[loc_id] = n
+            if n == 1:
+                self.order.append(loc_id)
+            if n <= self.SAMPLE_SIZE:
+                self.samples[loc_id].append(doc_id)
+        self.documents += 1
+
+    def items(self):
+        """Yield (loc_id, count, sample_doc_ids) in first-mentioned order."""
+        for loc_id in self.order:
+            yield loc_id, self.counts[loc_id], self.samples[loc_id]
+
+
+def export_partial(table, mentions, postings=None, cooccurrence=None, shard=None, **stats):
+    """
+    Materialize aggregator state keyed by location key instead of ID, so
+    partial results from independent processes or machines can be merged.
+    """
+    locations = {}
+    for loc_id, count, samples in mentions.items():
+        locations[table.key(loc_id)] = {
+            'info': dict(table.record(loc_id)),
+            'count': count,
+            'samples': sorted(samples, key=doc_id_order)
+        }
+
+    partial = {
+        'version': CHECKPOINT_VERSION,
+        'shards': [shard] if shard else [],
+        'documents': mentions.documents,
+        'locations': locations,
+        'stats': [stats]
+    }
+
+    if postings is not None:
+        partial['doc_ids'] = postings.doc_ids
+        partial['postings'] = {table.key(loc_id): bytes(data)
+                               for loc_id, data in postings.data.items()}
+
+    if cooccurrence is not None:
+        partial['pairs'] = {(table.key(key >> 32), table.key(key & 0xFFFFFFFF)): n
+                            for key, n in cooccurrence.pairs.items()}
+
+    return partial
+
+
+def merge_partials(partials):
+    """
+    Merge partial results into one partial of the same shape.
+    Counts and pair counts are summed; samples keep the SAMPLE_SIZE first
+    document _ids in _id order, as a single run would; postings are remapped
+    onto the union of document _ids, also in _id order.
+    The merge is associative and independent of input order.
+    """
+    partials = sorted(partials, key=lambda p: p['shards'])
+    shards = [shard for p in partials for shard in p['shards']]
+    if len(set(shards)) != len(shards) or len({count for _, count in shards}) > 1:
+        raise ValueError(f"Cannot merge overlapping or mismatched shards: {shards}")
+
+    locations = {}
+    for partial in partials:
+        for key, loc in partial['locations'].items():
+            merged = locations.setdefault(key, {'info': loc['info'], 'count': 0, 'samples': []})
+            merged['count'] += loc['count']
+            samples = set(merged['samples']) | set(loc['samples'])
+            merged['samples'] = sorted(samples, key=doc_id_order)[:MentionCounts.SAMPLE_SIZE]
+
+    result = {
+        'version': CHECKPOINT_VERSION,
+        'shards': sorted(shards),
+        'documents': sum(p['documents'] for p in partials),
+        'locations': dict(sorted(locations.items())),
+        'stats': [s for p in partials for s in p['stats']]
+    }
+
+    if partials and all('postings' in p for p in partials):
+        doc_ids = sorted(set().union(*(p['doc_ids'] for p in partials)), key=doc_id_order)
+        ordinal_of = {doc_id: ordinal for ordinal, doc_id in enumerate(doc_ids)}
+        ordinals = defaultdict(list)
+        for partial in partials:
+            partial_ids = partial['doc_ids']
+            for key, data in partial['postings'].items():
+                ordinals[key].extend(ordinal_of[partial_ids[o]] for o in decode_postings(data))
+        result['doc_ids'] = doc_ids
+        result['postings'] = {key: encode_postings(sorted(ords))
+                              for key, ords in sorted(ordinals.items())}
+
+    if partials and all('pairs' in p for p in partials):
+        pairs = Counter()
+        for partial in partials:
+            for (a, b), n in partial['pairs'].items():
+                pairs[(a, b) if a < b else (b, a)] += n
+        result['pairs'] = dict(sorted(pairs.items()))
+
+    return result
+
+
+def import_partial(partial):
+    """
+    Rebuild aggregators from a (merged) partial, with IDs assigned in key order.
+    Returns (table, mentions, postings, cooccurrence); the last two may be None.
+    """
+    table = LocationTable()
+    mentions = MentionCounts(len(partial['locations']))
+    for key, loc in partial['locations'].items():
+        loc_id = table.intern(key, loc['info'])
+        mentions.counts[loc_id] = loc['count']
+        mentions.samples[loc_id] = list(loc['samples'])
+        mentions.order.append(loc_id)
+    mentions.documents = partial['documents']
+
+    postings = None
+    if 'postings' in partial:
+        postings = PostingsBuilder()
+        postings.doc_ids = list(partial['doc_ids'])
+        for key, data in partial['postings'].items():
+            postings.data[table.ids[key]] = bytearray(data)
+
+    cooccurrence = None
+    if 'pairs' in partial:
+        cooccurrence = CooccurrenceCounter()
+        for (a, b), n in partial['pairs'].items():
+            low, high = sorted((table.ids[a], table.ids[b]))
+            cooccurrence.pairs[low << 32 | high] = n
+
+    return table, mentions, postings, cooccurrence
+
+
+def partial_path(partial_dir, prefix, shard):
+    """File name for one shard's partial result, e.g. geography-shard-3-of-8.partial."""
+    index, count = shard
+    return os.path.join(partial_dir, f"{prefix}-shard-{index}-of-{count}.partial")
+
+
+def load_partials(partial_dir, prefix):
+    """Load every partial result for a collection prefix from partial_dir."""
+    paths = sorted(glob.glob(os.path.join(partial_dir, f"{prefix}-shard-*.partial")))
+    return [load_checkpoint(path) for path in paths]
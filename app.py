@@ -2,17 +2,110 @@
 """
 Flask backend for Geography Dashboard.
 Serves Leaflet.js map with clickable location bubbles.
+
+Set GEOGRAPHY_SNAPSHOT to a results export (e.g. data/geography_results.json,
+see snapshot.py) to answer the US location endpoints from memory instead of
+MongoDB; the file is reloaded when it changes.
+
+POST /api/extract runs extraction on demand in EXTRACT_WORKERS worker
+processes (default 2; see extract_service.py). Set EXTRACT_WARM_START to a
+directory of warm-start snapshots to start the workers from them.
+
+Heatmap tiles are served from the tile files rendered by heatmap.py in
+HEATMAP_TILES (default data/tiles).
 """
 
-from flask import Flask, render_template, jsonify, request
+import json
+import math
+import os
+from itertools import islice
+
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
 from pymongo import MongoClient
 
+from coalesce import SingleFlight, query_key
+from extract_service import ExtractionService, ExtractionUnavailable
+from generations import current_generation
+from heatmap import TileStore, tiles_path
+from indexes import LOCATION_SORT, US_LOCATION_FIELDS, WORLD_LOCATION_FIELDS
+from postings import intersect_postings, load_postings, lookup_doc_ids
+from progress import job_statuses
+from snapshot import SnapshotProvider
+from spatial import KM_PER_MILE, SpatialIndexCache
+
 app = Flask(__name__)
 
 # MongoDB connection
 client = MongoClient("mongodb://localhost:27017")
 db = client.toxic_docs
 
+# Optional in-memory snapshot of geography_counts
+SNAPSHOT_PATH = os.environ.get('GEOGRAPHY_SNAPSHOT')
+snapshot = SnapshotProvider(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+
+# Identical concurrent map queries share one MongoDB round-trip
+queries = SingleFlight()
+
+# Locations fetched per keyset page when streaming
+STREAM_PAGE_SIZE = 1000
+
+# On-demand extraction, with per-request budgets
+extraction = ExtractionService(
+    workers=int(os.environ.get('EXTRACT_WORKERS', 2)),
+    data_dir=os.environ.get('EXTRACT_DATA_DIR', 'data'),
+    warm_start_dir=os.environ.get('EXTRACT_WARM_START')
+)
+MAX_EXTRACT_TEXTS = 100
+MAX_EXTRACT_CHARS = 1000000
+MAX_EXTRACT_SECONDS = 30.0
+
+# Pre-rendered heatmap tiles (see heatmap.py)
+HEATMAP_TILES = os.environ.get('HEATMAP_TILES', 'data/tiles')
+heatmap_tiles = {prefix: TileStore(tiles_path(prefix, HEATMAP_TILES))
+                 for prefix in ('geography', 'world_geography')}
+TILE_MAX_AGE = 3600
+
+
+def location_rows(collection, fields):
+    """Loader for every location with coordinates in a collection."""
+    projection = {'_id': 0, **{field: 1 for field in fields}}
+    has_value = {'$exists': True, '$ne': None}
+    return lambda: list(db[collection].find({'lat': has_value, 'lng': has_value}, projection))
+
+
+def find_rows(collection, query, projection, limit):
+    """Rows of a find in LOCATION_SORT order, coalesced with identical concurrent finds."""
+    key = query_key('find', collection, query, projection, limit)
+    return queries.do(key, lambda: list(
+        db[collection].find(query, projection).sort(LOCATION_SORT).limit(limit)))
+
+
+def aggregate_rows(collection, pipeline):
+    """Results of an aggregation, coalesced with identical concurrent aggregations."""
+    key = query_key('aggregate', collection, pipeline)
+    return queries.do(key, lambda: list(db[collection].aggregate(pipeline)))
+
+
+def snapshot_generation():
+    """Snapshot file version; current() reloads the file first if it changed."""
+    snapshot.current()
+    return snapshot.mtime
+
+
+# Spatial indexes over location coordinates, rebuilt when results are re-stored
+spatial_indexes = {
+    'geography': SpatialIndexCache(
+        location_rows('geography_counts', US_LOCATION_FIELDS),
+        lambda: current_generation(db, 'geography')
+    ) if snapshot is None else SpatialIndexCache(
+        lambda: snapshot.current().rows, snapshot_generation
+    ),
+    'world_geography': SpatialIndexCache(
+        location_rows('world_geography_counts', WORLD_LOCATION_FIELDS),
+        lambda: current_generation(db, 'world_geography')
+    )
+}
+
 
 @app.route('/')
 def index():
@@ -20,6 +113,60 @@ def index():
     return render_template('index.html')
 
 
+def stream_options():
+    """
+    Streaming params: stream format ("ndjson" or "json", empty if not
+    streaming), an optional limit (uncapped), and the (count, location_key)
+    to resume after.
+    """
+    stream = request.args.get('stream', '').strip()
+    limit = int(request.args['limit']) if 'limit' in request.args else None
+    after = None
+    if 'after_count' in request.args:
+        after = int(request.args['after_count']), request.args.get('after_key', '')
+    return stream, limit, after
+
+
+def keyset_pages(collection, query, projection, after=None, limit=None):
+    """
+    Yield matching rows in LOCATION_SORT order, one keyset page at a time.
+    Each page starts after the last (count, location_key) seen instead of
+    skipping, so memory per request stays constant however far it reads.
+    """
+    sent = 0
+    while limit is None or sent < limit:
+        page_query = query
+        if after:
+            count, location_key = after
+            page_query = {**query, '$or': [
+                {'count': {'$lt': count}},
+                {'count': count, 'location_key': {'$gt': location_key}}
+            ]}
+        page_size = STREAM_PAGE_SIZE if limit is None else min(STREAM_PAGE_SIZE, limit - sent)
+        page = list(collection.find(page_query, projection).sort(LOCATION_SORT).limit(page_size))
+        yield from page
+        sent += len(page)
+        if len(page) < page_size:
+            break
+        after = page[-1]['count'], page[-1]['location_key']
+
+
+def stream_rows(rows, stream):
+    """Stream rows as NDJSON (one location per line) or as a JSON array."""
+    def generate():
+        if stream == 'ndjson':
+            for row in rows:
+                yield json.dumps(row) + '\n'
+        else:
+            yield '['
+            for i, row in enumerate(rows):
+                yield (',' if i else '') + json.dumps(row)
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if stream == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
 @app.route('/api/geographies')
 def get_geographies():
     """
@@ -30,12 +177,29 @@ def get_geographies():
         state: filter by state name
         county: filter by county name
         type: filter by type (place, state, county)
+        stream: "ndjson" or "json" to stream every match, without the 10000 cap
+        after_count, after_key: resume a stream after this (count, location_key)
     """
     min_count = int(request.args.get('min_count', 1))
     limit = min(int(request.args.get('limit', 5000)), 10000)
     state_filter = request.args.get('state', '').strip()
     county_filter = request.args.get('county', '').strip()
     type_filter = request.args.get('type', '').strip()
+    stream, stream_limit, after = stream_options()
+
+    if snapshot is not None and stream:
+        rows = snapshot.current().iter_locations(min_count, state_filter, county_filter,
+                                                 type_filter, after)
+        return stream_rows(islice(rows, stream_limit), stream)
+
+    if snapshot is not None:
+        results = snapshot.current().locations(min_count, limit, state_filter,
+                                               county_filter, type_filter)
+        return jsonify({
+            'locations': results,
+            'total': len(results),
+            'min_count': min_count
+        })
 
     # Build query
     query = {
@@ -53,22 +217,25 @@ def get_geographies():
     if type_filter:
         query['type'] = type_filter
 
+    projection = {
+        '_id': 0,
+        'location_key': 1,
+        'name': 1,
+        'state': 1,
+        'state_abbrev': 1,
+        'county': 1,
+        'lat': 1,
+        'lng': 1,
+        'count': 1,
+        'type': 1
+    }
+
+    if stream:
+        return stream_rows(keyset_pages(db.geography_counts, query, projection,
+                                        after, stream_limit), stream)
+
     # Fetch locations with coordinates
-    results = list(db.geography_counts.find(
-        query,
-        {
-            '_id': 0,
-            'location_key': 1,
-            'name': 1,
-            'state': 1,
-            'state_abbrev': 1,
-            'county': 1,
-            'lat': 1,
-            'lng': 1,
-            'count': 1,
-            'type': 1
-        }
-    ).sort('count', -1).limit(limit))
+    results = find_rows('geography_counts', query, projection, limit)
 
     return jsonify({
         'locations': results,
@@ -83,6 +250,9 @@ def get_filters():
     Get distinct values for filter dropdowns.
     Returns lists of unique states, counties, and types.
     """
+    if snapshot is not None:
+        return jsonify(snapshot.current().filters)
+
     states = sorted([s for s in db.geography_counts.distinct('state') if s])
     counties = sorted([c for c in db.geography_counts.distinct('county') if c])
     types = sorted(db.geography_counts.distinct('type'))
@@ -106,6 +276,9 @@ def get_counties_for_state():
     if not state:
         return jsonify([])
 
+    if snapshot is not None:
+        return jsonify(snapshot.current().counties(state))
+
     counties = sorted([c for c in db.geography_counts.distinct('county', {'state': state}) if c])
     return jsonify(counties)
 
@@ -124,6 +297,9 @@ def search_geographies():
     if len(query) < 2:
         return jsonify([])
 
+    if snapshot is not None:
+        return jsonify(snapshot.current().search(query.lower(), limit))
+
     # Search by name prefix (case-insensitive)
     results = list(db.geography_counts.find(
         {
@@ -146,9 +322,255 @@ def search_geographies():
     return jsonify(results)
 
 
+def documents_page(prefix):
+    """
+    Page of document IDs from a postings index (see postings.py).
+    Several location_key params return documents mentioning all of them.
+    """
+    location_keys = [k.strip().lower() for k in request.args.getlist('location_key') if k.strip()]
+    page = max(int(request.args.get('page', 1)), 1)
+    page_size = min(max(int(request.args.get('page_size', 50)), 1), 500)
+
+    ordinals = []
+    if location_keys:
+        ordinals = intersect_postings([load_postings(db, prefix, key) for key in location_keys])
+
+    start = (page - 1) * page_size
+    return {
+        'location_keys': location_keys,
+        'doc_ids': lookup_doc_ids(db, prefix, ordinals[start:start + page_size]),
+        'total': len(ordinals),
+        'page': page,
+        'page_size': page_size
+    }
+
+
+@app.route('/api/geographies/documents')
+def get_geography_documents():
+    """
+    List documents mentioning a location, from the postings index.
+    Query params:
+        location_key: location key (required; repeat to intersect, e.g.
+                      "midland, michigan" and "texas")
+        page: page number, starting at 1 (default 1)
+        page_size: documents per page (default 50, max 500)
+    """
+    return jsonify(documents_page('geography'))
+
+
+def related_locations(prefix):
+    """Top co-mentioned locations for a location_key (see cooccurrence.py)."""
+    location_key = request.args.get('location_key', '').strip().lower()
+    limit = min(int(request.args.get('limit', 20)), 50)
+
+    doc = db[f"{prefix}_cooccurrence"].find_one({'location_key': location_key}, {'_id': 0}) or {}
+    related = [{'location_key': key, 'count': n}
+               for key, n in zip(doc.get('related_keys', []), doc.get('counts', []))]
+
+    return {
+        'location_key': location_key,
+        'related': related[:limit]
+    }
+
+
+@app.route('/api/geographies/cooccurrence')
+def get_cooccurrence():
+    """
+    Get the locations most often mentioned in the same documents as a location.
+    Query params:
+        location_key: location key (required)
+        limit: max results (default 20, max 50)
+    """
+    return jsonify(related_locations('geography'))
+
+
+class BadParam(ValueError):
+    """A missing or invalid query param, answered with 400."""
+
+
+@app.errorhandler(BadParam)
+def bad_param(e):
+    return jsonify({'error': str(e)}), 400
+
+
+def number_arg(name, type=float, default=None):
+    """A finite numeric query param; required unless it has a default."""
+    value = request.args.get(name, type=type)
+    if value is None:
+        if name in request.args:
+            raise BadParam(f'"{name}" must be {"an integer" if type is int else "a number"}')
+        if default is None:
+            raise BadParam(f'"{name}" is required')
+        return default
+    if not math.isfinite(value):
+        raise BadParam(f'"{name}" must be a finite number')
+    return value
+
+
+def nearby_locations(prefix):
+    """Locations within a radius of a point, highest count first (see spatial.py)."""
+    lat = number_arg('lat')
+    lng = number_arg('lng')
+    if 'radius_mi' in request.args:
+        radius_km = number_arg('radius_mi') * KM_PER_MILE
+    else:
+        radius_km = number_arg('radius_km', default=50.0)
+    limit = min(number_arg('limit', int, 100), 10000)
+    min_count = number_arg('min_count', int, 1)
+
+    results = spatial_indexes[prefix].current().radius(lat, lng, radius_km, limit, min_count)
+    return {
+        'locations': results,
+        'total': len(results),
+        'radius_km': radius_km
+    }
+
+
+def nearest_locations(prefix):
+    """The k locations nearest a point, nearest first."""
+    lat = number_arg('lat')
+    lng = number_arg('lng')
+    k = min(number_arg('k', int, 10), 1000)
+    min_count = number_arg('min_count', int, 1)
+
+    results = spatial_indexes[prefix].current().nearest(lat, lng, k, min_count)
+    return {
+        'locations': results,
+        'total': len(results)
+    }
+
+
+def bbox_locations(prefix):
+    """Locations inside a bounding box, highest count first."""
+    south = number_arg('south')
+    west = number_arg('west')
+    north = number_arg('north')
+    east = number_arg('east')
+    limit = min(number_arg('limit', int, 1000), 10000)
+    min_count = number_arg('min_count', int, 1)
+
+    results = spatial_indexes[prefix].current().bbox(south, west, north, east, limit, min_count)
+    return {
+        'locations': results,
+        'total': len(results)
+    }
+
+
+@app.route('/api/geographies/nearby')
+def get_nearby_geographies():
+    """
+    Get locations within a radius of a point, ranked by mention count.
+    Query params:
+        lat, lng: center point (required)
+        radius_km: radius in kilometres (default 50), or
+        radius_mi: radius in miles
+        limit: max results (default 100, max 10000)
+        min_count: minimum mention count (default 1)
+    """
+    return jsonify(nearby_locations('geography'))
+
+
+@app.route('/api/geographies/nearest')
+def get_nearest_geographies():
+    """
+    Get the locations nearest a point, with distances.
+    Query params:
+        lat, lng: point (required)
+        k: number of locations (default 10, max 1000)
+        min_count: minimum mention count (default 1)
+    """
+    return jsonify(nearest_locations('geography'))
+
+
+@app.route('/api/geographies/bbox')
+def get_bbox_geographies():
+    """
+    Get locations inside a bounding box, ranked by mention count.
+    Query params:
+        south, west, north, east: box edges in degrees (required;
+                                  west > east crosses the antimeridian)
+        limit: max results (default 1000, max 10000)
+        min_count: minimum mention count (default 1)
+    """
+    return jsonify(bbox_locations('geography'))
+
+
+def heatmap_tile(prefix, z, x, y):
+    """
+    A heatmap tile as PNG, with an ETag that changes when the tiles are
+    rebuilt. Tiles without heat (or beyond the rendered zooms) are transparent.
+    """
+    png, version = heatmap_tiles[prefix].tile(z, x, y)
+    response = Response(png, mimetype='image/png')
+    response.set_etag(f'{version}-{z}-{x}-{y}')
+    response.cache_control.public = True
+    response.cache_control.max_age = TILE_MAX_AGE
+    return response.make_conditional(request)
+
+
+@app.route('/api/geographies/heatmap/<int:z>/<int:x>/<int:y>.png')
+def get_heatmap_tile(z, x, y):
+    """Heatmap tile of US location mentions (XYZ tile coordinates)."""
+    return heatmap_tile('geography', z, x, y)
+
+
+def rollup_rows(collection, query):
+    """Rollup documents in FIPS order, keeping the top "top" places of each."""
+    top = int(request.args.get('top', 5))
+    min_mentions = int(request.args.get('min_mentions', 1))
+    query = {**query, 'mentions': {'$gte': min_mentions}}
+    rows = []
+    for row in db[collection].find(query).sort('_id', 1):
+        del row['_id']
+        row['top_places'] = row['top_places'][:top]
+        rows.append(row)
+    return rows
+
+
+@app.route('/api/geographies/rollups/states')
+def get_state_rollups():
+    """
+    Get per-state totals for a choropleth, keyed by two-digit state FIPS code
+    (see rollups.py).
+    Query params:
+        min_mentions: minimum total mentions (default 1)
+        top: top places to include per state (default and max 5)
+    """
+    rows = rollup_rows('geography_state_rollups', {})
+    return jsonify({
+        'level': 'state',
+        'rollups': rows,
+        'total': len(rows),
+        'max_mentions': max((row['mentions'] for row in rows), default=0)
+    })
+
+
+@app.route('/api/geographies/rollups/counties')
+def get_county_rollups():
+    """
+    Get per-county totals for a choropleth, keyed by five-digit county FIPS
+    code (see rollups.py).
+    Query params:
+        state: state abbreviation, e.g. "IL" (default: all states)
+        min_mentions: minimum total mentions (default 1)
+        top: top places to include per county (default and max 5)
+    """
+    state = request.args.get('state', '').strip().upper()
+    rows = rollup_rows('geography_county_rollups', {'state_abbrev': state} if state else {})
+    return jsonify({
+        'level': 'county',
+        'rollups': rows,
+        'total': len(rows),
+        'max_mentions': max((row['mentions'] for row in rows), default=0)
+    })
+
+
 @app.route('/api/geographies/stats')
 def get_stats():
     """Get summary statistics about the geography data."""
+    if snapshot is not None:
+        return jsonify(snapshot.current().stats)
+
     total_locations = db.geography_counts.count_documents({})
     hotspots = db.geography_counts.count_documents({'count': {'$gte': 500}})
     places = db.geography_counts.count_documents({'type': 'place'})
@@ -188,10 +610,13 @@ def get_world_geographies():
         min_count: minimum mention count (default 1)
         limit: max results (default 5000)
         country: filter by country name
+        stream: "ndjson" or "json" to stream every match, without the 10000 cap
+        after_count, after_key: resume a stream after this (count, location_key)
     """
     min_count = int(request.args.get('min_count', 1))
     limit = min(int(request.args.get('limit', 5000)), 10000)
     country_filter = request.args.get('country', '').strip()
+    stream, stream_limit, after = stream_options()
 
     # Build query
     query = {
@@ -203,22 +628,25 @@ def get_world_geographies():
     if country_filter:
         query['country'] = country_filter
 
+    projection = {
+        '_id': 0,
+        'location_key': 1,
+        'name': 1,
+        'country': 1,
+        'country_code': 1,
+        'lat': 1,
+        'lng': 1,
+        'count': 1,
+        'population': 1,
+        'type': 1
+    }
+
+    if stream:
+        return stream_rows(keyset_pages(db.world_geography_counts, query, projection,
+                                        after, stream_limit), stream)
+
     # Fetch locations with coordinates
-    results = list(db.world_geography_counts.find(
-        query,
-        {
-            '_id': 0,
-            'location_key': 1,
-            'name': 1,
-            'country': 1,
-            'country_code': 1,
-            'lat': 1,
-            'lng': 1,
-            'count': 1,
-            'population': 1,
-            'type': 1
-        }
-    ).sort('count', -1).limit(limit))
+    results = find_rows('world_geography_counts', query, projection, limit)
 
     return jsonify({
         'locations': results,
@@ -255,7 +683,7 @@ def get_world_countries():
         {'$limit': limit}
     ]
 
-    results = list(db.world_geography_counts.aggregate(pipeline))
+    results = aggregate_rows('world_geography_counts', pipeline)
 
     # Format results
     locations = [{
@@ -331,6 +759,74 @@ def search_world_geographies():
     return jsonify(results)
 
 
+@app.route('/api/world/geographies/documents')
+def get_world_geography_documents():
+    """
+    List documents mentioning a world location, from the postings index.
+    Query params:
+        location_key: location key (required; repeat to intersect)
+        page: page number, starting at 1 (default 1)
+        page_size: documents per page (default 50, max 500)
+    """
+    return jsonify(documents_page('world_geography'))
+
+
+@app.route('/api/world/geographies/cooccurrence')
+def get_world_cooccurrence():
+    """
+    Get the world locations most often mentioned in the same documents as a location.
+    Query params:
+        location_key: location key (required)
+        limit: max results (default 20, max 50)
+    """
+    return jsonify(related_locations('world_geography'))
+
+
+@app.route('/api/world/geographies/nearby')
+def get_nearby_world_geographies():
+    """
+    Get world locations within a radius of a point, ranked by mention count.
+    Query params:
+        lat, lng: center point (required)
+        radius_km: radius in kilometres (default 50), or
+        radius_mi: radius in miles
+        limit: max results (default 100, max 10000)
+        min_count: minimum mention count (default 1)
+    """
+    return jsonify(nearby_locations('world_geography'))
+
+
+@app.route('/api/world/geographies/nearest')
+def get_nearest_world_geographies():
+    """
+    Get the world locations nearest a point, with distances.
+    Query params:
+        lat, lng: point (required)
+        k: number of locations (default 10, max 1000)
+        min_count: minimum mention count (default 1)
+    """
+    return jsonify(nearest_locations('world_geography'))
+
+
+@app.route('/api/world/geographies/bbox')
+def get_bbox_world_geographies():
+    """
+    Get world locations inside a bounding box, ranked by mention count.
+    Query params:
+        south, west, north, east: box edges in degrees (required;
+                                  west > east crosses the antimeridian)
+        limit: max results (default 1000, max 10000)
+        min_count: minimum mention count (default 1)
+    """
+    return jsonify(bbox_locations('world_geography'))
+
+
+@app.route('/api/world/geographies/heatmap/<int:z>/<int:x>/<int:y>.png')
+def get_world_heatmap_tile(z, x, y):
+    """Heatmap tile of world location mentions (XYZ tile coordinates)."""
+    return heatmap_tile('world_geography', z, x, y)
+
+
 @app.route('/api/world/geographies/stats')
 def get_world_stats():
     """Get summary statistics about the world geography data."""
@@ -363,5 +859,69 @@ def get_world_stats():
     return jsonify(stats)
 
 
+@app.route('/api/jobs/status')
+def get_jobs_status():
+    """
+    Get the progress of extraction jobs (see progress.py). A running job whose
+    status has not been updated for several intervals is flagged as stale.
+    Query params:
+        job: job name, e.g. "geography" or "world_geography-shard-0-of-4" (default: all)
+    """
+    job = request.args.get('job', '').strip() or None
+    return jsonify({'jobs': job_statuses(db, job)})
+
+
+@app.route('/api/queries/stats')
+def get_query_stats():
+    """Map queries executed against MongoDB vs. coalesced into one already in flight."""
+    return jsonify(queries.stats())
+
+
+@app.route('/api/extract', methods=['POST'])
+def extract_locations():
+    """
+    Extract US and world locations from posted text.
+    JSON body:
+        text: a single text, or
+        texts: a list of texts (max 100; at most 1,000,000 characters in total)
+        timeout: seconds to wait for results (default and max 30); texts not
+                 started by then are skipped, but a text being extracted
+                 finishes in the background
+    A single text returns {"us": [...], "world": [...]}; a list returns
+    {"results": [...]} in the same order.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        body = {}
+    single = 'text' in body
+    texts = [body['text']] if single else body.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': 'Expected "text" (a string) or "texts" (a list of strings)'}), 400
+    if len(texts) > MAX_EXTRACT_TEXTS:
+        return jsonify({'error': f'At most {MAX_EXTRACT_TEXTS} texts per request'}), 413
+    if sum(map(len, texts)) > MAX_EXTRACT_CHARS:
+        return jsonify({'error': f'At most {MAX_EXTRACT_CHARS} characters per request'}), 413
+    try:
+        timeout = float(body.get('timeout', MAX_EXTRACT_SECONDS))
+    except (TypeError, ValueError):
+        timeout = math.nan
+    if not 0 < timeout < math.inf:
+        return jsonify({'error': '"timeout" must be a positive number of seconds'}), 400
+    timeout = min(timeout, MAX_EXTRACT_SECONDS)
+
+    try:
+        results = extraction.extract(texts, timeout)
+    except (TimeoutError, ExtractionUnavailable) as e:
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify(results[0] if single else {'results': results})
+
+
+@app.route('/api/extract/stats')
+def get_extract_stats():
+    """Batching statistics for on-demand extraction."""
+    return jsonify(extraction.stats())
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
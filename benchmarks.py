@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the extraction and serving paths.
+
+Usage:
+    python benchmarks.py ner [--limit 1000] [--gold data/ner_gold.jsonl]
+    python benchmarks.py startup [--data-dir data] [--repeat 3]
+    python benchmarks.py coalesce [--clients 32] [--rounds 5]
+
+ner: compares regex extraction, per-document spaCy NER and batched NER
+(ner.py) on documents/second. Batched candidates are checked against the
+per-document ones. With a gold file (JSON lines of title, text and the
+expected location keys), precision and recall of the validated locations are
+reported; without one, each NER path is compared against the regex results.
+
+startup: times constructing the US and world extractors lazily, their first
+extraction, a full eager build, and loading a warm-start snapshot
+(warmstart.py). The warm-started extractor's table and results are checked
+against the built one.
+
+coalesce: sends bursts of identical map requests from concurrent clients to
+the dashboard app and reports how many MongoDB queries they cost with
+single-flight coalescing (coalesce.py), and the request latencies.
+"""
+
+import json
+import os
+import statistics
+import threading
+import time
+
+from pymongo import MongoClient
+
+from extract_geographies import GeographyExtractor, document_text
+from extract_world_geographies import WorldGeographyExtractor
+from ner import (MAX_TEXT_CHARS, NER_LABELS, SPACY_AVAILABLE, annotate_locations, load_ner_model,
+                 spacy)
+
+
+def load_sample(mongo_uri, db_name, limit, gold=None):
+    """Sample documents: the gold file if given, else the first limit documents by _id."""
+    if gold:
+        with open(gold, 'r', encoding='utf-8') as f:
+            docs = [json.loads(line) for line in f if line.strip()]
+        return docs[:limit]
+    db = MongoClient(mongo_uri)[db_name]
+    return list(db.documents.find({}, {'_id': 1, 'title': 1, 'text': 1}).sort('_id', 1).limit(limit))
+
+
+def timed(label, n_docs, func):
+    """Run func(), print documents/second, and return its result."""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    rate = n_docs / elapsed if elapsed else float('inf')
+    print(f"  {label:<18} {elapsed:8.2f}s  {rate:10.1f} docs/sec")
+    return result
+
+
+def score(found, expected):
+    """Micro-averaged precision and recall of found vs expected key sets."""
+    true_positives = sum(len(f & e) for f, e in zip(found, expected))
+    n_found = sum(len(f) for f in found)
+    n_expected = sum(len(e) for e in expected)
+    precision = true_positives / n_found if n_found else 0
+    recall = true_positives / n_expected if n_expected else 0
+    return precision, recall
+
+
+def bench_ner(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs', limit=1000,
+              gold=None, model='en_core_web_sm', batch_size=64, n_process=1):
+    docs = load_sample(mongo_uri, db_name, limit, gold)
+    texts = [document_text(doc) for doc in docs]
+    print(f"Benchmarking NER on {len(docs)} documents")
+
+    extractor = GeographyExtractor()
+
+    def keys_for(id_lists):
+        return [{extractor.table.key(loc_id) for loc_id in ids} for ids in id_lists]
+
+    results = {}
+    results['regex'] = keys_for(timed('regex', len(docs), lambda: [
+        extractor.extract_location_ids(text) for text in texts]))
+
+    if not SPACY_AVAILABLE:
+        print("spaCy is not installed; skipping the NER paths")
+    else:
+        full_nlp = spacy.load(model)
+
+        def per_document():
+            return [[ent.text for ent in full_nlp(text[:MAX_TEXT_CHARS]).ents
+                     if ent.label_ in NER_LABELS] if text else [] for text in texts]
+
+        ner_nlp = load_ner_model(model)
+
+        def batched():
+            annotated = annotate_locations(ner_nlp, ({'text': text} for text in texts),
+                                           lambda doc: doc['text'], batch_size, n_process)
+            return [doc['ner_locations'] for doc in annotated]
+
+        per_doc_candidates = timed('spaCy per document', len(docs), per_document)
+        batch_candidates = timed(f'spaCy batch x{n_process}', len(docs), batched)
+
+        same = sum(a == b for a, b in zip(per_doc_candidates, batch_candidates))
+        print(f"  Batched candidates identical to per-document for {same}/{len(docs)} documents")
+
+        results['spaCy per document'] = keys_for(
+            [extractor.location_ids(candidates) for candidates in per_doc_candidates])
+        results['spaCy batch'] = keys_for(
+            [extractor.location_ids(candidates) for candidates in batch_candidates])
+
+    if gold:
+        expected = [{key.lower() for key in doc.get('locations', [])} for doc in docs]
+        print("\nAgainst gold locations:")
+    else:
+        expected = results['regex']
+        print("\nAgainst regex locations (no gold file):")
+    for label, found in results.items():
+        precision, recall = score(found, expected)
+        print(f"  {label:<18} precision {precision:.3f}  recall {recall:.3f}")
+
+
+# Text for first-extraction timings in the startup benchmark
+STARTUP_TEXT = ("Samples were shipped from Midland, Mich. and Freeport, TX to the plant "
+                "in Leverkusen, Germany, with copies to Cook County and Rotterdam, Netherlands.")
+
+
+def best_of(repeat, func):
+    """Fastest of repeat runs of func(): (seconds, result of that run)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, result)
+    return best
+
+
+def bench_startup(data_dir='data', snapshot_dir='data/warm_start', repeat=3):
+    for label, cls in (('US', GeographyExtractor), ('world', WorldGeographyExtractor)):
+        print(f"\n{label} extractor ({cls.__name__}):")
+        snapshot_path = os.path.join(snapshot_dir, f"{cls.__name__}.pkl")
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+        def first_extraction():
+            return cls(data_dir).extract_location_ids(STARTUP_TEXT)
+
+        results = [
+            ('construct (lazy)', best_of(repeat, lambda: cls(data_dir))),
+            ('first extraction', best_of(repeat, first_extraction)),
+            ('full build', best_of(repeat, lambda: cls(data_dir).build())),
+            ('save snapshot', best_of(1, lambda: cls.warm_start(snapshot_path, data_dir))),
+            ('warm start', best_of(repeat, lambda: cls.warm_start(snapshot_path, data_dir))),
+        ]
+        for name, (elapsed, _) in results:
+            print(f"  {name:<18} {elapsed:8.3f}s")
+
+        built = results[2][1][1]
+        warm = results[4][1][1]
+        same = (warm.table.keys == built.table.keys and warm.table.flags == built.table.flags and
+                warm.extract_location_ids(STARTUP_TEXT) == built.extract_location_ids(STARTUP_TEXT))
+        print(f"  Snapshot {os.path.getsize(snapshot_path) / 1e6:.1f} MB; "
+              f"warm-started extractor matches the built one: {same}")
+
+
+# Map requests the dashboard sends on load and on every slider change
+COALESCE_URLS = ('/api/geographies?min_count=51',
+                 '/api/world/geographies?min_count=5',
+                 '/api/world/geographies/countries?min_count=5')
+
+
+def bench_coalesce(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs', clients=32, rounds=5):
+    import app as dashboard
+
+    dashboard.db = MongoClient(mongo_uri)[db_name]
+    if dashboard.snapshot is not None:
+        print("GEOGRAPHY_SNAPSHOT is set: US locations are served from memory, not MongoDB")
+
+    for url in COALESCE_URLS:
+        latencies = []
+        statuses = set()
+
+        def client(barrier):
+            test_client = dashboard.app.test_client()
+            barrier.wait()
+            start = time.perf_counter()
+            response = test_client.get(url)
+            latencies.append(time.perf_counter() - start)
+            statuses.add(response.status_code)
+
+        before = dashboard.queries.stats()
+        for _ in range(rounds):
+            barrier = threading.Barrier(clients)
+            threads = [threading.Thread(target=client, args=(barrier,)) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        after = dashboard.queries.stats()
+
+        executed = after['executed'] - before['executed']
+        coalesced = after['coalesced'] - before['coalesced']
+        latencies.sort()
+        print(f"\n{url} (status {', '.join(map(str, sorted(statuses)))}):")
+        print(f"  {clients * rounds} requests in {rounds} bursts of {clients}: "
+              f"{executed} MongoDB queries, {coalesced} coalesced")
+        print(f"  latency median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"max {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Extraction and serving benchmarks')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017',
+                        help='MongoDB connection URI')
+    parser.add_argument('--db', default='toxic_docs', help='Database name')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ner_parser = subparsers.add_parser('ner', help='Regex vs per-document vs batched NER')
+    ner_parser.add_argument('--limit', type=int, default=1000, help='Documents to sample')
+    ner_parser.add_argument('--gold', help='JSON lines of title, text and expected location keys')
+    ner_parser.add_argument('--model', default='en_core_web_sm', help='spaCy model')
+    ner_parser.add_argument('--batch-size', type=int, default=64, help='Texts per nlp.pipe batch')
+    ner_parser.add_argument('--processes', type=int, default=1, help='nlp.pipe n_process')
+
+    startup_parser = subparsers.add_parser('startup', help='Lazy, eager and warm-start extractor start-up')
+    startup_parser.add_argument('--data-dir', default='data', help='Directory with gazetteer files')
+    startup_parser.add_argument('--snapshot-dir', default='data/warm_start',
+                                help='Directory for the warm-start snapshots')
+    startup_parser.add_argument('--repeat', type=int, default=3, help='Runs per timing (best is kept)')
+
+    coalesce_parser = subparsers.add_parser('coalesce',
+                                            help='MongoDB queries per burst of identical requests')
+    coalesce_parser.add_argument('--clients', type=int, default=32, help='Concurrent clients per burst')
+    coalesce_parser.add_argument('--rounds', type=int, default=5, help='Bursts per request')
+
+    args = parser.parse_args()
+
+    if args.command == 'ner':
+        bench_ner(args.mongo_uri, args.db, args.limit, args.gold, args.model,
+                  args.batch_size, args.processes)
+    elif args.command == 'startup':
+        bench_startup(args.data_dir, args.snapshot_dir, args.repeat)
+    elif args.command == 'coalesce':
+        bench_coalesce(args.mongo_uri, args.db, args.clients, args.rounds)
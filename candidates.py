@@ -0,0 +1,169 @@
+"""
+Stored raw candidates, so filter and gazetteer changes skip the regex pass.
+
+Extraction is two phases: the extractor's location_candidates(text) finds
+raw candidates as (pattern, *fields) tuples, and candidate_location() filters
+and normalizes each one (common names, old state abbreviations, minimum city
+population and name length) before it is resolved against the gazetteer.
+With a candidate store, process_documents records the first phase: every
+distinct candidate once, and per document (in processing order) the IDs of
+its distinct candidates. resolve_documents later recomputes the results
+from the store alone, filtering each distinct candidate once and counting
+pattern hits as the extraction run did.
+
+A store records the data files and settings its candidates depend on and is
+refused once they change; the gazetteer and filters are not among them.
+Rows are committed together with extraction checkpoints, so a resumed run
+continues the store where its checkpoint left off.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+from array import array
+
+from warmstart import source_signature
+
+CANDIDATE_STORE_VERSION = 1
+
+
+def candidate_store_path(path, shard=None):
+    """Per-shard store path for a sharded run."""
+    if not shard:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def store_meta(params, sources):
+    """Metadata a store must match to be read back."""
+    return {
+        'version': CANDIDATE_STORE_VERSION,
+        'params': params,
+        'sources': source_signature(sources)
+    }
+
+
+class CandidateWriter:
+    """Append documents' raw candidates to a store file."""
+
+    def __init__(self, path, params, sources, resume_after=None):
+        """
+        Start a new store at path, or with resume_after=N (the processed count
+        of a resumed checkpoint) continue an existing one after its first N
+        documents.
+        """
+        self.path = path
+        meta = store_meta(params, sources)
+        if resume_after is None and os.path.exists(path):
+            os.remove(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY, value TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS documents '
+                        '(seq INTEGER PRIMARY KEY, doc_id BLOB, candidates BLOB)')
+        self.ids = {}
+        if resume_after is not None:
+            stored = json.loads(dict(self.db.execute('SELECT key, value FROM meta')).get('meta', 'null'))
+            if stored != json.loads(json.dumps(meta)):
+                raise ValueError(f"Candidate store {path} does not match this run; "
+                                 f"rerun without --resume")
+            for candidate_id, value in self.db.execute('SELECT id, value FROM candidates'):
+                self.ids[tuple(json.loads(value))] = candidate_id
+            self.db.execute('DELETE FROM documents WHERE seq > ?', (resume_after,))
+        self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('meta', json.dumps(meta)))
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('complete', '0')")
+        self.db.commit()
+
+    def _intern(self, candidate):
+        candidate_id = self.ids.get(candidate)
+        if candidate_id is None:
+            candidate_id = self.ids[candidate] = len(self.ids)
+            self.db.execute('INSERT INTO candidates VALUES (?, ?)',
+                            (candidate_id, json.dumps(candidate, ensure_ascii=False)))
+        return candidate_id
+
+    def add(self, doc_id, candidates):
+        """Record a document's distinct candidates, in first-found order."""
+        ids = array('I', map(self._intern, dict.fromkeys(candidates)))
+        self.db.execute('INSERT INTO documents (doc_id, candidates) VALUES (?, ?)',
+                        (pickle.dumps(doc_id, protocol=pickle.HIGHEST_PROTOCOL), ids.tobytes()))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        """Commit and mark the store complete."""
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('complete', '1')")
+        self.db.commit()
+        documents = self.db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        self.db.close()
+        print(f"Stored {len(self.ids)} distinct candidates for {documents} documents in {self.path}")
+
+
+class CandidateReader:
+    """Read back a complete store written with the same params and sources."""
+
+    def __init__(self, path, params, sources):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No candidate store at {path}")
+        self.path = path
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        meta = dict(self.db.execute('SELECT key, value FROM meta'))
+        if meta.get('complete') != '1':
+            raise ValueError(f"Candidate store {path} is incomplete; finish or rerun its extraction")
+        if json.loads(meta['meta']) != json.loads(json.dumps(store_meta(params, sources))):
+            raise ValueError(f"Candidate store {path} was recorded with other settings or data "
+                             f"files; rerun extraction with --candidates")
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def candidates(self):
+        """Distinct candidates, indexed by candidate ID."""
+        return [json.loads(value) for _, value in
+                self.db.execute('SELECT id, value FROM candidates ORDER BY id')]
+
+    def documents(self):
+        """Yield (doc_id, candidate IDs) in processing order."""
+        for doc_id, data in self.db.execute('SELECT doc_id, candidates FROM documents ORDER BY seq'):
+            ids = array('I')
+            ids.frombytes(data)
+            yield pickle.loads(doc_id), ids
+
+    def close(self):
+        self.db.close()
+
+
+def resolve_documents(extractor, paths, mentions, postings=None, cooccurrence=None, progress=None):
+    """
+    Recompute each stored document's location IDs and add them to the
+    aggregators. Returns the number of documents.
+    """
+    params, sources = extractor.candidate_params(), extractor.candidate_sources()
+    processed = 0
+    for path in paths:
+        store = CandidateReader(path, params, sources)
+        candidates = store.candidates()
+        locations = [extractor.candidate_location(candidate) for candidate in candidates]
+        print(f"Filtered {len(candidates)} distinct candidates from {path}")
+
+        for doc_id, ids in store.documents():
+            # The same steps as extraction, so results and pattern hits match it
+            doc_loc_ids = extractor.location_ids(extractor.filter_candidates(
+                [candidates[i] for i in ids], [locations[i] for i in ids]))
+            mentions.add(doc_id, doc_loc_ids)
+            if postings is not None:
+                postings.add(doc_id, doc_loc_ids)
+            if cooccurrence is not None:
+                cooccurrence.add(doc_loc_ids)
+            processed += 1
+            if progress is not None:
+                progress.processed = processed
+        store.close()
+    return processed
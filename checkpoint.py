@@ -0,0 +1,94 @@
+"""
+Periodic checkpoints of extraction state, so long runs can be resumed.
+
+A checkpoint holds the aggregators (mention counts, postings, co-occurrence),
+the number of documents processed and the last processed _id. Documents are
+read in _id order, so resuming with _id > last_id continues exactly where the
+checkpoint left off and produces the same results as an uninterrupted run.
+Locations interned into the table during the run are saved with their
+records and interned again on resume, so their IDs stay valid.
+"""
+
+import os
+import pickle
+import time
+import zlib
+
+CHECKPOINT_VERSION = 3
+
+
+def save_checkpoint(path, state):
+    """Atomically write state as a zlib-compressed pickle."""
+    data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Load a checkpoint written by save_checkpoint, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        state = pickle.loads(zlib.decompress(f.read()))
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}")
+    return state
+
+
+class Checkpointer:
+    """Save extraction state to disk at most once every interval seconds."""
+
+    def __init__(self, path, interval=300, table=None):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.monotonic()
+        self.saves = 0
+        # Keys interned past the gazetteer's own are saved with their records
+        self.table = table
+        self.base_size = len(table) if table is not None else 0
+
+    def due(self):
+        return self.interval > 0 and time.monotonic() - self.last_save >= self.interval
+
+    def save(self, **state):
+        state['version'] = CHECKPOINT_VERSION
+        if self.table is not None:
+            state['table_keys'] = self.table.keys
+            state['table_base'] = self.base_size
+            state['table_records'] = [self.table.record(loc_id)
+                                      for loc_id in range(self.base_size, len(self.table))]
+        save_checkpoint(self.path, state)
+        self.last_save = time.monotonic()
+        self.saves += 1
+
+    def load(self):
+        """
+        Load the checkpoint for a resumed run.
+        Location IDs are only meaningful for the same gazetteer, so the table's
+        keys must match the checkpoint's; keys the run interned during
+        extraction are interned again, under the same IDs, before returning.
+        """
+        state = load_checkpoint(self.path)
+        if state is None:
+            return None
+        saved_keys = state['table_keys']
+        base = state['table_base']
+        table = self.table
+        if len(table) < base or table.keys != saved_keys[:len(table)]:
+            raise ValueError(
+                f"Checkpoint {self.path} was written with a different gazetteer; "
+                "rerun without --resume."
+            )
+        for loc_id in range(len(table), len(saved_keys)):
+            table.intern(saved_keys[loc_id], state['table_records'][loc_id - base])
+        return state
+
+    def clear(self):
+        """Remove the checkpoint once a run has completed."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,70 @@
+"""
+Single-flight coalescing of identical concurrent queries.
+
+When many dashboards load at once, or the min-count slider fires quickly,
+the app receives bursts of identical queries. SingleFlight runs a query
+once for all callers that ask for the same key while it is in flight; the
+others wait for and share its result. Nothing is cached: a query that
+starts after the previous one finished runs again, so results are never
+older than the request.
+
+Shared results are handed to every waiter, so callers must not modify them.
+"""
+
+import json
+import threading
+from concurrent.futures import Future
+
+
+def query_key(*parts):
+    """Hashable key for a query from its collection, filter, projection, sort, etc."""
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+class SingleFlight:
+    """Run func once per key for all concurrent callers of do()."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def do(self, key, func):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            with self.lock:
+                self.errors += 1
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    def stats(self):
+        with self.lock:
+            total = self.executed + self.coalesced
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'in_flight': len(self.calls),
+                'coalesced_rate': round(self.coalesced / total, 4) if total else 0
+            }
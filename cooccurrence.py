@@ -0,0 +1,84 @@
+"""
+Location co-occurrence counts accumulated during extraction.
+
+Pairs of location IDs mentioned in the same document are counted in a sparse
+dict keyed by (low_id << 32 | high_id). Memory is bounded by max_pairs: when
+it is exceeded, the rarest pairs are pruned (lossy counting), so rare pairs
+may be undercounted while frequent ones survive intact.
+"""
+
+import heapq
+from collections import defaultdict
+
+
+class CooccurrenceCounter:
+    """Sparse, memory-bounded counts of location pairs per document."""
+
+    def __init__(self, max_pairs=2000000, max_doc_locations=50):
+        self.max_pairs = max_pairs
+        # Documents listing more locations only pair up the first ones mentioned
+        self.max_doc_locations = max_doc_locations
+        self.pairs = {}
+        # Pairs at or below this count have been pruned at least once
+        self.floor = 0
+
+    def add(self, loc_ids):
+        """Count every pair of distinct location IDs mentioned in one document."""
+        ids = sorted(loc_ids[:self.max_doc_locations])
+        pairs = self.pairs
+        for i, low in enumerate(ids):
+            base = low << 32
+            for high in ids[i + 1:]:
+                key = base | high
+                pairs[key] = pairs.get(key, 0) + 1
+
+        if len(pairs) > self.max_pairs:
+            self._prune()
+
+    def _prune(self):
+        """Drop the rarest pairs until the table is back under 3/4 of max_pairs."""
+        target = self.max_pairs * 3 // 4
+        while len(self.pairs) > target:
+            self.floor += 1
+            self.pairs = {key: n for key, n in self.pairs.items() if n > self.floor}
+
+    def top_related(self, counts, top_n, min_count=2, per_location=50):
+        """
+        Co-mentioned locations among the top_n locations by mention count.
+        Returns {loc_id: [(count, other_id), ...]} sorted by count, keeping
+        pairs seen at least min_count times.
+        """
+        mentioned = (loc_id for loc_id in range(len(counts)) if counts[loc_id])
+        top = set(heapq.nlargest(top_n, mentioned, key=counts.__getitem__))
+
+        related = defaultdict(list)
+        for key, n in self.pairs.items():
+            if n < min_count:
+                continue
+            low, high = key >> 32, key & 0xFFFFFFFF
+            if low in top and high in top:
+                related[low].append((n, high))
+                related[high].append((n, low))
+
+        return {loc_id: sorted(pairs, key=lambda p: (-p[0], p[1]))[:per_location]
+                for loc_id, pairs in related.items()}
+
+
+def store_cooccurrence(db, prefix, related, key_for_id):
+    """
+    Store co-occurrence lists in <prefix>_cooccurrence, one document per
+    location with parallel related_keys / counts arrays.
+    """
+    coll = db[f"{prefix}_cooccurrence"]
+    coll.drop()
+
+    docs = [{
+        'location_key': key_for_id(loc_id),
+        'related_keys': [key_for_id(other) for _, other in pairs],
+        'counts': [n for n, _ in pairs]
+    } for loc_id, pairs in related.items()]
+    if docs:
+        coll.insert_many(docs)
+        coll.create_index('location_key', unique=True)
+
+    print(f"Stored co-occurrence lists for {len(docs)} locations")
@@ -0,0 +1,90 @@
+"""
+US county gazetteer as FIPS-indexed arrays.
+
+data/us_county_gazetteer.json (built by setup_county_data.py) holds one
+array per field, in FIPS order, and a map of lowercase county name to the
+indices of the counties with that name. CountyGazetteer answers the same
+keys as the older us_counties.json dict ("autauga county, alabama",
+"autauga county, al", "autauga county") without storing every variant.
+"""
+
+import json
+from collections.abc import Mapping
+
+COUNTY_GAZETTEER_FILE = 'us_county_gazetteer.json'
+
+
+class CountyGazetteer(Mapping):
+    """
+    Read-only mapping of county keys to records. A bare county name resolves
+    to the first county with that name in FIPS order.
+    """
+
+    def __init__(self, data):
+        self.fips = data['fips']
+        self.names = data['name']
+        self.state_abbrevs = data['state']
+        self.lats = data['lat']
+        self.lngs = data['lng']
+        self.state_names = data['state_names']
+        self.by_name = data['index']
+        self._records = [None] * len(self.fips)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def record(self, index):
+        """County record in the us_counties.json layout, plus its FIPS code."""
+        record = self._records[index]
+        if record is None:
+            abbrev = self.state_abbrevs[index]
+            record = self._records[index] = {
+                'name': self.names[index],
+                'state': self.state_names[abbrev],
+                'state_abbrev': abbrev,
+                'lat': self.lats[index],
+                'lng': self.lngs[index],
+                'type': 'county',
+                'fips': self.fips[index]
+            }
+        return record
+
+    def index_of(self, key):
+        """Array index for a county key, or None."""
+        name, _, state = key.partition(', ')
+        candidates = self.by_name.get(name)
+        if not candidates:
+            return None
+        if not state:
+            return candidates[0]
+        for index in candidates:
+            abbrev = self.state_abbrevs[index]
+            if state == abbrev.lower() or state == self.state_names[abbrev].lower():
+                return index
+        return None
+
+    def __getitem__(self, key):
+        index = self.index_of(key)
+        if index is None:
+            raise KeyError(key)
+        return self.record(index)
+
+    def __contains__(self, key):
+        return self.index_of(key) is not None
+
+    def __iter__(self):
+        for name, indices in self.by_name.items():
+            yield name
+            for index in indices:
+                abbrev = self.state_abbrevs[index]
+                yield f"{name}, {self.state_names[abbrev].lower()}"
+                yield f"{name}, {abbrev.lower()}"
+
+    def __len__(self):
+        return len(self.by_name) + 2 * len(self.fips)
+
+    def values(self):
+        """One record per county, in FIPS order."""
+        return (self.record(index) for index in range(len(self.fips)))
@@ -0,0 +1,157 @@
+"""
+Read documents from MongoDB for extraction, in _id order.
+
+Sharded runs (--shard i/N) take the documents whose _id hashes to shard i.
+Shard membership uses crc32 of str(_id), so it is stable across processes
+and machines (unlike Python's randomized hash()).
+
+PrefetchReader pulls batches on a background thread into a bounded queue, so
+waiting on MongoDB overlaps with CPU-bound extraction in the main thread.
+"""
+
+import queue
+import threading
+import time
+import zlib
+from itertools import islice
+
+from bson import ObjectId
+
+
+def parse_shard(value):
+    """Parse an "i/N" shard spec into (i, N)."""
+    index, _, count = value.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}; expected i/N with 0 <= i < N")
+    return index, count
+
+
+def in_shard(doc_id, shard):
+    """True if a document _id belongs to shard (i, N)."""
+    index, count = shard
+    return zlib.crc32(str(doc_id).encode('utf-8')) % count == index
+
+
+def parse_doc_id(value):
+    """Parse an _id given on the command line: an ObjectId if it looks like one."""
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def id_range(start_id=None, end_id=None):
+    """Query on _id for start_id <= _id < end_id; either bound may be None."""
+    bounds = {}
+    if start_id is not None:
+        bounds['$gte'] = start_id
+    if end_id is not None:
+        bounds['$lt'] = end_id
+    return {'_id': bounds} if bounds else {}
+
+
+def iter_documents(collection, query, projection, batch_size=1000, shard=None, limit=None):
+    """
+    Yield documents matching query in _id order.
+    For a shard, only _ids are scanned in full; matching documents are then
+    fetched batch_size at a time with $in.
+    """
+    if shard is None:
+        cursor = collection.find(query, projection).sort('_id', 1).batch_size(batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+        yield from cursor
+        return
+
+    yielded = 0
+    batch = []
+    id_cursor = collection.find(query, {'_id': 1}).sort('_id', 1).batch_size(batch_size * 10)
+    for doc in id_cursor:
+        if not in_shard(doc['_id'], shard):
+            continue
+        batch.append(doc['_id'])
+        if limit and yielded + len(batch) >= limit:
+            break
+        if len(batch) >= batch_size:
+            yield from collection.find({'_id': {'$in': batch}}, projection).sort('_id', 1)
+            yielded += len(batch)
+            batch = []
+
+    if batch:
+        yield from collection.find({'_id': {'$in': batch}}, projection).sort('_id', 1)
+
+
+class PrefetchReader:
+    """
+    Iterate over documents read on a background thread.
+    Up to prefetch batches of batch_size documents are buffered; when the
+    queue is full the reader blocks, so memory stays bounded.
+
+    Timings (seconds):
+      wait_time  - main thread blocked waiting for documents (I/O bound)
+      busy_time  - main thread processing documents (CPU bound)
+      fetch_time - reader thread waiting on MongoDB
+      full_time  - reader thread blocked on a full queue (backpressure)
+    """
+
+    _DONE = object()
+
+    def __init__(self, documents, batch_size=1000, prefetch=4):
+        self.documents = documents
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=max(prefetch, 1))
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._read, name='document-reader', daemon=True)
+        self.wait_time = 0.0
+        self.busy_time = 0.0
+        self.fetch_time = 0.0
+        self.full_time = 0.0
+        self.batches = 0
+
+    def _put(self, item):
+        start = time.perf_counter()
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.full_time += time.perf_counter() - start
+
+    def _read(self):
+        try:
+            documents = iter(self.documents)
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                batch = list(islice(documents, self.batch_size))
+                self.fetch_time += time.perf_counter() - start
+                if not batch:
+                    break
+                self.batches += 1
+                self._put(batch)
+        except Exception as e:
+            # Re-raised in the main thread
+            self._put(e)
+        self._put(self._DONE)
+
+    def __iter__(self):
+        self.thread.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                item = self.queue.get()
+                resumed = time.perf_counter()
+                self.wait_time += resumed - start
+                if item is self._DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+                self.busy_time += time.perf_counter() - resumed
+        finally:
+            self.stopped.set()
+
+    def summary(self):
+        total = self.wait_time + self.busy_time
+        io_share = 100 * self.wait_time / total if total else 0
+        return (f"Reader: {self.batches} batches; main thread {self.busy_time:.1f}s processing, "
+                f"{self.wait_time:.1f}s waiting on I/O ({io_share:.0f}%); "
+                f"reader {self.fetch_time:.1f}s fetching, {self.full_time:.1f}s on a full queue")
@@ -8,102 +8,218 @@ import json
 import os
 import re
 import sys
-from collections import defaultdict
+import time
+from collections import Counter
 from datetime import datetime
+from functools import cached_property
 
 from pymongo import MongoClient
 from tqdm import tqdm
 
+from aggregation import (MentionCounts, export_partial, import_partial, load_partials,
+                         merge_partials, partial_path)
+from candidates import CandidateWriter, candidate_store_path, resolve_documents
+from checkpoint import Checkpointer, save_checkpoint
+from cooccurrence import CooccurrenceCounter, store_cooccurrence
+from counties import COUNTY_GAZETTEER_FILE, CountyGazetteer
+from dedup import ExtractionCache
+from doc_reader import (PrefetchReader, id_range, iter_documents, parse_doc_id,
+                        parse_shard)
+from gazetteer import COMMON_NAME, LocationTable, load_gazetteer, load_word_set
+from generations import bump_generation
+from indexes import ensure_indexes
+from ner import annotate_locations, load_ner_model
+from postings import PostingsBuilder, store_postings
+from progress import ProgressPublisher
+from rollups import store_rollups
+from warmstart import load_warm_start, module_files, save_warm_start
+
 # spaCy has compatibility issues with Python 3.14, use regex-based extraction
 SPACY_AVAILABLE = False
 
 
+def document_text(doc):
+    """Title and text of a document, as extraction sees them."""
+    return f"{doc.get('title', '') or ''} {doc.get('text', '') or ''}"
+
+
+def location_key(info):
+    """Canonical key for a validated location: "name, state" or just the state name."""
+    if info.get('type') == 'state':
+        return info['name'].lower()
+    return f"{info['name']}, {info['state']}".lower()
+
+
 class GeographyExtractor:
     """Extract and validate US geographic locations from text."""
 
-    def __init__(self, data_dir='data'):
+    def __init__(self, data_dir='data', shared=False):
+        """Data files are loaded on first use of each component (see the properties below)."""
         self.data_dir = data_dir
-        self.locations = {}
-        self.city_states = {}
-        self.states = {}
-        self.nlp = None
-        self.common_words = set()
-        self.common_names = set()
-
-        self._load_census_data()
-        self._load_nlp_model()
-        self._load_common_words()
-        self._load_common_names()
-
-    def _load_common_words(self):
-        """Load common English words to filter out false positive city matches."""
-        words_path = os.path.join(self.data_dir, 'common_words.txt')
-        if os.path.exists(words_path):
-            with open(words_path, 'r') as f:
-                self.common_words = {line.strip().lower() for line in f if line.strip()}
-            print(f"Loaded {len(self.common_words)} common English words for filtering")
-
-    def _load_common_names(self):
-        """Load common first and last names to filter out false positive matches."""
-        first_names_path = os.path.join(self.data_dir, 'first_names.txt')
-        last_names_path = os.path.join(self.data_dir, 'last_names.txt')
-
-        if os.path.exists(first_names_path):
-            with open(first_names_path, 'r') as f:
-                for line in f:
-                    name = line.strip().lower()
-                    if name:
-                        self.common_names.add(name)
-
-        if os.path.exists(last_names_path):
-            with open(last_names_path, 'r') as f:
-                for line in f:
-                    name = line.strip().lower()
-                    if name:
-                        self.common_names.add(name)
-
-        print(f"Loaded {len(self.common_names)} common names for filtering")
-
-    def _load_census_data(self):
-        """Load pre-processed census data."""
-        locations_path = os.path.join(self.data_dir, 'us_locations.json')
-        city_states_path = os.path.join(self.data_dir, 'city_states_index.json')
-        states_path = os.path.join(self.data_dir, 'states.json')
-        counties_path = os.path.join(self.data_dir, 'us_counties.json')
-
+        # Map gazetteers from shared read-only stores instead of loading private dicts
+        self.shared = shared
+        self._resolve_cache = {}
+        # Candidates found per regex pattern, for progress reports
+        self.pattern_hits = Counter(dict.fromkeys(self.PATTERNS, 0))
+        # Documents whose candidates were filtered, the denominator of hit rates
+        self.pattern_documents = 0
+
+    # Candidate patterns counted in pattern_hits: the regex patterns, and 'ner' for spaCy
+    # locations. All are preset, so the progress thread never sees the counter grow.
+    PATTERNS = ('city_state', 'city_old_abbrev', 'city_dotted_abbrev', 'county', 'county_state',
+                'state', 'ner')
+
+    def _path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    @cached_property
+    def locations(self):
+        """Places and states by key ("houston, texas", "houston, tx", "texas")."""
+        locations_path = self._path('us_locations.json')
         if not os.path.exists(locations_path):
             raise FileNotFoundError(
                 f"Census data not found at {locations_path}. "
                 "Run setup_census_data.py first."
             )
+        locations = load_gazetteer(locations_path, self.shared)
+        print(f"Loaded {len(locations)} locations")
+        return locations
 
-        with open(locations_path, 'r') as f:
-            self.locations = json.load(f)
-
-        with open(city_states_path, 'r') as f:
-            self.city_states = json.load(f)
-
-        with open(states_path, 'r') as f:
-            self.states = json.load(f)
-
-        # Load county data
-        self.counties = {}
-        if os.path.exists(counties_path):
-            with open(counties_path, 'r') as f:
-                self.counties = json.load(f)
+    @cached_property
+    def city_states(self):
+        """City name -> candidate states, for bare city names."""
+        city_states = load_gazetteer(self._path('city_states_index.json'), self.shared)
+        print(f"Loaded {len(city_states)} city names")
+        return city_states
 
-        print(f"Loaded {len(self.locations)} locations, {len(self.city_states)} city names, {len(self.counties)} counties")
+    @cached_property
+    def states(self):
+        with open(self._path('states.json'), 'r') as f:
+            return json.load(f)
 
-    def _load_nlp_model(self):
-        """Load spaCy NLP model if available."""
-        if SPACY_AVAILABLE:
-            try:
-                self.nlp = spacy.load('en_core_web_sm')
-                print("Loaded spaCy model: en_core_web_sm")
-            except OSError:
-                print("spaCy model not found. Downloading en_core_web_sm...")
-                os.system('python -m spacy download en_core_web_sm')
-                self.nlp = spacy.load('en_core_web_sm')
+    @cached_property
+    def counties(self):
+        """
+        County data: the FIPS-indexed gazetteer (setup_county_data.py),
+        else the older dict of key variants.
+        """
+        counties = {}
+        if os.path.exists(self._path(COUNTY_GAZETTEER_FILE)):
+            counties = CountyGazetteer.load(self._path(COUNTY_GAZETTEER_FILE))
+        elif os.path.exists(self._path('us_counties.json')):
+            counties = load_gazetteer(self._path('us_counties.json'), self.shared)
+        print(f"Loaded {len(counties)} counties")
+        return counties
+
+    @cached_property
+    def table(self):
+        """Dense integer ID for every canonical place, state and county."""
+        # Shared stores keep the records; the table then only holds keys and IDs
+        table = LocationTable(lookup=self._lookup_record if self.shared else None)
+        precomputed = True
+        for source in (self.locations, self.counties):
+            for info in source.values():
+                if info.get('lat'):
+                    table.intern(location_key(info), info)
+                    if info.get('type') == 'place' and 'flags' not in info:
+                        precomputed = False
+        if not precomputed:
+            self._flag_common_names(table)
+        return table
+
+    def _flag_common_names(self, table):
+        """
+        Set COMMON_NAME flags for gazetteers built before setup_census_data.py
+        precomputed them, by loading the first and last name lists.
+        """
+        common_names = load_word_set(self._path('first_names.txt'), self._path('last_names.txt'))
+        for loc_id in range(len(table)):
+            record = table.record(loc_id)
+            if record.get('type') == 'place' and record['name'].lower() in common_names:
+                table.flags[loc_id] |= COMMON_NAME
+        print(f"Loaded {len(common_names)} common names for filtering "
+              "(re-run setup_census_data.py to precompute them)")
+
+    def _lookup_record(self, key):
+        """Gazetteer record for a canonical location key."""
+        record = self.locations.get(key)
+        if record is None:
+            record = self.counties.get(key)
+        return record
+
+    @cached_property
+    def nlp(self):
+        """spaCy NLP model if available, else None."""
+        if not SPACY_AVAILABLE:
+            return None
+        try:
+            nlp = spacy.load('en_core_web_sm')
+            print("Loaded spaCy model: en_core_web_sm")
+        except OSError:
+            print("spaCy model not found. Downloading en_core_web_sm...")
+            os.system('python -m spacy download en_core_web_sm')
+            nlp = spacy.load('en_core_web_sm')
+        return nlp
+
+    def build(self):
+        """Load every component now rather than on first use."""
+        for component in ('states', 'city_states', 'table'):
+            getattr(self, component)
+        return self
+
+    def __getstate__(self):
+        """Pickled state (for warm starts): loaded data, without the spaCy model or resolve memo."""
+        state = self.__dict__.copy()
+        state.pop('nlp', None)
+        state['_resolve_cache'] = {}
+        state['pattern_hits'] = Counter(dict.fromkeys(self.PATTERNS, 0))
+        state['pattern_documents'] = 0
+        return state
+
+    def warm_start_sources(self):
+        """Files a warm-start snapshot of this extractor depends on."""
+        filenames = ('us_locations.json', 'city_states_index.json', 'states.json',
+                     COUNTY_GAZETTEER_FILE, 'us_counties.json', 'first_names.txt', 'last_names.txt')
+        return ([self._path(filename) for filename in filenames] +
+                module_files(type(self), LocationTable, CountyGazetteer))
+
+    # Bump when regex_candidates changes, so older candidate stores are refused
+    CANDIDATE_VERSION = 1
+
+    def candidate_params(self):
+        """Settings a candidate store of this extractor depends on (see candidates.py)."""
+        return {'kind': 'geography', 'version': self.CANDIDATE_VERSION}
+
+    def candidate_sources(self):
+        """Files the raw candidates depend on; the gazetteer is applied when resolving."""
+        return [self._path('states.json')]
+
+    # Bump when candidate filtering or resolution changes, so stored dedup results are not reused
+    FILTER_VERSION = 1
+
+    def dedup_params(self):
+        """Settings stored dedup results depend on besides the table's keys and flags."""
+        return {**self.candidate_params(), 'filter_version': self.FILTER_VERSION,
+                'old_state_abbrevs': self.OLD_STATE_ABBREVS}
+
+    @classmethod
+    def warm_start(cls, path, data_dir='data', shared=False):
+        """
+        A fully built extractor, loaded from the warm-start snapshot at path if
+        it is up to date, else built from the data files and saved there.
+        """
+        extractor = cls(data_dir, shared)
+        params = {'data_dir': data_dir, 'shared': shared}
+        sources = extractor.warm_start_sources()
+        start = time.perf_counter()
+        loaded = load_warm_start(path, sources, params)
+        if loaded is not None:
+            print(f"Loaded warm-start snapshot {path} in {time.perf_counter() - start:.2f}s")
+            return loaded
+        extractor.build()
+        save_warm_start(path, extractor, sources, params)
+        print(f"Built extractor in {time.perf_counter() - start:.2f}s; saved warm-start snapshot {path}")
+        return extractor
 
     def extract_locations_spacy(self, text):
         """Extract locations using spaCy NER."""
@@ -136,53 +252,44 @@ class GeographyExtractor:
         'W.Va.': 'WV', 'Wis.': 'WI', 'Wyo.': 'WY', 'D.C.': 'DC',
     }
 
-    def extract_locations_regex(self, text):
-        """Extract locations using regex patterns."""
+    def is_common_name(self, location_str):
+        """True if a candidate resolves to a place whose name is a common first/last name."""
+        loc_id = self.resolve(location_str)
+        return loc_id is not None and bool(self.table.flags[loc_id] & COMMON_NAME)
+
+    def regex_candidates(self, text):
+        """
+        Raw candidates found by the regex patterns, as (pattern, *fields)
+        tuples. Common names and old state abbreviations are only checked by
+        candidate_location, so stored candidates stay valid when those change.
+        """
         if not text:
             return []
 
-        locations = []
+        candidates = []
 
         # Pattern 1: "City, State" or "City, ST" (e.g., "Houston, TX", "St. Louis, Missouri")
-        # Skip if city name is a common first/last name (e.g., "Stephen, MN" is likely a person)
         pattern1 = r'\b([A-Z][a-z]+(?:[\.\s]+[A-Z]?[a-z]+)*),\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*|[A-Z]{2})\b'
 
         for match in re.finditer(pattern1, text):
             city, state = match.groups()
-            # Skip if city is a common name
-            if city.lower() in self.common_names:
-                continue
             state_upper = state.upper()
             state_title = state.title()
             if (state_upper in self.states.get('abbrev_to_full', {}) or
                 state_title in self.states.get('full_to_abbrev', {})):
-                locations.append(f"{city}, {state}")
+                candidates.append(('city_state', city, state))
 
         # Pattern 2: Old-style abbreviations like "Boston, Mass." or "Midland, Mich."
         pattern2 = r'\b([A-Z][a-z]+(?:[\.\s]+[A-Z]?[a-z]+)*),\s*([A-Z][a-z]+\.)'
 
         for match in re.finditer(pattern2, text):
-            city, abbrev = match.groups()
-            # Skip if city is a common name
-            if city.lower() in self.common_names:
-                continue
-            if abbrev in self.OLD_STATE_ABBREVS:
-                state_code = self.OLD_STATE_ABBREVS[abbrev]
-                state_full = self.states['abbrev_to_full'].get(state_code, state_code)
-                locations.append(f"{city}, {state_full}")
+            candidates.append(('city_old_abbrev', *match.groups()))
 
         # Pattern 3: "City, N.Y." or "City, N.J." style
         pattern3 = r'\b([A-Z][a-z]+(?:[\.\s]+[A-Z]?[a-z]+)*),\s*([A-Z]\.[A-Z]\.)'
 
         for match in re.finditer(pattern3, text):
-            city, abbrev = match.groups()
-            # Skip if city is a common name
-            if city.lower() in self.common_names:
-                continue
-            if abbrev in self.OLD_STATE_ABBREVS:
-                state_code = self.OLD_STATE_ABBREVS[abbrev]
-                state_full = self.states['abbrev_to_full'].get(state_code, state_code)
-                locations.append(f"{city}, {state_full}")
+            candidates.append(('city_dotted_abbrev', *match.groups()))
 
         # Pattern 4: County mentions like "Cook County" or "Los Angeles County"
         # Match "X County" where X is one or more capitalized words
@@ -190,8 +297,7 @@ class GeographyExtractor:
 
         for match in re.finditer(county_pattern, text):
             county_name = match.group(1)
-            full_county = f"{county_name} County"
-            locations.append(full_county)
+            candidates.append(('county', f"{county_name} County"))
 
         # Pattern 5: "X County, State" format
         county_state_pattern = r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+County,\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*|[A-Z]{2})\b'
@@ -206,18 +312,75 @@ class GeographyExtractor:
                 # Normalize state name
                 if state_upper in self.states.get('abbrev_to_full', {}):
                     state = self.states['abbrev_to_full'][state_upper]
-                locations.append(f"{full_county}, {state}")
+                candidates.append(('county_state', f"{full_county}, {state}"))
 
         # Also look for standalone state names
         for state_name in self.states.get('full_to_abbrev', {}).keys():
             if state_name in text:
-                locations.append(state_name)
+                candidates.append(('state', state_name))
 
         # Pattern 6: DISABLED - Standalone city names caused too many false positives
         # Now we ONLY match cities that have explicit state context (Patterns 1-3)
 
+        return candidates
+
+    def candidate_location(self, candidate):
+        """Location string for a raw candidate, or None if it is filtered out."""
+        pattern = candidate[0]
+        if pattern in ('city_old_abbrev', 'city_dotted_abbrev'):
+            _, city, abbrev = candidate
+            if abbrev not in self.OLD_STATE_ABBREVS:
+                return None
+            state_code = self.OLD_STATE_ABBREVS[abbrev]
+            state_full = self.states['abbrev_to_full'].get(state_code, state_code)
+            location_str = f"{city}, {state_full}"
+        elif pattern == 'city_state':
+            location_str = f"{candidate[1]}, {candidate[2]}"
+        else:
+            return candidate[1]
+
+        # Skip if the city is a common first/last name (e.g., "Stephen, MN" is likely a person)
+        if self.is_common_name(location_str):
+            return None
+        return location_str
+
+    def candidate_id(self, candidate):
+        """Location ID for a raw candidate, or None."""
+        location_str = self.candidate_location(candidate)
+        return None if location_str is None else self.resolve(location_str)
+
+    def filter_candidates(self, candidates, precomputed=None):
+        """
+        Location strings for the raw candidates that pass the filters, in order.
+        precomputed holds candidate_location() of each candidate when already known.
+        Each distinct passing candidate counts one hit for its pattern.
+        """
+        locations = []
+        counted = set()
+        hits = self.pattern_hits
+        self.pattern_documents += 1
+        for index, candidate in enumerate(candidates):
+            if precomputed is None:
+                location_str = self.candidate_location(candidate)
+            else:
+                location_str = precomputed[index]
+            if location_str is not None:
+                locations.append(location_str)
+                if tuple(candidate) not in counted:
+                    counted.add(tuple(candidate))
+                    hits[candidate[0]] += 1
         return locations
 
+    def extract_locations_regex(self, text):
+        """Extract locations using regex patterns."""
+        return self.filter_candidates(self.regex_candidates(text))
+
+    def location_candidates(self, text):
+        """Raw candidates from the best available method (see extract_locations)."""
+        if SPACY_AVAILABLE and self.nlp:
+            return [('ner', location) for location in self.extract_locations_spacy(text)]
+        return self.regex_candidates(text)
+
     def extract_locations(self, text):
         """Extract locations using best available method."""
         if SPACY_AVAILABLE and self.nlp:
@@ -315,115 +478,279 @@ class GeographyExtractor:
 
         return None
 
+    # Memoized candidate strings; the cache is cleared once it reaches this size
+    RESOLVE_CACHE_SIZE = 200000
+
+    def resolve(self, location_str):
+        """
+        Resolve a location string to its location ID.
+        Returns None if not a valid US location with coordinates.
+        """
+        try:
+            return self._resolve_cache[location_str]
+        except KeyError:
+            pass
+
+        loc_id = None
+        validated = self.validate_and_geocode(location_str)
+        if validated and validated.get('lat'):
+            loc_id = self.table.intern(location_key(validated), validated)
+
+        if len(self._resolve_cache) >= self.RESOLVE_CACHE_SIZE:
+            self._resolve_cache.clear()
+        self._resolve_cache[location_str] = loc_id
+        return loc_id
+
+    def extract_location_ids(self, text):
+        """Extract locations from text and return distinct location IDs in mention order."""
+        return self.location_ids(self.extract_locations(text))
+
+    def location_ids(self, locations):
+        """Validate candidate location strings; distinct location IDs in mention order."""
+        ids = []
+        seen = set()
+        for loc in locations:
+            loc_id = self.resolve(loc)
+            if loc_id is not None and loc_id not in seen:
+                seen.add(loc_id)
+                ids.append(loc_id)
+        return ids
+
 
 def process_documents(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
-                      batch_size=1000, limit=None):
+                      batch_size=1000, limit=None, shared=False,
+                      build_postings=True, cooccurrence_top=None, cooccurrence_min_count=2,
+                      cooccurrence_max_pairs=2000000, checkpoint_path=None,
+                      checkpoint_interval=300, resume=False, shard=None,
+                      partial_dir='data/partials', prefetch=4, start_id=None, end_id=None,
+                      dedup=True, dedup_cache_size=100000, dedup_store=None,
+                      ner_model=None, ner_batch_size=64, ner_processes=1, warm_start=None,
+                      progress_interval=5.0, candidate_store=None):
     """
     Process all documents and extract geography mentions.
     Stores aggregated results in MongoDB.
+    With shared=True, gazetteers are mapped from shared stores (see gazetteer.py).
+    With build_postings=True, a full location -> document postings index is stored too.
+    With cooccurrence_top=N, co-mention counts among the top N locations are stored,
+    keeping pairs seen at least cooccurrence_min_count times.
+    With checkpoint_path, aggregator state is saved every checkpoint_interval seconds;
+    resume=True continues from that checkpoint after the last processed _id.
+    With shard=(i, N), only documents whose _id hashes to shard i are processed and
+    a partial result is written to partial_dir instead of MongoDB (see merge_shards).
+    Documents are read in batches of batch_size on a background thread, up to
+    prefetch batches ahead (0 reads inline); start_id/end_id limit the _id range.
+    With dedup=True, documents with identical content are extracted once (see
+    dedup.py); dedup_store keeps those results on disk across runs.
+    With ner_model, candidates come from spaCy NER run in batches of ner_batch_size
+    over ner_processes processes (see ner.py) instead of the regex patterns;
+    the dedup cache does not apply to them.
+    With warm_start, the built extractor is loaded from (or saved to) that
+    snapshot file (see warmstart.py).
+    Progress is published to the job_status collection every progress_interval
+    seconds (see progress.py); 0 publishes stage changes only.
+    With candidate_store, each document's raw candidates are also recorded in
+    that file (see candidates.py), so resolve_candidates can redo the results
+    after a gazetteer or filter change without extracting again. The dedup
+    cache is bypassed while recording.
     """
     print(f"Connecting to MongoDB: {mongo_uri}")
     client = MongoClient(mongo_uri)
     db = client[db_name]
 
     # Initialize extractor
-    extractor = GeographyExtractor()
+    if warm_start:
+        extractor = GeographyExtractor.warm_start(warm_start, shared=shared)
+    else:
+        extractor = GeographyExtractor(shared=shared)
+    job = f"geography-shard-{shard[0]}-of-{shard[1]}" if shard else 'geography'
+    progress = ProgressPublisher(db, job, interval=progress_interval,
+                                 extractor=extractor)
+    progress.start('loading gazetteer')
+
+    extract = extractor.extract_location_ids
+    cache = None
+    if dedup:
+        extract = cache = ExtractionCache(extractor.extract_location_ids, extractor.table,
+                                          'geography', dedup_cache_size, dedup_store,
+                                          extractor.dedup_params())
+
+    # Aggregate mention counts by location ID
+    mentions = MentionCounts(len(extractor.table))
+    postings = PostingsBuilder() if build_postings else None
+    cooccurrence = None
+    if cooccurrence_top:
+        cooccurrence = CooccurrenceCounter(max_pairs=cooccurrence_max_pairs)
+
+    # Process in _id order, so a checkpoint's last _id marks exactly what is done
+    processed = 0
+    query = id_range(start_id, end_id)
+
+    if shard and checkpoint_path:
+        root, ext = os.path.splitext(checkpoint_path)
+        checkpoint_path = f"{root}-shard-{shard[0]}-of-{shard[1]}{ext}"
+    checkpointer = (Checkpointer(checkpoint_path, checkpoint_interval, extractor.table)
+                    if checkpoint_path else None)
+    if resume and checkpointer:
+        state = checkpointer.load()
+        if state:
+            mentions = state['mentions']
+            postings = state['postings']
+            cooccurrence = state['cooccurrence']
+            processed = state['processed']
+            query['_id'] = {**query.get('_id', {}), '$gt': state['last_id']}
+            progress.resume_from(processed)
+            print(f"Resuming from checkpoint after {processed} documents (last _id {state['last_id']})")
+
+    candidate_writer = None
+    if candidate_store:
+        candidate_writer = CandidateWriter(candidate_store_path(candidate_store, shard),
+                                           extractor.candidate_params(),
+                                           extractor.candidate_sources(),
+                                           resume_after=processed if processed else None)
 
     # Count documents
-    total_docs = db.documents.count_documents({})
+    total_docs = db.documents.count_documents(id_range(start_id, end_id))
+    if shard:
+        # Approximate: _id hashes spread documents evenly over shards
+        total_docs //= shard[1]
     if limit:
         total_docs = min(total_docs, limit)
     print(f"Processing {total_docs} documents...")
-
-    # Aggregate geography counts
-    geo_counts = defaultdict(lambda: {
-        'count': 0,
-        'doc_ids': [],
-        'info': None
-    })
-
-    # Process in batches
-    processed = 0
-    cursor = db.documents.find({}, {'_id': 1, 'text': 1, 'title': 1})
-
-    if limit:
-        cursor = cursor.limit(limit)
-
-    for doc in tqdm(cursor, total=total_docs, desc="Extracting geographies"):
-        text = doc.get('text', '') or ''
-        title = doc.get('title', '') or ''
-        full_text = f"{title} {text}"
-
-        # Extract locations
-        raw_locations = extractor.extract_locations(full_text)
-
-        # Validate and count
-        seen_in_doc = set()
-        for loc in raw_locations:
-            validated = extractor.validate_and_geocode(loc)
-            if validated and validated.get('lat'):
-                # Create a canonical key - handle states differently
-                if validated.get('type') == 'state':
-                    key = validated['name'].lower()
-                else:
-                    key = f"{validated['name']}, {validated['state']}".lower()
-
-                if key not in seen_in_doc:
-                    seen_in_doc.add(key)
-                    geo_counts[key]['count'] += 1
-                    geo_counts[key]['info'] = validated
-                    # Store doc_ids for small counts, skip for large
-                    if geo_counts[key]['count'] <= 100:
-                        geo_counts[key]['doc_ids'].append(str(doc['_id']))
+    progress.set_stage('extracting', total=total_docs)
+
+    cursor = []
+    reader = None
+    if not limit or limit > processed:
+        cursor = iter_documents(db.documents, query, {'_id': 1, 'text': 1, 'title': 1},
+                                batch_size=batch_size, shard=shard,
+                                limit=limit - processed if limit else None)
+        if prefetch:
+            cursor = reader = PrefetchReader(cursor, batch_size, prefetch)
+
+    if ner_model:
+        nlp = load_ner_model(ner_model)
+        cursor = annotate_locations(nlp, cursor, document_text, ner_batch_size, ner_processes)
+
+    for doc in tqdm(cursor, total=total_docs, initial=processed, desc="Extracting geographies"):
+        # Extract, validate and count each location once per document
+        if candidate_writer is not None:
+            if ner_model:
+                candidates = [('ner', location) for location in doc['ner_locations']]
+            else:
+                candidates = extractor.location_candidates(document_text(doc))
+            candidate_writer.add(doc['_id'], candidates)
+            loc_ids = extractor.location_ids(extractor.filter_candidates(candidates))
+        elif ner_model:
+            candidates = [('ner', location) for location in doc['ner_locations']]
+            loc_ids = extractor.location_ids(extractor.filter_candidates(candidates))
+        else:
+            loc_ids = extract(document_text(doc))
+        mentions.add(doc['_id'], loc_ids)
+        if postings is not None:
+            postings.add(doc['_id'], loc_ids)
+        if cooccurrence is not None:
+            cooccurrence.add(loc_ids)
 
         processed += 1
+        progress.processed = processed
 
-    print(f"\nProcessed {processed} documents")
-    print(f"Found {len(geo_counts)} unique locations")
+        if checkpointer and checkpointer.due():
+            # Candidates first: a resumed run trims the store back to the checkpoint
+            if candidate_writer is not None:
+                candidate_writer.commit()
+            checkpointer.save(last_id=doc['_id'], processed=processed, mentions=mentions,
+                              postings=postings, cooccurrence=cooccurrence)
 
+    print(f"\nProcessed {processed} documents")
+    if reader is not None:
+        print(reader.summary())
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+    if candidate_writer is not None:
+        candidate_writer.close()
+    print(f"Found {len(mentions)} unique locations")
+
+    if shard:
+        progress.set_stage('writing partial')
+        partial = export_partial(extractor.table, mentions, postings, cooccurrence, shard=shard,
+                                 processed=processed)
+        path = partial_path(partial_dir, 'geography', shard)
+        save_checkpoint(path, partial)
+        print(f"Wrote partial result for shard {shard[0]}/{shard[1]} to {path}")
+    else:
+        progress.set_stage('storing results')
+        store_results(db, extractor.table, mentions, postings, cooccurrence,
+                      cooccurrence_top, cooccurrence_min_count)
+
+    # The run is complete; a later --resume must not pick up stale state
+    if checkpointer:
+        checkpointer.clear()
+    progress.finish()
+
+    return mentions
+
+
+def store_results(db, table, mentions, postings=None, cooccurrence=None,
+                  cooccurrence_top=None, cooccurrence_min_count=2):
+    """
+    Store aggregated mention counts in MongoDB, with state and county rollups
+    (see rollups.py), and the postings index and co-occurrence lists when
+    those were collected.
+    """
     # Store results in MongoDB
     print("\nStoring results in MongoDB...")
     db.geography_counts.drop()
 
     geo_docs = []
-    for key, data in geo_counts.items():
-        if data['info'] and data['count'] >= 1:
-            loc_type = data['info'].get('type', 'place')
-
-            # For states, don't duplicate state in the state field
-            if loc_type == 'state':
-                state_val = ''
-                state_abbrev_val = ''
-            else:
-                state_val = data['info'].get('state', '')
-                state_abbrev_val = data['info'].get('state_abbrev', '')
-
-            geo_doc = {
-                'location_key': key,
-                'name': data['info'].get('name', key),
-                'state': state_val,
-                'state_abbrev': state_abbrev_val,
-                'county': data['info'].get('county', ''),
-                'lat': data['info'].get('lat'),
-                'lng': data['info'].get('lng'),
-                'count': data['count'],
-                'type': loc_type,
-                'sample_doc_ids': data['doc_ids'][:10],
-                'updated_at': datetime.utcnow()
-            }
-            geo_docs.append(geo_doc)
+    for loc_id, count, doc_ids in mentions.items():
+        # Location strings are only materialized here, when writing results
+        key = table.key(loc_id)
+        info = table.record(loc_id)
+        loc_type = info.get('type', 'place')
+
+        # For states, don't duplicate state in the state field
+        if loc_type == 'state':
+            state_val = ''
+            state_abbrev_val = ''
+        else:
+            state_val = info.get('state', '')
+            state_abbrev_val = info.get('state_abbrev', '')
+
+        geo_doc = {
+            'location_key': key,
+            'name': info.get('name', key),
+            'state': state_val,
+            'state_abbrev': state_abbrev_val,
+            'county': info.get('county', ''),
+            'lat': info.get('lat'),
+            'lng': info.get('lng'),
+            'count': count,
+            'type': loc_type,
+            'sample_doc_ids': [str(doc_id) for doc_id in doc_ids[:10]],
+            'updated_at': datetime.utcnow()
+        }
+        geo_docs.append(geo_doc)
 
     if geo_docs:
         db.geography_counts.insert_many(geo_docs)
-        db.geography_counts.create_index('location_key')
-        db.geography_counts.create_index('count')
-        db.geography_counts.create_index('state')
-        db.geography_counts.create_index('county')
-        db.geography_counts.create_index('type')
-        db.geography_counts.create_index([('lat', 1), ('lng', 1)])
+        # Compound indexes matching the API's query shapes (see indexes.py)
+        ensure_indexes(db, 'geography_counts')
 
     print(f"Stored {len(geo_docs)} location records")
 
+    store_rollups(db, table, mentions)
+
+    if postings is not None:
+        store_postings(db, 'geography', postings, table.key)
+
+    if cooccurrence is not None:
+        related = cooccurrence.top_related(mentions.counts, cooccurrence_top, cooccurrence_min_count)
+        store_cooccurrence(db, 'geography', related, table.key)
+
+    # Let in-memory views of the results (e.g. app.py's spatial index) rebuild
+    bump_generation(db, 'geography')
+
     # Print top locations
     print("\nTop 20 locations by mention count:")
     top_20 = sorted(geo_docs, key=lambda x: x['count'], reverse=True)[:20]
@@ -437,6 +764,74 @@ def process_documents(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs
     return geo_docs
 
 
+def resolve_candidates(candidate_paths, mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
+                       shared=False, build_postings=True, cooccurrence_top=None,
+                       cooccurrence_min_count=2, cooccurrence_max_pairs=2000000, warm_start=None,
+                       progress_interval=5.0):
+    """
+    Recompute and store the results from candidate stores recorded by
+    process_documents(candidate_store=...), e.g. one per shard. Documents
+    are not read or extracted again; only the filters and the gazetteer are
+    applied, once per distinct candidate.
+    """
+    print(f"Connecting to MongoDB: {mongo_uri}")
+    client = MongoClient(mongo_uri)
+    db = client[db_name]
+
+    if warm_start:
+        extractor = GeographyExtractor.warm_start(warm_start, shared=shared)
+    else:
+        extractor = GeographyExtractor(shared=shared)
+    progress = ProgressPublisher(db, 'geography', interval=progress_interval,
+                                 extractor=extractor)
+    progress.start('loading gazetteer')
+
+    mentions = MentionCounts(len(extractor.table))
+    postings = PostingsBuilder() if build_postings else None
+    cooccurrence = None
+    if cooccurrence_top:
+        cooccurrence = CooccurrenceCounter(max_pairs=cooccurrence_max_pairs)
+
+    progress.set_stage('resolving candidates')
+    processed = resolve_documents(extractor, candidate_paths, mentions, postings, cooccurrence,
+                                  progress)
+    print(f"Resolved candidates of {processed} documents; found {len(mentions)} unique locations")
+
+    progress.set_stage('storing results')
+    store_results(db, extractor.table, mentions, postings, cooccurrence,
+                  cooccurrence_top, cooccurrence_min_count)
+    progress.finish()
+
+    return mentions
+
+
+def merge_shards(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
+                 partial_dir='data/partials', cooccurrence_top=None, cooccurrence_min_count=2):
+    """
+    Merge the shard partials in partial_dir and store the combined result in
+    MongoDB, exactly as a single process_documents run would.
+    """
+    partials = load_partials(partial_dir, 'geography')
+    if not partials:
+        raise FileNotFoundError(f"No partial results found in {partial_dir}")
+
+    merged = merge_partials(partials)
+    shard_count = merged['shards'][0][1] if merged['shards'] else 1
+    missing = sorted(set(range(shard_count)) - {index for index, _ in merged['shards']})
+    if missing:
+        print(f"Warning: missing shards {missing} of {shard_count}")
+    print(f"Merged {len(partials)} partial results covering {merged['documents']} documents")
+
+    table, mentions, postings, cooccurrence = import_partial(merged)
+
+    print(f"Connecting to MongoDB: {mongo_uri}")
+    client = MongoClient(mongo_uri)
+    db = client[db_name]
+
+    return store_results(db, table, mentions, postings, cooccurrence,
+                         cooccurrence_top, cooccurrence_min_count)
+
+
 if __name__ == '__main__':
     import argparse
 
@@ -445,13 +840,110 @@ if __name__ == '__main__':
                         help='MongoDB connection URI')
     parser.add_argument('--db', default='toxic_docs', help='Database name')
     parser.add_argument('--limit', type=int, help='Limit number of documents to process')
-    parser.add_argument('--batch-size', type=int, default=1000, help='Batch size')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Documents per cursor batch read from MongoDB')
+    parser.add_argument('--prefetch', type=int, default=4,
+                        help='Batches read ahead on a background thread (0 reads inline)')
+    parser.add_argument('--start-id', type=parse_doc_id,
+                        help='Only process documents with _id >= this value')
+    parser.add_argument('--end-id', type=parse_doc_id,
+                        help='Only process documents with _id < this value')
+    parser.add_argument('--shared-gazetteer', action='store_true',
+                        help='Map gazetteers from shared read-only stores')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Extract every document even if its content was seen before')
+    parser.add_argument('--dedup-cache-size', type=int, default=100000,
+                        help='Content hashes kept in the in-memory dedup cache')
+    parser.add_argument('--dedup-store',
+                        help='SQLite file keeping dedup results across runs')
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help='Seconds between progress updates in job_status (0: stage changes only)')
+    parser.add_argument('--warm-start',
+                        help='Snapshot file to load the built extractor from (saved there if stale)')
+    parser.add_argument('--ner', action='store_true',
+                        help='Find candidates with batched spaCy NER instead of regex patterns')
+    parser.add_argument('--ner-model', default='en_core_web_sm', help='spaCy model for --ner')
+    parser.add_argument('--ner-batch-size', type=int, default=64,
+                        help='Texts per nlp.pipe batch')
+    parser.add_argument('--ner-processes', type=int, default=1,
+                        help='Processes running NER (nlp.pipe n_process)')
+    parser.add_argument('--no-postings', action='store_true',
+                        help='Skip building the location -> document postings index')
+    parser.add_argument('--cooccurrence-top', type=int,
+                        help='Store co-mention counts among the top N locations')
+    parser.add_argument('--cooccurrence-min-count', type=int, default=2,
+                        help='Minimum co-mention count kept per location pair')
+    parser.add_argument('--cooccurrence-max-pairs', type=int, default=2000000,
+                        help='Maximum location pairs held in memory before pruning')
+    parser.add_argument('--checkpoint', default='data/checkpoints/geographies.ckpt',
+                        help='Checkpoint file for resuming interrupted runs')
+    parser.add_argument('--checkpoint-interval', type=int, default=300,
+                        help='Seconds between checkpoints (0 disables)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the last checkpoint')
+    parser.add_argument('--shard', type=parse_shard,
+                        help='Process only shard i of N ("i/N") and write a partial result')
+    parser.add_argument('--partial-dir', default='data/partials',
+                        help='Directory for shard partial results')
+    parser.add_argument('--merge', action='store_true',
+                        help='Merge shard partial results from --partial-dir into MongoDB')
+    parser.add_argument('--candidates',
+                        help='Also record raw candidates in this store (per shard with --shard)')
+    parser.add_argument('--resolve-candidates', nargs='+', metavar='STORE',
+                        help='Recompute results from recorded candidate stores instead of extracting')
 
     args = parser.parse_args()
 
+    if args.merge:
+        merge_shards(
+            mongo_uri=args.mongo_uri,
+            db_name=args.db,
+            partial_dir=args.partial_dir,
+            cooccurrence_top=args.cooccurrence_top,
+            cooccurrence_min_count=args.cooccurrence_min_count
+        )
+        sys.exit(0)
+
+    if args.resolve_candidates:
+        resolve_candidates(
+            args.resolve_candidates,
+            mongo_uri=args.mongo_uri,
+            db_name=args.db,
+            shared=args.shared_gazetteer,
+            build_postings=not args.no_postings,
+            cooccurrence_top=args.cooccurrence_top,
+            cooccurrence_min_count=args.cooccurrence_min_count,
+            cooccurrence_max_pairs=args.cooccurrence_max_pairs,
+            warm_start=args.warm_start,
+            progress_interval=args.progress_interval
+        )
+        sys.exit(0)
+
     process_documents(
         mongo_uri=args.mongo_uri,
         db_name=args.db,
         batch_size=args.batch_size,
-        limit=args.limit
+        limit=args.limit,
+        shared=args.shared_gazetteer,
+        build_postings=not args.no_postings,
+        cooccurrence_top=args.cooccurrence_top,
+        cooccurrence_min_count=args.cooccurrence_min_count,
+        cooccurrence_max_pairs=args.cooccurrence_max_pairs,
+        checkpoint_path=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume,
+        shard=args.shard,
+        partial_dir=args.partial_dir,
+        prefetch=args.prefetch,
+        start_id=args.start_id,
+        end_id=args.end_id,
+        dedup=not args.no_dedup,
+        dedup_cache_size=args.dedup_cache_size,
+        dedup_store=args.dedup_store,
+        ner_model=args.ner_model if args.ner else None,
+        ner_batch_size=args.ner_batch_size,
+        ner_processes=args.ner_processes,
+        warm_start=args.warm_start,
+        progress_interval=args.progress_interval,
+        candidate_store=args.candidates
     )
@@ -0,0 +1,220 @@
+"""
+On-demand extraction for the /api/extract endpoint.
+
+ExtractionService runs US and world extraction in a pool of worker
+processes, each holding its own warm extractors (built once per process,
+optionally from warm-start snapshots, see warmstart.py). Texts from
+concurrent requests are queued and grouped into micro-batches: a batch is
+sent when it reaches batch_texts texts or batch_chars characters, or
+batch_wait seconds after its first text. At most two batches per worker are
+in flight, so under load the queue grows and batches get bigger instead of
+piling up inside the pool.
+
+Each text carries its request's deadline. Workers skip texts whose deadline
+has passed, so a request that timed out stops using the pool once the text
+being extracted is done; a text is never interrupted mid-extraction. If the
+pool breaks (e.g. a worker cannot load its extractors), the affected
+requests fail with ExtractionUnavailable and the next batch gets a new pool.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import (BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait)
+from functools import partial
+
+from extract_geographies import GeographyExtractor
+from extract_world_geographies import WorldGeographyExtractor
+
+# Record fields returned for each resolved location
+RESULT_FIELDS = ('name', 'type', 'state', 'state_abbrev', 'county', 'fips',
+                 'country', 'country_code', 'lat', 'lng')
+
+# Extractors of this process, set by init_worker
+_extractors = None
+
+
+def load_extractors(data_dir='data', warm_start_dir=None):
+    """Fully built (US, world) extractors, from warm-start snapshots if warm_start_dir is set."""
+    if warm_start_dir:
+        return (
+            GeographyExtractor.warm_start(os.path.join(warm_start_dir, 'us_extractor.pkl'), data_dir),
+            WorldGeographyExtractor.warm_start(os.path.join(warm_start_dir, 'world_extractor.pkl'),
+                                               data_dir)
+        )
+    return GeographyExtractor(data_dir).build(), WorldGeographyExtractor(data_dir).build()
+
+
+def init_worker(data_dir, warm_start_dir):
+    global _extractors
+    _extractors = load_extractors(data_dir, warm_start_dir)
+
+
+def location_results(table, loc_ids):
+    """Location key and record fields for each location ID."""
+    results = []
+    for loc_id in loc_ids:
+        record = table.record(loc_id)
+        result = {'location_key': table.key(loc_id)}
+        result.update((field, record[field]) for field in RESULT_FIELDS if field in record)
+        results.append(result)
+    return results
+
+
+def extract_texts(texts, deadlines):
+    """
+    US and world locations for each text, using this process's extractors;
+    None for texts whose deadline (a time.time() value) passed before they started.
+    """
+    us, world = _extractors
+    results = []
+    for text, deadline in zip(texts, deadlines):
+        if time.time() > deadline:
+            results.append(None)
+            continue
+        results.append({
+            'us': location_results(us.table, us.extract_location_ids(text)),
+            'world': location_results(world.table, world.extract_location_ids(text))
+        })
+    return results
+
+
+class ExtractionUnavailable(RuntimeError):
+    """The worker pool failed, e.g. because a worker could not load its extractors."""
+
+
+class ExtractionService:
+    """Micro-batch texts from concurrent requests into a pool of warm extractors."""
+
+    def __init__(self, workers=2, batch_texts=32, batch_chars=200000, batch_wait=0.01,
+                 data_dir='data', warm_start_dir=None):
+        # workers=0 extracts on one thread of this process (development and tests)
+        self.workers = workers
+        self.batch_texts = batch_texts
+        self.batch_chars = batch_chars
+        self.batch_wait = batch_wait
+        self.data_dir = data_dir
+        self.warm_start_dir = warm_start_dir
+        self.queue = queue.Queue()
+        self.slots = threading.BoundedSemaphore(max(workers, 1) * 2)
+        self.lock = threading.Lock()
+        self.pool = None
+        self.batches = 0
+        self.texts = 0
+        self.timeouts = 0
+        self.pool_failures = 0
+
+    def _new_pool(self):
+        initargs = (self.data_dir, self.warm_start_dir)
+        if self.workers:
+            return ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=initargs)
+        return ThreadPoolExecutor(1, initializer=init_worker, initargs=initargs)
+
+    def _start(self):
+        """Create the pool and dispatcher on first use, so importing the app spawns nothing."""
+        with self.lock:
+            if self.pool is not None:
+                return
+            self.pool = self._new_pool()
+            threading.Thread(target=self._dispatch, name='extract-dispatch', daemon=True).start()
+
+    def _replace_pool(self, pool):
+        """Swap a broken pool for a new one, unless that already happened."""
+        with self.lock:
+            if self.pool is not pool:
+                return
+            self.pool = self._new_pool()
+            self.pool_failures += 1
+        pool.shutdown(wait=False)
+
+    def _dispatch(self):
+        while True:
+            batch = [self.queue.get()]
+            chars = len(batch[0][0])
+            self.slots.acquire()
+
+            # Gather more texts until the batch is full or its wait is over
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_texts and chars < self.batch_chars:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                batch.append(item)
+                chars += len(item[0])
+
+            # Skip texts whose requests already gave up
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                self.slots.release()
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            texts, futures, deadlines = zip(*batch)
+            pool = self.pool
+            try:
+                batch_future = pool.submit(extract_texts, list(texts), list(deadlines))
+            except Exception as e:
+                self.slots.release()
+                self._replace_pool(pool)
+                error = ExtractionUnavailable(f"Extraction pool failed: {e!r}")
+                for future in futures:
+                    future.set_exception(error)
+                continue
+            batch_future.add_done_callback(partial(self._deliver, pool, futures))
+
+    def _deliver(self, pool, futures, batch_future):
+        self.slots.release()
+        try:
+            results = batch_future.result()
+        except BrokenExecutor as e:
+            self._replace_pool(pool)
+            error = ExtractionUnavailable(f"Extraction pool failed: {e!r}")
+            for future in futures:
+                future.set_exception(error)
+            return
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if result is None:
+                future.set_exception(TimeoutError("Deadline passed before extraction started"))
+            else:
+                future.set_result(result)
+
+    def extract(self, texts, timeout=30.0):
+        """
+        Locations for each text, in order. Raises TimeoutError if they are not
+        all extracted within timeout seconds: texts still queued are dropped
+        and workers skip the rest, but a text already being extracted runs to
+        completion. Raises ExtractionUnavailable if the worker pool failed.
+        """
+        self._start()
+        deadline = time.time() + timeout
+        futures = []
+        for text in texts:
+            future = Future()
+            futures.append(future)
+            self.queue.put((text, future, deadline))
+
+        done, pending = wait(futures, timeout)
+        if pending:
+            for future in pending:
+                future.cancel()
+            self.timeouts += 1
+            raise TimeoutError(f"Extraction took longer than {timeout}s")
+        return [future.result() for future in futures]
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'batches': self.batches,
+            'texts': self.texts,
+            'avg_batch_size': round(self.texts / self.batches, 2) if self.batches else 0,
+            'queued': self.queue.qsize(),
+            'timeouts': self.timeouts,
+            'pool_failures': self.pool_failures
+        }
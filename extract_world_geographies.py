@@ -8,12 +8,37 @@ Stores results in a separate MongoDB collection for the world dashboard.
 import json
 import os
 import re
-from collections import defaultdict
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from datetime import datetime
+from functools import cached_property
 
 from pymongo import MongoClient
 from tqdm import tqdm
 
+from aggregation import (MentionCounts, export_partial, import_partial, load_partials,
+                         merge_partials, partial_path)
+from candidates import CandidateWriter, candidate_store_path, resolve_documents
+from checkpoint import Checkpointer, save_checkpoint
+from cooccurrence import CooccurrenceCounter, store_cooccurrence
+from dedup import ExtractionCache
+from doc_reader import (PrefetchReader, id_range, iter_documents, parse_doc_id,
+                        parse_shard)
+from gazetteer import LocationTable, load_gazetteer, load_word_set
+from generations import bump_generation
+from indexes import ensure_indexes
+from postings import PostingsBuilder, store_postings
+from progress import ProgressPublisher
+from warmstart import load_warm_start, module_files, save_warm_start
+from world_cities import WORLD_GAZETTEER_FILE, WorldGazetteer
+
+
+def location_key(info):
+    """Canonical key for a validated world location: "name, country"."""
+    return f"{info['name']}, {info['country']}".lower()
+
 
 class WorldGeographyExtractor:
     """Extract and validate international geographic locations from text."""
@@ -21,69 +46,95 @@ class WorldGeographyExtractor:
     # Proximity window: city must be within this many characters of country mention
     PROXIMITY_CHARS = 200
 
-    def __init__(self, data_dir='data'):
+    def __init__(self, data_dir='data', bare_cities=False, shared=False):
+        """Data files are loaded on first use of each component (see the properties below)."""
         self.data_dir = data_dir
-        self.locations = {}
-        self.city_countries = {}
-        self.countries = {}
-        self.common_words = set()
-        self.common_names = set()
-
-        self._load_world_data()
-        self._load_common_words()
-        self._load_common_names()
-
-    def _load_common_words(self):
-        """Load common English words to filter out false positive city matches."""
-        words_path = os.path.join(self.data_dir, 'common_words.txt')
-        if os.path.exists(words_path):
-            with open(words_path, 'r') as f:
-                self.common_words = {line.strip().lower() for line in f if line.strip()}
-            print(f"Loaded {len(self.common_words)} common English words for filtering")
-
-    def _load_common_names(self):
-        """Load common first and last names to filter out false positive matches."""
-        first_names_path = os.path.join(self.data_dir, 'first_names.txt')
-        last_names_path = os.path.join(self.data_dir, 'last_names.txt')
-
-        if os.path.exists(first_names_path):
-            with open(first_names_path, 'r') as f:
-                for line in f:
-                    name = line.strip().lower()
-                    if name:
-                        self.common_names.add(name)
-
-        if os.path.exists(last_names_path):
-            with open(last_names_path, 'r') as f:
-                for line in f:
-                    name = line.strip().lower()
-                    if name:
-                        self.common_names.add(name)
-
-        print(f"Loaded {len(self.common_names)} common names for filtering")
-
-    def _load_world_data(self):
-        """Load pre-processed world data."""
-        locations_path = os.path.join(self.data_dir, 'world_locations.json')
-        city_countries_path = os.path.join(self.data_dir, 'city_countries_index.json')
-        countries_path = os.path.join(self.data_dir, 'countries.json')
-
+        self.bare_cities = bare_cities
+        # Map the gazetteer from a shared read-only store instead of a private dict
+        self.shared = shared
+        self._resolve_cache = {}
+        # Candidates found per pattern, for progress reports
+        self.pattern_hits = Counter(dict.fromkeys(self.PATTERNS, 0))
+        # Documents whose candidates were filtered, the denominator of hit rates
+        self.pattern_documents = 0
+
+    # Patterns counted in pattern_hits
+    PATTERNS = ('city_country', 'city_paren_country', 'city_country_code',
+                'preposition_city_country', 'bare_city')
+
+    def _path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    @cached_property
+    def common_names(self):
+        """Common first and last names, to filter out false positive bare-city matches."""
+        common_names = load_word_set(self._path('first_names.txt'), self._path('last_names.txt'))
+        print(f"Loaded {len(common_names)} common names for filtering")
+        return common_names
+
+    @cached_property
+    def locations(self):
+        """
+        World cities by alias ("city, country" or "city, cc"): the normalized
+        gazetteer (see world_cities.py), else the older dict of key variants.
+        """
+        locations_path = self._path(WORLD_GAZETTEER_FILE)
+        if not os.path.exists(locations_path):
+            locations_path = self._path('world_locations.json')
         if not os.path.exists(locations_path):
             raise FileNotFoundError(
-                f"World data not found at {locations_path}. "
+                f"World data not found at {self._path(WORLD_GAZETTEER_FILE)}. "
                 "Run setup_world_data.py first."
             )
+        locations = load_gazetteer(locations_path, self.shared)
+        print(f"Loaded {len(locations)} world locations")
+        return locations
 
-        with open(locations_path, 'r', encoding='utf-8') as f:
-            self.locations = json.load(f)
-
-        with open(city_countries_path, 'r', encoding='utf-8') as f:
-            self.city_countries = json.load(f)
-
-        with open(countries_path, 'r', encoding='utf-8') as f:
-            self.countries = json.load(f)
-
-        print(f"Loaded {len(self.locations)} world locations, {len(self.city_countries)} city names")
+    @cached_property
+    def countries(self):
+        with open(self._path('countries.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @cached_property
+    def city_countries(self):
+        """City name -> candidate country codes; only needed for bare-city resolution."""
+        if not self.bare_cities:
+            return {}
+        with open(self._path('city_countries_index.json'), 'r', encoding='utf-8') as f:
+            city_countries = self._compact_city_countries(json.load(f))
+        print(f"Loaded {len(city_countries)} city names")
+        return city_countries
+
+    @cached_property
+    def table(self):
+        """Dense integer ID for every canonical world city."""
+        # A shared store keeps the records; the table then only holds keys and IDs
+        table = LocationTable(lookup=self.locations.get if self.shared else None)
+        # Older dicts and shared stores repeat each city under every alias; intern skips those
+        locations = self.locations
+        cities = locations.iter_cities() if isinstance(locations, WorldGazetteer) else locations.values()
+        for loc in cities:
+            table.intern(location_key(loc), loc)
+        return table
+
+    def _compact_city_countries(self, city_countries):
+        """
+        Reduce the city -> countries index to tuples of country codes.
+        Candidates stay in population order (largest first); cities below
+        MIN_POPULATION or MIN_NAME_LENGTH are dropped since they can never validate.
+        """
+        compact = {}
+        for city, candidates in city_countries.items():
+            if len(city) < self.MIN_NAME_LENGTH:
+                continue
+            codes = []
+            for candidate in candidates:
+                if candidate.get('population', 0) < self.MIN_POPULATION:
+                    break
+                codes.append(candidate['country_code'])
+            if codes:
+                compact[city] = tuple(codes)
+        return compact
 
     def _build_country_pattern(self):
         """Build a compiled regex pattern for all country names (called once at init)."""
@@ -106,6 +157,80 @@ class WorldGeographyExtractor:
             else:
                 self._code_pattern = None
 
+    def build(self):
+        """Load every component and compile the country patterns now rather than on first use."""
+        for component in ('countries', 'city_countries', 'table'):
+            getattr(self, component)
+        if self.bare_cities:
+            self.common_names
+        self._build_country_pattern()
+        return self
+
+    def __getstate__(self):
+        """Pickled state (for warm starts): loaded data, without the resolve memo."""
+        state = self.__dict__.copy()
+        state['_resolve_cache'] = {}
+        state['pattern_hits'] = Counter(dict.fromkeys(self.PATTERNS, 0))
+        state['pattern_documents'] = 0
+        return state
+
+    def warm_start_sources(self):
+        """Files a warm-start snapshot of this extractor depends on."""
+        filenames = (WORLD_GAZETTEER_FILE, 'world_locations.json', 'countries.json',
+                     'city_countries_index.json', 'first_names.txt', 'last_names.txt')
+        return ([self._path(filename) for filename in filenames] +
+                module_files(type(self), LocationTable, WorldGazetteer))
+
+    # Bump when location_candidates changes, so older candidate stores are refused
+    CANDIDATE_VERSION = 1
+
+    def candidate_params(self):
+        """Settings a candidate store of this extractor depends on (see candidates.py)."""
+        params = {'kind': 'world_geography', 'version': self.CANDIDATE_VERSION,
+                  'bare_cities': self.bare_cities}
+        if self.bare_cities:
+            # Bare-city candidates are found with the city index, which these filter
+            params.update(min_population=self.MIN_POPULATION, min_name_length=self.MIN_NAME_LENGTH)
+        return params
+
+    def candidate_sources(self):
+        """Files the raw candidates depend on; the gazetteer is applied when resolving."""
+        filenames = ['countries.json']
+        if self.bare_cities:
+            filenames.append('city_countries_index.json')
+        return [self._path(filename) for filename in filenames]
+
+    # Bump when candidate filtering or resolution changes, so stored dedup results are not reused
+    FILTER_VERSION = 1
+
+    def dedup_params(self):
+        """Settings stored dedup results depend on besides the table's keys and flags."""
+        params = {**self.candidate_params(), 'filter_version': self.FILTER_VERSION,
+                  'min_population': self.MIN_POPULATION, 'min_name_length': self.MIN_NAME_LENGTH}
+        if self.bare_cities:
+            # Only bare cities are checked against common names (loading them is slow)
+            params['common_names'] = self.common_names
+        return params
+
+    @classmethod
+    def warm_start(cls, path, data_dir='data', bare_cities=False, shared=False):
+        """
+        A fully built extractor, loaded from the warm-start snapshot at path if
+        it is up to date, else built from the data files and saved there.
+        """
+        extractor = cls(data_dir, bare_cities, shared)
+        params = {'data_dir': data_dir, 'bare_cities': bare_cities, 'shared': shared}
+        sources = extractor.warm_start_sources()
+        start = time.perf_counter()
+        loaded = load_warm_start(path, sources, params)
+        if loaded is not None:
+            print(f"Loaded warm-start snapshot {path} in {time.perf_counter() - start:.2f}s")
+            return loaded
+        extractor.build()
+        save_warm_start(path, extractor, sources, params)
+        print(f"Built extractor in {time.perf_counter() - start:.2f}s; saved warm-start snapshot {path}")
+        return extractor
+
     def find_country_mentions(self, text):
         """
         Find all country name mentions in the text with their positions.
@@ -138,25 +263,72 @@ class WorldGeographyExtractor:
     # Minimum city name length (filters short ambiguous names)
     MIN_NAME_LENGTH = 4
 
+    def _city_record(self, city, country_name):
+        """Gazetteer record for a city in a country, or None."""
+        return self.locations.get(f"{city}, {country_name}".lower())
+
     def _is_valid_city(self, city, country_name):
         """Check if city meets minimum requirements (population, name length)."""
         if len(city) < self.MIN_NAME_LENGTH:
             return False
 
-        key = f"{city.lower()}, {country_name.lower()}"
-        if key not in self.locations:
-            return False
+        loc = self._city_record(city, country_name)
+        return loc is not None and loc.get('population', 0) >= self.MIN_POPULATION
 
-        loc = self.locations[key]
-        if loc.get('population', 0) < self.MIN_POPULATION:
-            return False
+    # Capitalized words considered as bare city names (bare-city mode only)
+    BARE_WORD_PATTERN = re.compile(r'\b[A-Z][a-z\u00C0-\u024F]+\b')
+    # Longest run of capitalized words tried as a single city name
+    MAX_CITY_WORDS = 3
 
-        return True
+    def bare_city_candidates(self, text):
+        """
+        Bare city names (no explicit country) within PROXIMITY_CHARS of a
+        country mention, as ('bare_city', city, nearby country codes).
+        candidate_location picks the most populous valid city whose
+        country is mentioned nearby.
+        """
+        mentions = sorted(self.find_country_mentions(text))
+        if not mentions:
+            return []
+        starts = [m[0] for m in mentions]
+
+        candidates = []
+        words = list(self.BARE_WORD_PATTERN.finditer(text))
+        i = 0
+        while i < len(words):
+            # Run of capitalized words joined by a single space or hyphen
+            run_end = i
+            while (run_end + 1 < len(words) and run_end - i + 1 < self.MAX_CITY_WORDS and
+                   text[words[run_end].end():words[run_end + 1].start()] in (' ', '-')):
+                run_end += 1
+
+            # Longest prefix of the run that names a known city
+            for j in range(run_end, i - 1, -1):
+                city = text[words[i].start():words[j].end()]
+                if city.lower() in self.city_countries:
+                    break
+            else:
+                i += 1
+                continue
 
-    def extract_locations(self, text):
+            start, end = words[i].start(), words[j].end()
+            i = j + 1
+
+            # Country mentions near the city, found by bisecting mention starts
+            lo = bisect_left(starts, start - self.PROXIMITY_CHARS)
+            hi = bisect_right(starts, end + self.PROXIMITY_CHARS)
+            nearby = {m[2] for m in mentions[lo:hi] if m[1] <= start or m[0] >= end}
+            if nearby:
+                candidates.append(('bare_city', city, tuple(sorted(nearby))))
+
+        return candidates
+
+    def location_candidates(self, text):
         """
-        Extract international locations using strict pattern matching.
-        Only matches explicit "City, Country" patterns - no loose proximity.
+        Raw candidates as (pattern, city, country_name, country_code) tuples:
+        explicit "City, Country" patterns, plus bare city names near a country
+        mention when bare-city mode is enabled. City population and name
+        length are only checked by candidate_location.
         """
         if not text:
             return []
@@ -165,8 +337,7 @@ class WorldGeographyExtractor:
         if len(text) > 50000:
             text = text[:50000]
 
-        locations = []
-        found_keys = set()
+        candidates = []
 
         # Pattern 1: "City, Country" - direct adjacency (most reliable)
         pattern1 = r'\b([A-Z][a-z\u00C0-\u024F]+(?:[\s-][A-Z][a-z\u00C0-\u024F]+)*),\s*([A-Z][a-z\u00C0-\u024F]+(?:\s+[A-Z][a-z\u00C0-\u024F]+)*)\b'
@@ -176,11 +347,7 @@ class WorldGeographyExtractor:
             country_code = self.countries.get('name_to_code', {}).get(country.lower())
             if country_code:
                 country_name = self.countries['code_to_name'].get(country_code, country)
-                if self._is_valid_city(city, country_name):
-                    key = f"{city.lower()}, {country_name.lower()}"
-                    if key not in found_keys:
-                        locations.append((city, country_name, country_code))
-                        found_keys.add(key)
+                candidates.append(('city_country', city, country_name, country_code))
 
         # Pattern 2: "City (Country)" format
         pattern2 = r'\b([A-Z][a-z\u00C0-\u024F]+(?:[\s-][A-Z][a-z\u00C0-\u024F]+)*)\s*\(([A-Z]{2,}|[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\)'
@@ -193,11 +360,7 @@ class WorldGeographyExtractor:
 
             if country_code:
                 country_name = self.countries['code_to_name'].get(country_code, country)
-                if self._is_valid_city(city, country_name):
-                    key = f"{city.lower()}, {country_name.lower()}"
-                    if key not in found_keys:
-                        locations.append((city, country_name, country_code))
-                        found_keys.add(key)
+                candidates.append(('city_paren_country', city, country_name, country_code))
 
         # Pattern 3: "City, XX" country code format
         pattern3 = r'\b([A-Z][a-z\u00C0-\u024F]+(?:[\s-][A-Z][a-z\u00C0-\u024F]+)*),\s*([A-Z]{2})\b'
@@ -214,11 +377,8 @@ class WorldGeographyExtractor:
 
             actual_code = 'GB' if code == 'UK' else code
             country_name = self.countries.get('code_to_name', {}).get(actual_code)
-            if country_name and self._is_valid_city(city, country_name):
-                key = f"{city.lower()}, {country_name.lower()}"
-                if key not in found_keys:
-                    locations.append((city, country_name, actual_code))
-                    found_keys.add(key)
+            if country_name:
+                candidates.append(('city_country_code', city, country_name, actual_code))
 
         # Pattern 4: "in/from/near City, Country" format
         pattern4 = r'\b(?:in|from|near|at)\s+([A-Z][a-z\u00C0-\u024F]+(?:[\s-][A-Z][a-z\u00C0-\u024F]+)*),\s*([A-Z][a-z\u00C0-\u024F]+(?:\s+[A-Z][a-z\u00C0-\u024F]+)*)\b'
@@ -231,150 +391,345 @@ class WorldGeographyExtractor:
             country_code = self.countries.get('name_to_code', {}).get(country.lower())
             if country_code:
                 country_name = self.countries['code_to_name'].get(country_code, country)
-                if self._is_valid_city(city, country_name):
-                    key = f"{city.lower()}, {country_name.lower()}"
-                    if key not in found_keys:
-                        locations.append((city, country_name, country_code))
-                        found_keys.add(key)
+                candidates.append(('preposition_city_country', city, country_name, country_code))
+
+        # Pattern 5: bare "City" near a country mention (opt-in)
+        if self.bare_cities:
+            candidates.extend(self.bare_city_candidates(text))
+
+        return candidates
+
+    def candidate_location(self, candidate):
+        """(city, country_name, country_code) for a raw candidate, or None if it does not validate."""
+        if candidate[0] == 'bare_city':
+            _, city, nearby = candidate
+            if city.lower() in self.common_names:
+                return None
+            for country_code in self.city_countries.get(city.lower(), ()):
+                if country_code in nearby:
+                    country_name = self.countries['code_to_name'].get(country_code)
+                    if country_name and self._is_valid_city(city, country_name):
+                        return city, country_name, country_code
+            return None
+
+        _, city, country_name, country_code = candidate
+        if self._is_valid_city(city, country_name):
+            return city, country_name, country_code
+        return None
+
+    def candidate_id(self, candidate):
+        """Location ID for a raw candidate, or None."""
+        location = self.candidate_location(candidate)
+        return None if location is None else self.resolve(*location)
 
+    def filter_candidates(self, candidates, precomputed=None):
+        """
+        (city, country_name, country_code) for the raw candidates that validate,
+        once per city. precomputed holds candidate_location() of each candidate
+        when already known.
+        """
+        locations = []
+        found_keys = set()
+        hits = self.pattern_hits
+        self.pattern_documents += 1
+        for index, candidate in enumerate(candidates):
+            location = self.candidate_location(candidate) if precomputed is None else precomputed[index]
+            if location is None:
+                continue
+            key = f"{location[0].lower()}, {location[1].lower()}"
+            if key not in found_keys:
+                locations.append(location)
+                found_keys.add(key)
+                hits[candidate[0]] += 1
         return locations
 
+    def extract_locations(self, text):
+        """
+        Extract international locations using strict pattern matching.
+        Only matches explicit "City, Country" patterns, plus bare city names
+        near a country mention when bare-city mode is enabled.
+        """
+        return self.filter_candidates(self.location_candidates(text))
+
     def validate_and_geocode(self, city, country_name, country_code):
         """
         Validate a city/country pair and return coordinates.
         Returns None if not a valid location.
         """
-        key = f"{city}, {country_name}".lower()
-
-        if key in self.locations:
-            loc = self.locations[key]
-            return {
-                'name': loc['name'],
-                'country': loc['country'],
-                'country_code': loc['country_code'],
-                'lat': loc['lat'],
-                'lng': loc['lng'],
-                'population': loc.get('population', 0),
-                'type': 'city'
-            }
-
-        # Try with ASCII name
-        key_ascii = f"{city.lower()}, {country_name.lower()}"
-        if key_ascii in self.locations:
-            loc = self.locations[key_ascii]
-            return {
-                'name': loc['name'],
-                'country': loc['country'],
-                'country_code': loc['country_code'],
-                'lat': loc['lat'],
-                'lng': loc['lng'],
-                'population': loc.get('population', 0),
-                'type': 'city'
-            }
+        # Name and ASCII-name aliases share one index (see world_cities.py)
+        loc = self._city_record(city, country_name)
+        if loc is None:
+            return None
+        return {
+            'name': loc['name'],
+            'country': loc['country'],
+            'country_code': loc['country_code'],
+            'lat': loc['lat'],
+            'lng': loc['lng'],
+            'population': loc.get('population', 0),
+            'type': 'city'
+        }
 
-        return None
+    # Memoized candidates; the cache is cleared once it reaches this size
+    RESOLVE_CACHE_SIZE = 200000
+
+    def resolve(self, city, country_name, country_code):
+        """
+        Resolve a city/country pair to its location ID.
+        Returns None if not a valid location with coordinates.
+        """
+        candidate = (city, country_name, country_code)
+        try:
+            return self._resolve_cache[candidate]
+        except KeyError:
+            pass
+
+        loc_id = None
+        validated = self.validate_and_geocode(city, country_name, country_code)
+        if validated and validated.get('lat'):
+            loc_id = self.table.intern(location_key(validated), validated)
+
+        if len(self._resolve_cache) >= self.RESOLVE_CACHE_SIZE:
+            self._resolve_cache.clear()
+        self._resolve_cache[candidate] = loc_id
+        return loc_id
+
+    def extract_location_ids(self, text):
+        """Extract locations from text and return distinct location IDs in mention order."""
+        return self.location_ids(self.extract_locations(text))
+
+    def location_ids(self, locations):
+        """Resolve (city, country_name, country_code) locations; distinct location IDs in order."""
+        ids = []
+        seen = set()
+        for city, country_name, country_code in locations:
+            loc_id = self.resolve(city, country_name, country_code)
+            if loc_id is not None and loc_id not in seen:
+                seen.add(loc_id)
+                ids.append(loc_id)
+        return ids
 
 
 def process_documents(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
-                      batch_size=1000, limit=None):
+                      batch_size=1000, limit=None, bare_cities=False, shared=False,
+                      build_postings=True, cooccurrence_top=None, cooccurrence_min_count=2,
+                      cooccurrence_max_pairs=2000000, checkpoint_path=None,
+                      checkpoint_interval=300, resume=False, shard=None,
+                      partial_dir='data/partials', prefetch=4, start_id=None, end_id=None,
+                      dedup=True, dedup_cache_size=100000, dedup_store=None, warm_start=None,
+                      progress_interval=5.0, candidate_store=None):
     """
     Process all documents and extract international geography mentions.
     Stores aggregated results in MongoDB.
+    With bare_cities=True, bare city names near a country mention are also counted.
+    With shared=True, the gazetteer is mapped from a shared store (see gazetteer.py).
+    With build_postings=True, a full location -> document postings index is stored too.
+    With cooccurrence_top=N, co-mention counts among the top N locations are stored,
+    keeping pairs seen at least cooccurrence_min_count times.
+    With checkpoint_path, aggregator state is saved every checkpoint_interval seconds;
+    resume=True continues from that checkpoint after the last processed _id.
+    With shard=(i, N), only documents whose _id hashes to shard i are processed and
+    a partial result is written to partial_dir instead of MongoDB (see merge_shards).
+    Documents are read in batches of batch_size on a background thread, up to
+    prefetch batches ahead (0 reads inline); start_id/end_id limit the _id range.
+    With dedup=True, documents with identical content are extracted once (see
+    dedup.py); dedup_store keeps those results on disk across runs.
+    With warm_start, the built extractor is loaded from (or saved to) that
+    snapshot file (see warmstart.py).
+    Progress is published to the job_status collection every progress_interval
+    seconds (see progress.py); 0 publishes stage changes only.
+    With candidate_store, each document's raw candidates are also recorded in
+    that file (see candidates.py), so resolve_candidates can redo the results
+    after a gazetteer or filter change without extracting again. The dedup
+    cache is bypassed while recording.
     """
     print(f"Connecting to MongoDB: {mongo_uri}")
     client = MongoClient(mongo_uri)
     db = client[db_name]
 
     # Initialize extractor
-    extractor = WorldGeographyExtractor()
-
-    # Count documents
-    total_docs = db.documents.count_documents({})
-    if limit:
-        total_docs = min(total_docs, limit)
-    print(f"Processing {total_docs} documents...")
-
-    # Aggregate geography counts
-    geo_counts = defaultdict(lambda: {
-        'count': 0,
-        'doc_ids': [],
-        'info': None
-    })
+    if warm_start:
+        extractor = WorldGeographyExtractor.warm_start(warm_start, bare_cities=bare_cities,
+                                                       shared=shared)
+    else:
+        extractor = WorldGeographyExtractor(bare_cities=bare_cities, shared=shared)
+    job = f"world_geography-shard-{shard[0]}-of-{shard[1]}" if shard else 'world_geography'
+    progress = ProgressPublisher(db, job, interval=progress_interval,
+                                 extractor=extractor)
+    progress.start('loading gazetteer')
+
+    extract = extractor.extract_location_ids
+    cache = None
+    if dedup:
+        extract = cache = ExtractionCache(extractor.extract_location_ids, extractor.table,
+                                          'world_geography', dedup_cache_size, dedup_store,
+                                          extractor.dedup_params())
+
+    # Aggregate mention counts by location ID
+    mentions = MentionCounts(len(extractor.table))
+    postings = PostingsBuilder() if build_postings else None
+    cooccurrence = None
+    if cooccurrence_top:
+        cooccurrence = CooccurrenceCounter(max_pairs=cooccurrence_max_pairs)
 
     # Process documents - skip very large docs that cause regex issues
+    # Documents are read in _id order, so a checkpoint's last _id marks exactly what is done
     processed = 0
     # Use $expr with $strLenCP to filter by text length (skip docs > 50k chars)
     query = {
+        **id_range(start_id, end_id),
         '$expr': {
             '$lt': [{'$strLenCP': {'$ifNull': ['$text', '']}}, 50000]
         }
     }
-    cursor = db.documents.find(query, {'_id': 1, 'text': 1, 'title': 1})
 
-    if limit:
-        cursor = cursor.limit(limit)
+    if shard and checkpoint_path:
+        root, ext = os.path.splitext(checkpoint_path)
+        checkpoint_path = f"{root}-shard-{shard[0]}-of-{shard[1]}{ext}"
+    checkpointer = (Checkpointer(checkpoint_path, checkpoint_interval, extractor.table)
+                    if checkpoint_path else None)
+    if resume and checkpointer:
+        state = checkpointer.load()
+        if state:
+            mentions = state['mentions']
+            postings = state['postings']
+            cooccurrence = state['cooccurrence']
+            processed = state['processed']
+            query['_id'] = {**query.get('_id', {}), '$gt': state['last_id']}
+            progress.resume_from(processed)
+            print(f"Resuming from checkpoint after {processed} documents (last _id {state['last_id']})")
+
+    candidate_writer = None
+    if candidate_store:
+        candidate_writer = CandidateWriter(candidate_store_path(candidate_store, shard),
+                                           extractor.candidate_params(),
+                                           extractor.candidate_sources(),
+                                           resume_after=processed if processed else None)
 
-    for doc in tqdm(cursor, total=total_docs, desc="Extracting world geographies"):
+    # Count documents
+    total_docs = db.documents.count_documents(id_range(start_id, end_id))
+    if shard:
+        # Approximate: _id hashes spread documents evenly over shards
+        total_docs //= shard[1]
+    if limit:
+        total_docs = min(total_docs, limit)
+    print(f"Processing {total_docs} documents...")
+    progress.set_stage('extracting', total=total_docs)
+
+    cursor = []
+    reader = None
+    if not limit or limit > processed:
+        cursor = iter_documents(db.documents, query, {'_id': 1, 'text': 1, 'title': 1},
+                                batch_size=batch_size, shard=shard,
+                                limit=limit - processed if limit else None)
+        if prefetch:
+            cursor = reader = PrefetchReader(cursor, batch_size, prefetch)
+
+    for doc in tqdm(cursor, total=total_docs, initial=processed, desc="Extracting world geographies"):
         text = doc.get('text', '') or ''
         title = doc.get('title', '') or ''
         full_text = f"{title} {text}"
 
-        # Extract locations
-        raw_locations = extractor.extract_locations(full_text)
-
-        # Validate and count
-        seen_in_doc = set()
-        for city, country_name, country_code in raw_locations:
-            validated = extractor.validate_and_geocode(city, country_name, country_code)
-            if validated and validated.get('lat'):
-                # Create a canonical key
-                key = f"{validated['name']}, {validated['country']}".lower()
-
-                if key not in seen_in_doc:
-                    seen_in_doc.add(key)
-                    geo_counts[key]['count'] += 1
-                    geo_counts[key]['info'] = validated
-                    # Store doc_ids for small counts
-                    if geo_counts[key]['count'] <= 100:
-                        geo_counts[key]['doc_ids'].append(str(doc['_id']))
+        # Extract, validate and count each location once per document
+        if candidate_writer is not None:
+            candidates = extractor.location_candidates(full_text)
+            candidate_writer.add(doc['_id'], candidates)
+            loc_ids = extractor.location_ids(extractor.filter_candidates(candidates))
+        else:
+            loc_ids = extract(full_text)
+        mentions.add(doc['_id'], loc_ids)
+        if postings is not None:
+            postings.add(doc['_id'], loc_ids)
+        if cooccurrence is not None:
+            cooccurrence.add(loc_ids)
 
         processed += 1
+        progress.processed = processed
 
-    print(f"\nProcessed {processed} documents")
-    print(f"Found {len(geo_counts)} unique world locations")
+        if checkpointer and checkpointer.due():
+            # Candidates first: a resumed run trims the store back to the checkpoint
+            if candidate_writer is not None:
+                candidate_writer.commit()
+            checkpointer.save(last_id=doc['_id'], processed=processed, mentions=mentions,
+                              postings=postings, cooccurrence=cooccurrence)
 
+    print(f"\nProcessed {processed} documents")
+    if reader is not None:
+        print(reader.summary())
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+    if candidate_writer is not None:
+        candidate_writer.close()
+    print(f"Found {len(mentions)} unique world locations")
+
+    if shard:
+        progress.set_stage('writing partial')
+        partial = export_partial(extractor.table, mentions, postings, cooccurrence, shard=shard,
+                                 processed=processed)
+        path = partial_path(partial_dir, 'world_geography', shard)
+        save_checkpoint(path, partial)
+        print(f"Wrote partial result for shard {shard[0]}/{shard[1]} to {path}")
+    else:
+        progress.set_stage('storing results')
+        store_results(db, extractor.table, mentions, postings, cooccurrence,
+                      cooccurrence_top, cooccurrence_min_count)
+
+    # The run is complete; a later --resume must not pick up stale state
+    if checkpointer:
+        checkpointer.clear()
+    progress.finish()
+
+    return mentions
+
+
+def store_results(db, table, mentions, postings=None, cooccurrence=None,
+                  cooccurrence_top=None, cooccurrence_min_count=2):
+    """
+    Store aggregated mention counts in MongoDB, with the postings index and
+    co-occurrence lists when those were collected.
+    """
     # Store results in MongoDB
     print("\nStoring results in MongoDB...")
     db.world_geography_counts.drop()
 
     geo_docs = []
-    for key, data in geo_counts.items():
-        if data['info'] and data['count'] >= 1:
-            geo_doc = {
-                'location_key': key,
-                'name': data['info'].get('name', key),
-                'country': data['info'].get('country', ''),
-                'country_code': data['info'].get('country_code', ''),
-                'lat': data['info'].get('lat'),
-                'lng': data['info'].get('lng'),
-                'population': data['info'].get('population', 0),
-                'count': data['count'],
-                'type': 'city',
-                'sample_doc_ids': data['doc_ids'][:10],
-                'updated_at': datetime.utcnow()
-            }
-            geo_docs.append(geo_doc)
+    for loc_id, count, doc_ids in mentions.items():
+        # Location strings are only materialized here, when writing results
+        key = table.key(loc_id)
+        info = table.record(loc_id)
+        geo_doc = {
+            'location_key': key,
+            'name': info.get('name', key),
+            'country': info.get('country', ''),
+            'country_code': info.get('country_code', ''),
+            'lat': info.get('lat'),
+            'lng': info.get('lng'),
+            'population': info.get('population', 0),
+            'count': count,
+            'type': 'city',
+            'sample_doc_ids': [str(doc_id) for doc_id in doc_ids[:10]],
+            'updated_at': datetime.utcnow()
+        }
+        geo_docs.append(geo_doc)
 
     if geo_docs:
         db.world_geography_counts.insert_many(geo_docs)
-        db.world_geography_counts.create_index('location_key')
-        db.world_geography_counts.create_index('count')
-        db.world_geography_counts.create_index('country')
-        db.world_geography_counts.create_index('country_code')
-        db.world_geography_counts.create_index([('lat', 1), ('lng', 1)])
+        # Compound indexes matching the API's query shapes (see indexes.py)
+        ensure_indexes(db, 'world_geography_counts')
 
     print(f"Stored {len(geo_docs)} world location records")
 
+    if postings is not None:
+        store_postings(db, 'world_geography', postings, table.key)
+
+    if cooccurrence is not None:
+        related = cooccurrence.top_related(mentions.counts, cooccurrence_top, cooccurrence_min_count)
+        store_cooccurrence(db, 'world_geography', related, table.key)
+
+    # Let in-memory views of the results (e.g. app.py's spatial index) rebuild
+    bump_generation(db, 'world_geography')
+
     # Print top locations
     print("\nTop 20 world locations by mention count:")
     top_20 = sorted(geo_docs, key=lambda x: x['count'], reverse=True)[:20]
@@ -384,6 +739,77 @@ def process_documents(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs
     return geo_docs
 
 
+def resolve_candidates(candidate_paths, mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
+                       bare_cities=False, shared=False, build_postings=True, cooccurrence_top=None,
+                       cooccurrence_min_count=2, cooccurrence_max_pairs=2000000, warm_start=None,
+                       progress_interval=5.0):
+    """
+    Recompute and store the results from candidate stores recorded by
+    process_documents(candidate_store=...), e.g. one per shard. Documents
+    are not read or extracted again; only the filters and the gazetteer are
+    applied, once per distinct candidate. bare_cities must match the
+    recording run.
+    """
+    print(f"Connecting to MongoDB: {mongo_uri}")
+    client = MongoClient(mongo_uri)
+    db = client[db_name]
+
+    if warm_start:
+        extractor = WorldGeographyExtractor.warm_start(warm_start, bare_cities=bare_cities,
+                                                       shared=shared)
+    else:
+        extractor = WorldGeographyExtractor(bare_cities=bare_cities, shared=shared)
+    progress = ProgressPublisher(db, 'world_geography', interval=progress_interval,
+                                 extractor=extractor)
+    progress.start('loading gazetteer')
+
+    mentions = MentionCounts(len(extractor.table))
+    postings = PostingsBuilder() if build_postings else None
+    cooccurrence = None
+    if cooccurrence_top:
+        cooccurrence = CooccurrenceCounter(max_pairs=cooccurrence_max_pairs)
+
+    progress.set_stage('resolving candidates')
+    processed = resolve_documents(extractor, candidate_paths, mentions, postings, cooccurrence,
+                                  progress)
+    print(f"Resolved candidates of {processed} documents; "
+          f"found {len(mentions)} unique world locations")
+
+    progress.set_stage('storing results')
+    store_results(db, extractor.table, mentions, postings, cooccurrence,
+                  cooccurrence_top, cooccurrence_min_count)
+    progress.finish()
+
+    return mentions
+
+
+def merge_shards(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
+                 partial_dir='data/partials', cooccurrence_top=None, cooccurrence_min_count=2):
+    """
+    Merge the shard partials in partial_dir and store the combined result in
+    MongoDB, exactly as a single process_documents run would.
+    """
+    partials = load_partials(partial_dir, 'world_geography')
+    if not partials:
+        raise FileNotFoundError(f"No partial results found in {partial_dir}")
+
+    merged = merge_partials(partials)
+    shard_count = merged['shards'][0][1] if merged['shards'] else 1
+    missing = sorted(set(range(shard_count)) - {index for index, _ in merged['shards']})
+    if missing:
+        print(f"Warning: missing shards {missing} of {shard_count}")
+    print(f"Merged {len(partials)} partial results covering {merged['documents']} documents")
+
+    table, mentions, postings, cooccurrence = import_partial(merged)
+
+    print(f"Connecting to MongoDB: {mongo_uri}")
+    client = MongoClient(mongo_uri)
+    db = client[db_name]
+
+    return store_results(db, table, mentions, postings, cooccurrence,
+                         cooccurrence_top, cooccurrence_min_count)
+
+
 if __name__ == '__main__':
     import argparse
 
@@ -392,13 +818,104 @@ if __name__ == '__main__':
                         help='MongoDB connection URI')
     parser.add_argument('--db', default='toxic_docs', help='Database name')
     parser.add_argument('--limit', type=int, help='Limit number of documents to process')
-    parser.add_argument('--batch-size', type=int, default=1000, help='Batch size')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Documents per cursor batch read from MongoDB')
+    parser.add_argument('--prefetch', type=int, default=4,
+                        help='Batches read ahead on a background thread (0 reads inline)')
+    parser.add_argument('--start-id', type=parse_doc_id,
+                        help='Only process documents with _id >= this value')
+    parser.add_argument('--end-id', type=parse_doc_id,
+                        help='Only process documents with _id < this value')
+    parser.add_argument('--bare-cities', action='store_true',
+                        help='Also match bare city names near a country mention')
+    parser.add_argument('--shared-gazetteer', action='store_true',
+                        help='Map the gazetteer from a shared read-only store')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Extract every document even if its content was seen before')
+    parser.add_argument('--dedup-cache-size', type=int, default=100000,
+                        help='Content hashes kept in the in-memory dedup cache')
+    parser.add_argument('--dedup-store',
+                        help='SQLite file keeping dedup results across runs')
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help='Seconds between progress updates in job_status (0: stage changes only)')
+    parser.add_argument('--warm-start',
+                        help='Snapshot file to load the built extractor from (saved there if stale)')
+    parser.add_argument('--no-postings', action='store_true',
+                        help='Skip building the location -> document postings index')
+    parser.add_argument('--cooccurrence-top', type=int,
+                        help='Store co-mention counts among the top N locations')
+    parser.add_argument('--cooccurrence-min-count', type=int, default=2,
+                        help='Minimum co-mention count kept per location pair')
+    parser.add_argument('--cooccurrence-max-pairs', type=int, default=2000000,
+                        help='Maximum location pairs held in memory before pruning')
+    parser.add_argument('--checkpoint', default='data/checkpoints/world_geographies.ckpt',
+                        help='Checkpoint file for resuming interrupted runs')
+    parser.add_argument('--checkpoint-interval', type=int, default=300,
+                        help='Seconds between checkpoints (0 disables)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue from the last checkpoint')
+    parser.add_argument('--shard', type=parse_shard,
+                        help='Process only shard i of N ("i/N") and write a partial result')
+    parser.add_argument('--partial-dir', default='data/partials',
+                        help='Directory for shard partial results')
+    parser.add_argument('--merge', action='store_true',
+                        help='Merge shard partial results from --partial-dir into MongoDB')
+    parser.add_argument('--candidates',
+                        help='Also record raw candidates in this store (per shard with --shard)')
+    parser.add_argument('--resolve-candidates', nargs='+', metavar='STORE',
+                        help='Recompute results from recorded candidate stores instead of extracting')
 
     args = parser.parse_args()
 
+    if args.merge:
+        merge_shards(
+            mongo_uri=args.mongo_uri,
+            db_name=args.db,
+            partial_dir=args.partial_dir,
+            cooccurrence_top=args.cooccurrence_top,
+            cooccurrence_min_count=args.cooccurrence_min_count
+        )
+        sys.exit(0)
+
+    if args.resolve_candidates:
+        resolve_candidates(
+            args.resolve_candidates,
+            mongo_uri=args.mongo_uri,
+            db_name=args.db,
+            bare_cities=args.bare_cities,
+            shared=args.shared_gazetteer,
+            build_postings=not args.no_postings,
+            cooccurrence_top=args.cooccurrence_top,
+            cooccurrence_min_count=args.cooccurrence_min_count,
+            cooccurrence_max_pairs=args.cooccurrence_max_pairs,
+            warm_start=args.warm_start,
+            progress_interval=args.progress_interval
+        )
+        sys.exit(0)
+
     process_documents(
         mongo_uri=args.mongo_uri,
         db_name=args.db,
         batch_size=args.batch_size,
-        limit=args.limit
+        limit=args.limit,
+        bare_cities=args.bare_cities,
+        shared=args.shared_gazetteer,
+        build_postings=not args.no_postings,
+        cooccurrence_top=args.cooccurrence_top,
+        cooccurrence_min_count=args.cooccurrence_min_count,
+        cooccurrence_max_pairs=args.cooccurrence_max_pairs,
+        checkpoint_path=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume,
+        shard=args.shard,
+        partial_dir=args.partial_dir,
+        prefetch=args.prefetch,
+        start_id=args.start_id,
+        end_id=args.end_id,
+        dedup=not args.no_dedup,
+        dedup_cache_size=args.dedup_cache_size,
+        dedup_store=args.dedup_store,
+        warm_start=args.warm_start,
+        progress_interval=args.progress_interval,
+        candidate_store=args.candidates
     )
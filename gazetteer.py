@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Gazetteer storage shared by the US and world extractors.
+
+LocationTable assigns dense integer IDs to canonical locations, so aggregation
+can run on integer arrays and location strings are only materialized when
+results are written.
+
+Place records carry precomputed flag bits (see setup_census_data.py), so the
+extractors test a bit on a resolved ID instead of loading word lists.
+
+MappedStore is a read-only, dict-like view of a gazetteer published once to a
+binary file and mapped with mmap. Every process that maps the same file shares
+its pages, so gunicorn and extraction workers don't each hold a private copy.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import Mapping
+from functools import lru_cache
+
+from world_cities import WORLD_GAZETTEER_FILE, WorldGazetteer
+
+# Store layout: header, hash buckets (entry index + 1, 0 = empty),
+# entries (key offset, key length, value offset, value length), blob
+STORE_MAGIC = b'GZS1'
+STORE_HEADER = struct.Struct('<4sII')
+STORE_SUFFIX = '.gzstore'
+
+# Gazetteer files published by `python gazetteer.py publish`
+GAZETTEER_FILES = ('us_locations.json', 'us_counties.json', 'city_states_index.json',
+                   WORLD_GAZETTEER_FILE, 'world_locations.json')
+
+# Normalized gazetteer files, read through their own mapping class instead of json.load
+GAZETTEER_LOADERS = {WORLD_GAZETTEER_FILE: WorldGazetteer.load}
+
+# Record flag bits: the place name is also a common first/last name or English word
+COMMON_NAME = 1
+COMMON_WORD = 2
+
+
+def load_word_set(*paths):
+    """Lowercased, non-empty lines of the given word lists; missing files are skipped."""
+    words = set()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                words.update(line.strip().lower() for line in f if line.strip())
+    return words
+
+
+class LocationTable:
+    """Intern canonical locations, assigning each a dense integer ID."""
+
+    def __init__(self, lookup=None):
+        self.keys = []
+        self.ids = {}
+        self.flags = array('B')
+        # With a lookup function, records stay in the (shared) store
+        self.lookup = lookup
+        self.records = None if lookup else []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def intern(self, key, record):
+        """Return the ID for a canonical key, assigning the next free ID if new."""
+        loc_id = self.ids.get(key)
+        if loc_id is None:
+            loc_id = len(self.keys)
+            self.ids[key] = loc_id
+            self.keys.append(key)
+            self.flags.append(record.get('flags', 0) if record else 0)
+            if self.records is not None:
+                self.records.append(record)
+        return loc_id
+
+    def key(self, loc_id):
+        """Canonical location key (e.g. "midland, michigan") for an ID."""
+        return self.keys[loc_id]
+
+    def record(self, loc_id):
+        """Gazetteer record (name, coordinates, ...) for an ID."""
+        if self.records is None:
+            return self.lookup(self.keys[loc_id])
+        return self.records[loc_id]
+
+
+def publish_store(mapping, path):
+    """
+    Write a string-keyed mapping of JSON values to a read-only store file.
+    Identical values (e.g. one place under several key variants) are stored once.
+    The file is written to a temp name and renamed, so readers never see it half-written.
+    """
+    keys = list(mapping)
+    n_buckets = 1
+    while n_buckets < 2 * len(keys):
+        n_buckets <<= 1
+    mask = n_buckets - 1
+
+    buckets = array('I', [0]) * n_buckets
+    entries = array('I')
+    blob = bytearray()
+    value_offsets = {}
+
+    for i, key in enumerate(keys):
+        value = json.dumps(mapping[key], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        value_pos = value_offsets.get(value)
+        if value_pos is None:
+            value_pos = value_offsets[value] = (len(blob), len(value))
+            blob += value
+
+        key_bytes = key.encode('utf-8')
+        entries.extend((len(blob), len(key_bytes)) + value_pos)
+        blob += key_bytes
+
+        slot = zlib.crc32(key_bytes) & mask
+        while buckets[slot]:
+            slot = (slot + 1) & mask
+        buckets[slot] = i + 1
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(STORE_HEADER.pack(STORE_MAGIC, len(keys), n_buckets))
+        f.write(buckets.tobytes())
+        f.write(entries.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class MappedStore(Mapping):
+    """Read-only dict-like view of a store written by publish_store."""
+
+    # Decoded values kept per process (hot cities and states)
+    CACHE_SIZE = 4096
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._len, n_buckets = STORE_HEADER.unpack_from(self._mm, 0)
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{path} is not a gazetteer store")
+
+        view = memoryview(self._mm)
+        offset = STORE_HEADER.size
+        self._buckets = view[offset:offset + 4 * n_buckets].cast('I')
+        offset += 4 * n_buckets
+        self._entries = view[offset:offset + 16 * self._len].cast('I')
+        self._blob = offset + 16 * self._len
+        self._mask = n_buckets - 1
+        self._decode = lru_cache(maxsize=self.CACHE_SIZE)(self._decode_value)
+
+    def __reduce__(self):
+        return (MappedStore, (self.path,))
+
+    def _key_bytes(self, i):
+        start = self._blob + self._entries[4 * i]
+        return self._mm[start:start + self._entries[4 * i + 1]]
+
+    def _decode_value(self, offset, length):
+        start = self._blob + offset
+        return json.loads(self._mm[start:start + length])
+
+    def _find(self, key):
+        """Entry index for a key, or -1 if absent."""
+        if not isinstance(key, str):
+            return -1
+        key_bytes = key.encode('utf-8')
+        slot = zlib.crc32(key_bytes) & self._mask
+        while True:
+            entry = self._buckets[slot]
+            if not entry:
+                return -1
+            if self._key_bytes(entry - 1) == key_bytes:
+                return entry - 1
+            slot = (slot + 1) & self._mask
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._decode(self._entries[4 * i + 2], self._entries[4 * i + 3])
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._key_bytes(i).decode('utf-8')
+
+    def __len__(self):
+        return self._len
+
+
+def store_path_for(json_path):
+    """Path of the published store for a gazetteer JSON file."""
+    return os.path.splitext(json_path)[0] + STORE_SUFFIX
+
+
+def read_gazetteer(json_path):
+    """Read a gazetteer JSON file as a mapping (a dict, or its loader's mapping class)."""
+    loader = GAZETTEER_LOADERS.get(os.path.basename(json_path))
+    if loader:
+        return loader(json_path)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_gazetteer(json_path, shared=False):
+    """
+    Load a gazetteer JSON file as a mapping, or with shared=True as a MappedStore.
+    The store is (re)published from the JSON file if missing or out of date.
+    """
+    if not shared:
+        return read_gazetteer(json_path)
+
+    store_path = store_path_for(json_path)
+    if (not os.path.exists(store_path) or
+            os.path.getmtime(store_path) < os.path.getmtime(json_path)):
+        publish_store(read_gazetteer(json_path), store_path)
+    return MappedStore(store_path)
+
+
+def publish_all(data_dir='data'):
+    """Publish every gazetteer file in data_dir, ahead of starting workers."""
+    for filename in GAZETTEER_FILES:
+        json_path = os.path.join(data_dir, filename)
+        if not os.path.exists(json_path):
+            continue
+        mapping = read_gazetteer(json_path)
+        store_path = store_path_for(json_path)
+        publish_store(mapping, store_path)
+        print(f"Published {len(mapping)} keys from {json_path} to {store_path} "
+              f"({os.path.getsize(store_path) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Publish gazetteer files to shared read-only stores')
+    parser.add_argument('--data-dir', default='data', help='Directory with gazetteer JSON files')
+
+    args = parser.parse_args()
+
+    publish_all(args.data_dir)
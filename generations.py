@@ -0,0 +1,28 @@
+"""
+Generation counters for stored results.
+
+store_results bumps the generation for its collection prefix after writing,
+so in-memory structures built from the results (e.g. the spatial index in
+app.py) can tell when to rebuild with one cheap lookup.
+"""
+
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+
+def bump_generation(db, prefix):
+    """Increment and return the results generation for a collection prefix."""
+    doc = db.result_generations.find_one_and_update(
+        {'_id': prefix},
+        {'$inc': {'generation': 1}, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc['generation']
+
+
+def current_generation(db, prefix):
+    """Current results generation for a collection prefix (0 if never stored)."""
+    doc = db.result_generations.find_one({'_id': prefix}, {'generation': 1})
+    return doc['generation'] if doc else 0
@@ -0,0 +1,263 @@
+"""
+Pre-rendered heatmap tiles of mention counts.
+
+build_tiles renders a count-weighted density pyramid (zoom 0 to max_zoom, XYZ
+Web Mercator tiles as used by Leaflet) from a results collection and stores
+it as one SQLite file per collection prefix, e.g. data/tiles/geography.tiles.
+Each location splats log(1 + count) onto a grid of TILE_CELLS x TILE_CELLS
+cells per tile with a small Gaussian kernel; a zoom level is normalized by
+its densest cell so neighbouring tiles share one colour scale. Tiles with no
+density are not stored (TileStore serves EMPTY_TILE for them), and the PNGs
+are TILE_CELLS pixels wide: the map scales them up to its 256px tiles, which
+also smooths the heat.
+
+Rendering is a post-processing step after extraction:
+
+    python heatmap.py build geography
+    python heatmap.py build world_geography --snapshot data/world_results.json
+"""
+
+import math
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from collections import defaultdict
+from datetime import datetime
+
+TILES_DIR = 'data/tiles'
+TILES_SUFFIX = '.tiles'
+TILE_CELLS = 64
+MAX_ZOOM = 10
+
+# Kernel radius in cells; blobs keep the same on-screen size at every zoom
+KERNEL_RADIUS = 3
+
+# Web Mercator is undefined at the poles
+MAX_LAT = 85.0511287798
+
+
+def png_bytes(width, height, rows):
+    """Encode rows of RGBA bytes as a PNG image."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    raw = b''.join(b'\x00' + row for row in rows)
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(raw, 9)) +
+            chunk(b'IEND', b''))
+
+
+TRANSPARENT = b'\x00\x00\x00\x00'
+EMPTY_TILE = png_bytes(1, 1, [TRANSPARENT])
+
+# Colour stops (intensity, r, g, b, alpha) from faint blue to opaque red
+RAMP = (
+    (0.0, 0, 0, 255, 0),
+    (0.2, 0, 128, 255, 140),
+    (0.4, 0, 255, 200, 180),
+    (0.6, 128, 255, 0, 210),
+    (0.8, 255, 200, 0, 230),
+    (1.0, 255, 0, 0, 250),
+)
+
+
+def color_table(ramp=RAMP, levels=256):
+    """RGBA bytes for each of levels intensities, interpolated along the ramp."""
+    table = []
+    for level in range(levels):
+        t = level / (levels - 1)
+        for (t0, *c0), (t1, *c1) in zip(ramp, ramp[1:]):
+            if t <= t1:
+                f = (t - t0) / (t1 - t0)
+                table.append(bytes(round(a + (b - a) * f) for a, b in zip(c0, c1)))
+                break
+    return table
+
+
+COLORS = color_table()
+
+
+def project(lat, lng, zoom):
+    """Global cell coordinates (x, y) of a point at a zoom level."""
+    scale = TILE_CELLS * 2 ** zoom
+    lat = max(min(lat, MAX_LAT), -MAX_LAT)
+    sin_lat = math.sin(math.radians(lat))
+    x = (lng + 180) / 360 * scale
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def kernel(radius=KERNEL_RADIUS):
+    """(dx, dy, weight) offsets of a Gaussian kernel truncated at radius cells."""
+    sigma = radius / 2
+    return [(dx, dy, math.exp(-(dx * dx + dy * dy) / (2 * sigma * sigma)))
+            for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+            if dx * dx + dy * dy <= radius * radius]
+
+
+def density(points, zoom, offsets):
+    """Weighted density per global cell at a zoom level; x wraps around the antimeridian."""
+    cells_x = TILE_CELLS * 2 ** zoom
+    grid = defaultdict(float)
+    for lat, lng, weight in points:
+        x, y = project(lat, lng, zoom)
+        cx, cy = int(x), int(y)
+        for dx, dy, k in offsets:
+            y2 = cy + dy
+            if 0 <= y2 < cells_x:
+                grid[(cx + dx) % cells_x, y2] += weight * k
+    return grid
+
+
+def render_tiles(grid):
+    """Yield (x, y, png) for each tile with density in a zoom level's grid."""
+    peak = max(grid.values(), default=0)
+    if not peak:
+        return
+    tiles = defaultdict(dict)
+    for (cx, cy), value in grid.items():
+        tiles[cx // TILE_CELLS, cy // TILE_CELLS][cx % TILE_CELLS, cy % TILE_CELLS] = value
+
+    scale = (len(COLORS) - 1) / math.sqrt(peak)
+    for (x, y), cells in tiles.items():
+        image = [[TRANSPARENT] * TILE_CELLS for _ in range(TILE_CELLS)]
+        visible = False
+        for (col, row), value in cells.items():
+            level = int(math.sqrt(value) * scale)
+            if level:
+                image[row][col] = COLORS[level]
+                visible = True
+        if visible:
+            yield x, y, png_bytes(TILE_CELLS, TILE_CELLS, (b''.join(row) for row in image))
+
+
+def heat_points(rows):
+    """(lat, lng, weight) for each row with coordinates and mentions."""
+    points = []
+    for row in rows:
+        if row.get('lat') is None or row.get('lng') is None or not row.get('count'):
+            continue
+        points.append((row['lat'], row['lng'], math.log1p(row['count'])))
+    return points
+
+
+def tiles_path(prefix, tiles_dir=TILES_DIR):
+    return os.path.join(tiles_dir, prefix + TILES_SUFFIX)
+
+
+def build_tiles(rows, path, max_zoom=MAX_ZOOM, generation=None):
+    """Render the tile pyramid for rows and atomically replace the file at path."""
+    points = heat_points(rows)
+    offsets = kernel()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    db = sqlite3.connect(tmp_path)
+    db.execute('CREATE TABLE tiles (z INTEGER, x INTEGER, y INTEGER, png BLOB, '
+               'PRIMARY KEY (z, x, y)) WITHOUT ROWID')
+    db.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    total = 0
+    for zoom in range(max_zoom + 1):
+        tiles = [(zoom, x, y, png) for x, y, png in render_tiles(density(points, zoom, offsets))]
+        db.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)', tiles)
+        total += len(tiles)
+        print(f"Zoom {zoom}: {len(tiles)} tiles")
+    db.executemany('INSERT INTO meta VALUES (?, ?)', [
+        ('max_zoom', str(max_zoom)),
+        ('locations', str(len(points))),
+        ('generation', '' if generation is None else str(generation)),
+        ('built_at', datetime.utcnow().isoformat())
+    ])
+    db.commit()
+    db.close()
+    os.replace(tmp_path, path)
+    print(f"Wrote {total} tiles for {len(points)} locations to {path} "
+          f"({os.path.getsize(path)} bytes)")
+    return total
+
+
+class TileStore:
+    """Serve tiles from a tile file, reopening it when it is rebuilt."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = None
+        self.mtime = None
+        self.meta = {}
+
+    def _current(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self.lock:
+            if mtime != self.mtime:
+                if self.db is not None:
+                    self.db.close()
+                self.db = None
+                self.meta = {}
+                if mtime is not None:
+                    self.db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True,
+                                              check_same_thread=False)
+                    self.meta = dict(self.db.execute('SELECT key, value FROM meta'))
+                self.mtime = mtime
+            return self.db
+
+    def tile(self, z, x, y):
+        """(png, version) for a tile; EMPTY_TILE where nothing was rendered."""
+        db = self._current()
+        version = f"{self.mtime or 0:x}"
+        if db is None:
+            return EMPTY_TILE, version
+        with self.lock:
+            row = db.execute('SELECT png FROM tiles WHERE z = ? AND x = ? AND y = ?',
+                             (z, x, y)).fetchone()
+        return (row[0] if row else EMPTY_TILE), version
+
+
+def read_rows(prefix, mongo_uri, db_name, snapshot_path=None):
+    """Location rows from a snapshot export, or from the prefix's counts collection."""
+    if snapshot_path:
+        from snapshot import load_rows
+        return load_rows(snapshot_path), None
+
+    from pymongo import MongoClient
+    from generations import current_generation
+
+    db = MongoClient(mongo_uri)[db_name]
+    projection = {'_id': 0, 'lat': 1, 'lng': 1, 'count': 1}
+    rows = list(db[f'{prefix}_counts'].find({'lat': {'$ne': None}}, projection))
+    return rows, current_generation(db, prefix)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Render heatmap tile pyramids')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Render tiles for a results collection')
+    build_parser.add_argument('prefix', choices=['geography', 'world_geography'],
+                              help='Collection prefix to render')
+    build_parser.add_argument('--mongo-uri', default='mongodb://localhost:27017',
+                              help='MongoDB connection URI')
+    build_parser.add_argument('--db', default='toxic_docs', help='Database name')
+    build_parser.add_argument('--snapshot',
+                              help='Render from a results export (see snapshot.py) instead of MongoDB')
+    build_parser.add_argument('--tiles-dir', default=TILES_DIR, help='Directory for tile files')
+    build_parser.add_argument('--max-zoom', type=int, default=MAX_ZOOM,
+                              help='Deepest zoom level to render')
+
+    args = parser.parse_args()
+
+    rows, generation = read_rows(args.prefix, args.mongo_uri, args.db, args.snapshot)
+    build_tiles(rows, tiles_path(args.prefix, args.tiles_dir), args.max_zoom, generation)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+MongoDB indexes derived from the API's query shapes.
+
+Each QueryShape mirrors a query made by app.py. Its index follows the ESR
+rule: equality fields first, then the sort fields, then range fields. A
+shape with leading fields (the anchored location_key prefix of a search, the
+coordinates of a full scan) has them right after its equality fields
+instead, and sorts its matches in memory. A shape whose fields are already
+contained in an index with the same equality + sort (or leading) prefix
+reuses it.
+
+When a route's query changes, update its shape here.
+
+Usage:
+    python indexes.py           # create indexes
+    python indexes.py --check   # explain() every shape; fail on COLLSCAN, or an
+                                # in-memory SORT in a shape without leading fields
+"""
+
+import sys
+from collections import namedtuple
+
+from pymongo import MongoClient
+
+QueryShape = namedtuple('QueryShape', 'collection name filter sort projection leading',
+                        defaults=((),))
+
+# Sort used by the location endpoints; location_key makes keyset pagination stable
+LOCATION_SORT = [('count', -1), ('location_key', 1)]
+
+HAS_VALUE = {'$exists': True, '$ne': None}
+
+US_LOCATION_FIELDS = ('location_key', 'name', 'state', 'state_abbrev', 'county',
+                      'lat', 'lng', 'count', 'type')
+US_SEARCH_FIELDS = ('location_key', 'name', 'state', 'county', 'count', 'lat', 'lng', 'type')
+WORLD_LOCATION_FIELDS = ('location_key', 'name', 'country', 'country_code', 'lat', 'lng',
+                         'count', 'population', 'type')
+WORLD_SEARCH_FIELDS = ('location_key', 'name', 'country', 'country_code', 'count',
+                       'lat', 'lng', 'type')
+
+
+def _locations_filter(**equality):
+    """Filter used by /api/geographies and /api/world/geographies."""
+    return {**equality, 'count': {'$gte': 1}, 'lat': HAS_VALUE, 'lng': HAS_VALUE}
+
+
+def _keyset_filter(**equality):
+    """Filter for a streamed page after (count, location_key)."""
+    return {**_locations_filter(**equality),
+            '$or': [{'count': {'$lt': 100}}, {'count': 100, 'location_key': {'$gt': 'midland'}}]}
+
+
+def _search_filter():
+    """Filter used by the /search endpoints."""
+    return {'location_key': {'$regex': '^mid'}, 'lat': HAS_VALUE}
+
+
+def _coordinates_filter():
+    """Filter used to load every location with coordinates (spatial index, snapshots)."""
+    return {'lat': HAS_VALUE, 'lng': HAS_VALUE}
+
+
+# Equality values are placeholders; plans do not depend on them
+QUERY_SHAPES = [
+    QueryShape('geography_counts', 'geographies', _locations_filter(),
+               LOCATION_SORT, US_LOCATION_FIELDS),
+    QueryShape('geography_counts', 'geographies by state', _locations_filter(state='Texas'),
+               LOCATION_SORT, US_LOCATION_FIELDS),
+    QueryShape('geography_counts', 'geographies by state and county',
+               _locations_filter(state='Texas', county='Harris'),
+               LOCATION_SORT, US_LOCATION_FIELDS),
+    QueryShape('geography_counts', 'geographies by county', _locations_filter(county='Harris'),
+               LOCATION_SORT, US_LOCATION_FIELDS),
+    QueryShape('geography_counts', 'geographies by type', _locations_filter(type='place'),
+               LOCATION_SORT, US_LOCATION_FIELDS),
+    QueryShape('geography_counts', 'geographies stream page', _keyset_filter(),
+               LOCATION_SORT, US_LOCATION_FIELDS),
+    QueryShape('geography_counts', 'search', _search_filter(),
+               [('count', -1)], US_SEARCH_FIELDS, leading=('location_key',)),
+    QueryShape('geography_counts', 'locations with coordinates', _coordinates_filter(),
+               [], US_LOCATION_FIELDS, leading=('lat', 'lng')),
+    QueryShape('world_geography_counts', 'world geographies', _locations_filter(),
+               LOCATION_SORT, WORLD_LOCATION_FIELDS),
+    QueryShape('world_geography_counts', 'world geographies by country',
+               _locations_filter(country='France'),
+               LOCATION_SORT, WORLD_LOCATION_FIELDS),
+    QueryShape('world_geography_counts', 'world geographies stream page', _keyset_filter(),
+               LOCATION_SORT, WORLD_LOCATION_FIELDS),
+    QueryShape('world_geography_counts', 'world search', _search_filter(),
+               [('count', -1)], WORLD_SEARCH_FIELDS, leading=('location_key',)),
+    QueryShape('world_geography_counts', 'world locations with coordinates',
+               _coordinates_filter(), [], WORLD_LOCATION_FIELDS, leading=('lat', 'lng')),
+]
+
+
+def equality_fields(shape):
+    return [field for field, value in shape.filter.items()
+            if not field.startswith('$') and not isinstance(value, dict)]
+
+
+def filter_fields(query):
+    """Fields a filter refers to, including inside $or / $and clauses."""
+    fields = []
+    for field, value in query.items():
+        if field.startswith('$'):
+            for clause in value:
+                fields.extend(filter_fields(clause))
+        else:
+            fields.append(field)
+    return fields
+
+
+def index_keys(shape):
+    """ESR index keys for a query shape (leading fields replace the sort)."""
+    keys = [(field, 1) for field in equality_fields(shape)]
+    if shape.leading:
+        keys.extend((field, 1) for field in shape.leading)
+    else:
+        keys.extend(shape.sort)
+    for field in filter_fields(shape.filter):
+        if field not in dict(keys):
+            keys.append((field, 1))
+    return keys
+
+
+def indexes_for(collection):
+    """Distinct index key lists needed by the shapes on a collection."""
+    indexes = []
+    for shape in QUERY_SHAPES:
+        if shape.collection != collection:
+            continue
+        keys = index_keys(shape)
+        prefix = len(equality_fields(shape)) + len(shape.leading or shape.sort)
+        if not any(existing[:prefix] == keys[:prefix] and set(keys) <= set(existing)
+                   for existing in indexes):
+            indexes.append(keys)
+    return indexes
+
+
+def ensure_indexes(db, collection):
+    """Create the query-shape indexes for a collection."""
+    for keys in indexes_for(collection):
+        db[collection].create_index(keys)
+
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree."""
+    stages = [plan.get('stage')]
+    for child_key in ('inputStage', 'queryPlan'):
+        if child_key in plan:
+            stages.extend(plan_stages(plan[child_key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+def check_indexes(db):
+    """
+    explain() each query shape and report its plan.
+    Returns False if any shape uses a collection scan, or an in-memory sort
+    without leading fields to narrow what is sorted.
+    """
+    ok = True
+    for shape in QUERY_SHAPES:
+        projection = {'_id': 0, **{field: 1 for field in shape.projection}}
+        cursor = db[shape.collection].find(shape.filter, projection)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        explain = cursor.limit(100).explain()
+        stages = plan_stages(explain['queryPlanner']['winningPlan'])
+        rejected = ('COLLSCAN',) if shape.leading else ('COLLSCAN', 'SORT')
+        failed = [stage for stage in stages if stage in rejected]
+        status = 'FAIL' if failed else 'ok'
+        print(f"  [{status}] {shape.collection} {shape.name}: {' <- '.join(stages)}")
+        ok = ok and not failed
+    return ok
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Create and check query-shape indexes')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017',
+                        help='MongoDB connection URI')
+    parser.add_argument('--db', default='toxic_docs', help='Database name')
+    parser.add_argument('--check', action='store_true',
+                        help='Explain each query shape instead of creating indexes')
+
+    args = parser.parse_args()
+
+    db = MongoClient(args.mongo_uri)[args.db]
+
+    if args.check:
+        print("Query plans:")
+        sys.exit(0 if check_indexes(db) else 1)
+
+    for collection in sorted({shape.collection for shape in QUERY_SHAPES}):
+        ensure_indexes(db, collection)
+        for keys in indexes_for(collection):
+            print(f"  {collection}: {keys}")
@@ -0,0 +1,107 @@
+"""
+Batch spaCy NER for location candidates.
+
+Documents are streamed through nlp.pipe with every pipeline component but
+NER disabled, in batches and optionally across processes. Long documents are
+split into sentence-aligned chunks so no single parse is huge; entities from
+all chunks of a document are combined in order. Candidates are the same
+GPE/LOC/FAC entity texts GeographyExtractor.extract_locations_spacy returns,
+and are validated the same way.
+
+spaCy is optional: SPACY_AVAILABLE is False when it is not installed.
+"""
+
+import os
+import re
+from collections import deque
+
+try:
+    import spacy
+except ImportError:
+    spacy = None
+
+SPACY_AVAILABLE = spacy is not None
+
+# Entity labels that can name a location
+NER_LABELS = ('GPE', 'LOC', 'FAC')
+
+# Same cap as GeographyExtractor.extract_locations_spacy
+MAX_TEXT_CHARS = 100000
+
+# Documents longer than this are parsed in sentence-aligned chunks
+CHUNK_CHARS = 10000
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def load_ner_model(name='en_core_web_sm'):
+    """Load a spaCy model with only NER (and any embedding layer it listens to) enabled."""
+    if spacy is None:
+        raise ImportError("spaCy is not installed; run: pip install spacy")
+    try:
+        nlp = spacy.load(name)
+    except OSError:
+        print(f"spaCy model not found. Downloading {name}...")
+        os.system(f'python -m spacy download {name}')
+        nlp = spacy.load(name)
+
+    enabled = ['ner'] + [pipe_name for pipe_name in nlp.pipe_names
+                         if 'ner' in getattr(nlp.get_pipe(pipe_name), 'listening_components', [])]
+    nlp.select_pipes(enable=enabled)
+    print(f"Loaded spaCy model {name} with components: {', '.join(nlp.pipe_names)}")
+    return nlp
+
+
+def chunk_text(text, chunk_chars=CHUNK_CHARS):
+    """Split text into chunks of about chunk_chars, breaking only between sentences."""
+    if len(text) <= chunk_chars:
+        return [text]
+
+    chunks = []
+    current = []
+    size = 0
+    for sentence in SENTENCE_END.split(text):
+        if current and size + len(sentence) > chunk_chars:
+            chunks.append(' '.join(current))
+            current = []
+            size = 0
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def annotate_locations(nlp, docs, text_of, batch_size=64, n_process=1,
+                       chunk_chars=CHUNK_CHARS, field='ner_locations'):
+    """
+    Yield docs in order, each with doc[field] set to its NER location candidates.
+    text_of(doc) gives the text to parse. Only chunk texts and sequence
+    numbers are sent through nlp.pipe; the docs themselves wait in a queue
+    bounded by what nlp.pipe has buffered.
+    """
+    pending = deque()
+
+    def chunks():
+        for seq, doc in enumerate(docs):
+            pending.append(doc)
+            # Every document yields at least one (possibly empty) chunk
+            for chunk in chunk_text(text_of(doc)[:MAX_TEXT_CHARS], chunk_chars):
+                yield chunk, seq
+
+    current = 0
+    found = []
+    for parsed, seq in nlp.pipe(chunks(), as_tuples=True, batch_size=batch_size,
+                                n_process=n_process):
+        if seq != current:
+            doc = pending.popleft()
+            doc[field] = found
+            yield doc
+            found = []
+            current = seq
+        found.extend(ent.text for ent in parsed.ents if ent.label_ in NER_LABELS)
+
+    if pending:
+        doc = pending.popleft()
+        doc[field] = found
+        yield doc
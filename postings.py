@@ -0,0 +1,139 @@
+"""
+Compressed location -> document postings.
+
+Each location's postings list is the sorted list of document ordinals that
+mention it, stored as varint-encoded deltas. Ordinals are assigned in the
+order documents are processed; an ordinal table maps them back to _ids.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+
+from bson import Binary
+
+# Document IDs stored per ordinal table chunk
+ORDINAL_CHUNK_SIZE = 1000
+
+
+def encode_varint(value, out):
+    """Append a non-negative integer to a bytearray as a LEB128 varint."""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_postings(ordinals):
+    """Encode a sorted list of ordinals as varint deltas."""
+    out = bytearray()
+    last = -1
+    for ordinal in ordinals:
+        encode_varint(ordinal - last, out)
+        last = ordinal
+    return bytes(out)
+
+
+def decode_postings(data):
+    """Decode varint deltas back into a sorted list of ordinals."""
+    ordinals = []
+    current = -1
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            current += value
+            ordinals.append(current)
+            value = 0
+            shift = 0
+    return ordinals
+
+
+def intersect_postings(lists):
+    """
+    Intersect sorted ordinal lists, smallest first.
+    Each remaining list is searched with bisect, so a short list against a
+    very common location costs O(m log n) rather than O(n).
+    """
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        matched = []
+        lo = 0
+        for ordinal in result:
+            lo = bisect_left(other, ordinal, lo)
+            if lo == len(other):
+                break
+            if other[lo] == ordinal:
+                matched.append(ordinal)
+        result = matched
+        if not result:
+            break
+    return result
+
+
+class PostingsBuilder:
+    """Accumulate compressed postings per location ID during extraction."""
+
+    def __init__(self):
+        # Document _ids by ordinal, as read; stored as strings by store_postings
+        self.doc_ids = []
+        self.data = defaultdict(bytearray)
+        self.last = {}
+
+    def add(self, doc_id, loc_ids):
+        """Assign the next ordinal to a document and post it to each location ID."""
+        ordinal = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        for loc_id in loc_ids:
+            encode_varint(ordinal - self.last.get(loc_id, -1), self.data[loc_id])
+            self.last[loc_id] = ordinal
+
+
+def store_postings(db, prefix, builder, key_for_id):
+    """
+    Store postings in <prefix>_postings (one document per location) and the
+    ordinal table in <prefix>_doc_ordinals (chunked _id lists), e.g.
+    geography_postings / geography_doc_ordinals for the US collection.
+    """
+    postings_coll = db[f"{prefix}_postings"]
+    ordinals_coll = db[f"{prefix}_doc_ordinals"]
+    postings_coll.drop()
+    ordinals_coll.drop()
+
+    docs = [{
+        'location_key': key_for_id(loc_id),
+        'postings': Binary(bytes(data))
+    } for loc_id, data in builder.data.items()]
+    if docs:
+        postings_coll.insert_many(docs)
+        postings_coll.create_index('location_key', unique=True)
+
+    chunks = [{
+        '_id': start // ORDINAL_CHUNK_SIZE,
+        'doc_ids': [str(doc_id) for doc_id in builder.doc_ids[start:start + ORDINAL_CHUNK_SIZE]]
+    } for start in range(0, len(builder.doc_ids), ORDINAL_CHUNK_SIZE)]
+    if chunks:
+        ordinals_coll.insert_many(chunks)
+
+    print(f"Stored postings for {len(docs)} locations over {len(builder.doc_ids)} documents")
+
+
+def load_postings(db, prefix, location_key):
+    """Decoded postings for a location key (empty if unknown)."""
+    doc = db[f"{prefix}_postings"].find_one(
+        {'location_key': location_key}, {'_id': 0, 'postings': 1})
+    return decode_postings(doc['postings']) if doc else []
+
+
+def lookup_doc_ids(db, prefix, ordinals):
+    """Map document ordinals back to document _id strings, preserving order."""
+    chunk_ids = sorted({ordinal // ORDINAL_CHUNK_SIZE for ordinal in ordinals})
+    chunks = {c['_id']: c['doc_ids'] for c in
+              db[f"{prefix}_doc_ordinals"].find({'_id': {'$in': chunk_ids}})}
+    return [chunks[ordinal // ORDINAL_CHUNK_SIZE][ordinal % ORDINAL_CHUNK_SIZE]
+            for ordinal in ordinals]
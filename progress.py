@@ -0,0 +1,134 @@
+"""
+Live progress of extraction jobs, served by /api/jobs/status.
+
+ProgressPublisher writes one status document per job to the job_status
+collection: stage, documents processed, docs/sec, ETA, memory use and
+per-pattern hit rates. A background thread publishes every interval seconds,
+so the extraction loop only updates a counter.
+"""
+
+import os
+import resource
+import threading
+import time
+from datetime import datetime
+
+# Status documents not updated for this many intervals belong to a job that died
+STALE_INTERVALS = 3
+
+
+def memory_mb():
+    """Resident memory of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+class ProgressPublisher:
+    """Publish a job's progress to db.job_status every interval seconds."""
+
+    def __init__(self, db, job, total=None, interval=5.0, extractor=None):
+        self.db = db
+        self.job = job
+        self.total = total
+        self.interval = interval
+        # Extractor whose pattern_hits and pattern_documents are read when publishing
+        self.extractor = extractor
+        self.processed = 0
+        self.initial = 0
+        self.stage = 'starting'
+        self.started = time.monotonic()
+        self.last = (self.started, 0)
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self, stage='starting'):
+        self.stage = stage
+        self.db.job_status.replace_one({'_id': self.job}, {
+            '_id': self.job,
+            'status': 'running',
+            'started_at': datetime.utcnow(),
+            'interval': self.interval
+        }, upsert=True)
+        self.publish()
+        if self.interval > 0:
+            self.thread = threading.Thread(target=self._run, name=f'progress-{self.job}', daemon=True)
+            self.thread.start()
+
+    def resume_from(self, processed):
+        """Count from a resumed checkpoint's documents; rates cover only this run."""
+        self.processed = self.initial = processed
+        self.last = (time.monotonic(), processed)
+
+    def _run(self):
+        while not self.done.wait(self.interval):
+            self.publish()
+
+    def set_stage(self, stage, total=None):
+        """Enter a new stage and publish it right away."""
+        self.stage = stage
+        if total is not None:
+            self.total = total
+        self.publish()
+
+    def publish(self, status='running'):
+        with self.lock:
+            now = time.monotonic()
+            processed = self.processed
+            last_time, last_processed = self.last
+            self.last = (now, processed)
+
+        recent = (processed - last_processed) / (now - last_time) if now > last_time else 0
+        average = (processed - self.initial) / (now - self.started) if now > self.started else 0
+        rate = recent or average
+        eta = None
+        if self.total and rate and status == 'running':
+            eta = max(self.total - processed, 0) / rate
+
+        update = {
+            'status': status,
+            'stage': self.stage,
+            'processed': processed,
+            'total': self.total,
+            'docs_per_sec': round(recent, 1),
+            'avg_docs_per_sec': round(average, 1),
+            'eta_seconds': round(eta) if eta is not None else None,
+            'elapsed_seconds': round(now - self.started),
+            'memory_mb': round(memory_mb(), 1),
+            'updated_at': datetime.utcnow()
+        }
+        if self.extractor is not None:
+            # Rates are per document that went through the patterns; dedup cache
+            # hits reuse earlier results and are not counted
+            hits = dict(self.extractor.pattern_hits)
+            documents = max(self.extractor.pattern_documents, 1)
+            update['pattern_hits'] = hits
+            update['pattern_documents'] = self.extractor.pattern_documents
+            update['pattern_hit_rates'] = {name: round(n / documents, 4) for name, n in hits.items()}
+        self.db.job_status.update_one({'_id': self.job}, {'$set': update}, upsert=True)
+
+    def finish(self, stage='done'):
+        """Stop the publishing thread and mark the job completed."""
+        self.done.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.stage = stage
+        self.publish(status='completed')
+
+
+def job_statuses(db, job=None):
+    """Status documents, newest first, flagging running jobs that stopped publishing."""
+    query = {'_id': job} if job else {}
+    statuses = []
+    now = datetime.utcnow()
+    for doc in db.job_status.find(query).sort('started_at', -1):
+        doc['job'] = doc.pop('_id')
+        interval = doc.get('interval') or 0
+        age = (now - doc['updated_at']).total_seconds() if doc.get('updated_at') else None
+        doc['stale'] = bool(doc.get('status') == 'running' and interval and age is not None and
+                            age > STALE_INTERVALS * interval)
+        statuses.append(doc)
+    return statuses
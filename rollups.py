@@ -0,0 +1,175 @@
+"""
+State and county rollups of US mention counts, for choropleth maps.
+
+store_rollups runs after store_results and writes one document per state to
+geography_state_rollups and one per county to geography_county_rollups,
+keyed by FIPS code (two digits for states, five for counties) so they join
+directly onto boundary files. Each holds the total mentions of the area and
+everything in it, the mentions of the area itself, the number of distinct
+locations mentioned, and the top locations by count.
+
+County FIPS codes come from the county gazetteer (see counties.py). Place
+records only name their county, so names are matched loosely ("Saint Clair"
+to "St. Clair County", "La Porte" to "LaPorte County"); places whose county
+is not found count towards their state only.
+"""
+
+import os
+import re
+import unicodedata
+from collections import defaultdict
+
+from counties import COUNTY_GAZETTEER_FILE, CountyGazetteer
+
+TOP_PLACES = 5
+
+COUNTY_SUFFIX = re.compile(r' (county|parish|borough|census area|city and borough|municipality)$')
+
+
+def county_name_key(name):
+    """Loose key for a county name: ASCII letters only, without its suffix."""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+    name = re.sub(r'\bsaint\b', 'st', name.replace('.', ''))
+    return re.sub(r'[^a-z]', '', COUNTY_SUFFIX.sub('', name))
+
+
+class CountyFips:
+    """County and state FIPS codes from the county gazetteer."""
+
+    def __init__(self, counties):
+        self.by_name = {}
+        self.states = {}
+        self.names = dict(zip(counties.fips, counties.names))
+        for index, fips in enumerate(counties.fips):
+            name = counties.names[index]
+            abbrev = counties.state_abbrevs[index]
+            self.states.setdefault(abbrev, fips[:2])
+            key = county_name_key(name), abbrev
+            # "Richmond County" wins over the independent "Richmond city"
+            if key not in self.by_name or name.lower().endswith(' county'):
+                self.by_name[key] = fips
+
+    @classmethod
+    def load(cls, data_dir='data'):
+        """FIPS lookup for the data directory, or None without a county gazetteer."""
+        path = os.path.join(data_dir, COUNTY_GAZETTEER_FILE)
+        if not os.path.exists(path):
+            return None
+        return cls(CountyGazetteer.load(path))
+
+    def county(self, name, state_abbrev):
+        return self.by_name.get((county_name_key(name), state_abbrev))
+
+
+class Rollup:
+    """Running totals for one state or county."""
+
+    __slots__ = ('mentions', 'own_mentions', 'places', 'top')
+
+    def __init__(self):
+        self.mentions = 0
+        self.own_mentions = 0
+        self.places = 0
+        self.top = []
+
+    def add(self, entry, count, top):
+        self.mentions += count
+        self.places += 1
+        self.top.append((count, entry))
+        if len(self.top) > 4 * top:
+            self.top = sorted(self.top, key=lambda item: item[0], reverse=True)[:top]
+
+    def document(self, top):
+        ranked = sorted(self.top, key=lambda item: item[0], reverse=True)[:top]
+        return {
+            'mentions': self.mentions,
+            'own_mentions': self.own_mentions,
+            'places': self.places,
+            'top_places': [entry for _, entry in ranked]
+        }
+
+
+def build_rollups(locations, fips, top=TOP_PLACES):
+    """
+    State and county rollup documents from (location_key, record, count)
+    triples. Records of counties carry their FIPS code; places are matched
+    to counties by name.
+    """
+    states = defaultdict(Rollup)
+    counties = defaultdict(Rollup)
+    state_names = {}
+    county_abbrevs = {}
+
+    for key, record, count in locations:
+        loc_type = record.get('type', 'place')
+        abbrev = record.get('state_abbrev')
+        if not abbrev:
+            continue
+        state_names.setdefault(abbrev, record.get('state') or record.get('name'))
+        if loc_type == 'state':
+            states[abbrev].own_mentions += count
+            states[abbrev].mentions += count
+            continue
+
+        entry = {'location_key': key, 'name': record.get('name', key), 'type': loc_type,
+                 'count': count}
+        states[abbrev].add(entry, count, top)
+
+        if loc_type == 'county':
+            county_fips = record.get('fips') or (fips and fips.county(record.get('name', ''), abbrev))
+            if county_fips:
+                county_abbrevs[county_fips] = abbrev
+                counties[county_fips].own_mentions += count
+                counties[county_fips].mentions += count
+        elif record.get('county') and fips is not None:
+            county_fips = fips.county(record['county'], abbrev)
+            if county_fips:
+                county_abbrevs[county_fips] = abbrev
+                counties[county_fips].add(entry, count, top)
+
+    state_docs = []
+    for abbrev, rollup in states.items():
+        state_fips = fips.states.get(abbrev) if fips is not None else None
+        state_docs.append({
+            '_id': state_fips or abbrev,
+            'fips': state_fips,
+            'state': state_names.get(abbrev),
+            'state_abbrev': abbrev,
+            **rollup.document(top)
+        })
+
+    county_docs = []
+    for county_fips, rollup in counties.items():
+        county_docs.append({
+            '_id': county_fips,
+            'fips': county_fips,
+            'state_fips': county_fips[:2],
+            'name': fips.names.get(county_fips) if fips is not None else None,
+            'state_abbrev': county_abbrevs[county_fips],
+            **rollup.document(top)
+        })
+
+    state_docs.sort(key=lambda doc: doc['_id'])
+    county_docs.sort(key=lambda doc: doc['_id'])
+    return state_docs, county_docs
+
+
+def store_rollups(db, table, mentions, data_dir='data', top=TOP_PLACES):
+    """Replace geography_state_rollups and geography_county_rollups."""
+    fips = CountyFips.load(data_dir)
+    if fips is None:
+        print(f"No {COUNTY_GAZETTEER_FILE} in {data_dir}; rollups are keyed by state abbreviation "
+              f"and have no counties")
+    locations = ((table.key(loc_id), table.record(loc_id), count)
+                 for loc_id, count, _ in mentions.items())
+    state_docs, county_docs = build_rollups(locations, fips, top)
+
+    for collection, docs in (('geography_state_rollups', state_docs),
+                             ('geography_county_rollups', county_docs)):
+        db[collection].drop()
+        if docs:
+            db[collection].insert_many(docs)
+    db.geography_county_rollups.create_index('state_abbrev')
+
+    print(f"Stored rollups for {len(state_docs)} states and {len(county_docs)} counties")
+    return state_docs, county_docs
@@ -9,6 +9,9 @@ import json
 import os
 import urllib.request
 from collections import defaultdict
+from itertools import islice, repeat
+
+from gazetteer import COMMON_NAME, COMMON_WORD, load_word_set
 
 # Data source
 CITIES_URL = 'https://raw.githubusercontent.com/kelvins/US-Cities-Database/main/csv/us_cities.csv'
@@ -33,6 +36,9 @@ STATE_ABBREV = {
 
 STATE_TO_ABBREV = {v: k for k, v in STATE_ABBREV.items()}
 
+# Rows parsed per batch when reading source files column by column
+BATCH_SIZE = 50000
+
 # State centroids for state-level lookups
 STATE_CENTROIDS = {
     'Alabama': (32.806671, -86.791130), 'Alaska': (61.370716, -152.404419),
@@ -71,62 +77,119 @@ def download_file(url, dest):
     print(f"Saved to {dest}")
 
 
+def read_csv_columns(filepath, batch_size=BATCH_SIZE):
+    """
+    Read a CSV file in batches of rows, transposed into columns.
+    Yields dicts of column name -> tuple of values.
+    """
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+        width = len(header)
+
+        while True:
+            batch = [row[:width] for row in islice(reader, batch_size) if len(row) >= width]
+            if not batch:
+                break
+            yield dict(zip(header, zip(*batch)))
+
+
+def parse_floats(values):
+    """Convert a column of strings to floats; unparseable values become None."""
+    try:
+        return list(map(float, values))
+    except ValueError:
+        floats = []
+        for value in values:
+            try:
+                floats.append(float(value))
+            except ValueError:
+                floats.append(None)
+        return floats
+
+
 def parse_cities_csv(filepath):
     """Parse the US cities CSV file."""
     places = {}
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            try:
-                state_abbrev = row['STATE_CODE'].strip()
-                state_full = row['STATE_NAME'].strip()
-                city = row['CITY'].strip()
-                county = row.get('COUNTY', '').strip()
-                lat = float(row['LATITUDE'])
-                lng = float(row['LONGITUDE'])
-
-                place_data = {
-                    'name': city,
-                    'state': state_full,
-                    'state_abbrev': state_abbrev,
-                    'county': county,
-                    'lat': lat,
-                    'lng': lng,
-                    'type': 'place'
-                }
-
-                # Store with multiple key formats for flexible matching
-                keys = [
-                    f"{city}, {state_full}".lower(),
-                    f"{city}, {state_abbrev}".lower(),
-                ]
-
-                for key in keys:
-                    if key not in places:
-                        places[key] = place_data
-
-            except (ValueError, KeyError) as e:
+    for columns in read_csv_columns(filepath):
+        state_abbrevs = map(str.strip, columns['STATE_CODE'])
+        state_names = map(str.strip, columns['STATE_NAME'])
+        cities = map(str.strip, columns['CITY'])
+        counties = map(str.strip, columns['COUNTY']) if 'COUNTY' in columns else repeat('')
+        lats = parse_floats(columns['LATITUDE'])
+        lngs = parse_floats(columns['LONGITUDE'])
+
+        for state_abbrev, state_full, city, county, lat, lng in zip(
+                state_abbrevs, state_names, cities, counties, lats, lngs):
+            if lat is None or lng is None:
                 continue
 
+            place_data = {
+                'name': city,
+                'state': state_full,
+                'state_abbrev': state_abbrev,
+                'county': county,
+                'lat': lat,
+                'lng': lng,
+                'type': 'place'
+            }
+
+            # Store with multiple key formats for flexible matching
+            for key in (f"{city}, {state_full}".lower(), f"{city}, {state_abbrev}".lower()):
+                if key not in places:
+                    places[key] = place_data
+
     return places
 
 
+def flag_common_names(places, data_dir='data'):
+    """
+    Set flag bits on every place record whose name is also a common first/last
+    name (COMMON_NAME) or English word (COMMON_WORD). Returns the number flagged.
+    """
+    common_names = load_word_set(os.path.join(data_dir, 'first_names.txt'),
+                                 os.path.join(data_dir, 'last_names.txt'))
+    common_words = load_word_set(os.path.join(data_dir, 'common_words.txt'))
+
+    flagged = 0
+    # Each place is stored under several keys; visit each record once
+    for data in {id(data): data for data in places.values()}.values():
+        if data['type'] != 'place':
+            continue
+        name = data['name'].lower()
+        flags = 0
+        if name in common_names:
+            flags |= COMMON_NAME
+        if name in common_words:
+            flags |= COMMON_WORD
+        data['flags'] = flags
+        flagged += bool(flags)
+    return flagged
+
+
 def build_city_to_states_index(places):
     """Build an index of city names to possible states (for disambiguation)."""
     city_states = defaultdict(list)
+    seen = set()
 
-    for key, data in places.items():
+    # Each place is stored under several keys; visit each record once
+    unique_places = {id(data): data for data in places.values()}
+
+    for data in unique_places.values():
         city_name = data['name'].lower()
-        state_info = {
+        unique_key = (city_name, data['state'], data['state_abbrev'], data['lat'], data['lng'])
+        if unique_key in seen:
+            continue
+        seen.add(unique_key)
+        city_states[city_name].append({
             'state': data['state'],
             'state_abbrev': data['state_abbrev'],
             'lat': data['lat'],
             'lng': data['lng']
-        }
-        if state_info not in city_states[city_name]:
-            city_states[city_name].append(state_info)
+        })
 
     return dict(city_states)
 
@@ -161,6 +224,9 @@ def main():
         if abbrev:
             places[abbrev.lower()] = state_data
 
+    flagged = flag_common_names(places)
+    print(f"Flagged {flagged} places named like common names or words")
+
     # Build city disambiguation index
     city_states = build_city_to_states_index(places)
 
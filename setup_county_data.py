@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Build the US county gazetteer from Census files in data/:
+  county_fips.txt    - state, FIPS codes and county names (pipe-delimited)
+  county_centers.csv - county centroids, including population-weighted ones
+
+Writes data/us_county_gazetteer.json: FIPS-ordered arrays of name, state
+and population-weighted centroid (2010), plus a lowercase name -> indices
+map (see counties.py).
+"""
+
+import json
+import os
+from collections import defaultdict
+
+from counties import COUNTY_GAZETTEER_FILE
+from setup_census_data import STATE_ABBREV, parse_floats, read_csv_columns
+
+
+def parse_county_fips(filepath):
+    """Parse county_fips.txt into {fips: (name, state_abbrev)}."""
+    counties = {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        header = next(f).rstrip('\n').split('|')
+        cols = {name: i for i, name in enumerate(header)}
+        for line in f:
+            parts = line.rstrip('\n').split('|')
+            if len(parts) < len(header):
+                continue
+            fips = parts[cols['STATEFP']] + parts[cols['COUNTYFP']]
+            counties[fips] = (parts[cols['COUNTYNAME']].strip(), parts[cols['STATE']].strip())
+    return counties
+
+
+def parse_county_centers(filepath):
+    """Parse county_centers.csv into {fips: (lat, lng)} using population-weighted centroids."""
+    centers = {}
+    for columns in read_csv_columns(filepath):
+        lats = parse_floats(columns['pclat10'])
+        lngs = parse_floats(columns['pclon10'])
+        for fips, lat, lng in zip(columns['fips'], lats, lngs):
+            if lat is not None and lng is not None:
+                centers[fips.zfill(5)] = (lat, lng)
+    return centers
+
+
+def build_county_gazetteer(counties, centers):
+    """FIPS-ordered arrays for counties that have a centroid, plus the name index."""
+    gazetteer = {'fips': [], 'name': [], 'state': [], 'lat': [], 'lng': []}
+    index = defaultdict(list)
+
+    for fips in sorted(counties):
+        name, abbrev = counties[fips]
+        if fips not in centers or abbrev not in STATE_ABBREV:
+            continue
+        lat, lng = centers[fips]
+        index[name.lower()].append(len(gazetteer['fips']))
+        gazetteer['fips'].append(fips)
+        gazetteer['name'].append(name)
+        gazetteer['state'].append(abbrev)
+        gazetteer['lat'].append(lat)
+        gazetteer['lng'].append(lng)
+
+    gazetteer['state_names'] = {abbrev: STATE_ABBREV[abbrev]
+                                for abbrev in sorted(set(gazetteer['state']))}
+    gazetteer['index'] = dict(index)
+    return gazetteer
+
+
+def main(data_dir='data'):
+    print("Parsing county FIPS codes...")
+    counties = parse_county_fips(os.path.join(data_dir, 'county_fips.txt'))
+    print(f"Loaded {len(counties)} counties")
+
+    print("Parsing county centroids...")
+    centers = parse_county_centers(os.path.join(data_dir, 'county_centers.csv'))
+    print(f"Loaded {len(centers)} centroids")
+
+    gazetteer = build_county_gazetteer(counties, centers)
+
+    out_path = os.path.join(data_dir, COUNTY_GAZETTEER_FILE)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(gazetteer, f, separators=(',', ':'))
+    print(f"Saved {len(gazetteer['fips'])} counties ({len(gazetteer['index'])} distinct names) "
+          f"to {out_path} ({os.path.getsize(out_path) / 1e3:.0f} KB)")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the US county gazetteer')
+    parser.add_argument('--data-dir', default='data', help='Directory with the Census county files')
+
+    args = parser.parse_args()
+
+    main(args.data_dir)
@@ -4,12 +4,14 @@ Download and prepare world city data for international geography validation.
 Uses GeoNames database (https://www.geonames.org/).
 """
 
-import csv
 import json
 import os
 import urllib.request
 import zipfile
 from collections import defaultdict
+from itertools import islice
+
+from world_cities import WORLD_GAZETTEER_FILE, alias_keys
 
 # Data sources
 CITIES_URL = 'https://download.geonames.org/export/dump/cities5000.zip'
@@ -38,6 +40,9 @@ GEONAME_COLS = {
     'modification_date': 18
 }
 
+# Lines parsed per batch when reading the GeoNames dump column by column
+BATCH_SIZE = 100000
+
 
 def download_file(url, dest):
     """Download a file with progress."""
@@ -119,6 +124,38 @@ def parse_country_info(filepath):
     }
 
 
+def read_geoname_columns(filepath, batch_size=BATCH_SIZE):
+    """
+    Read a GeoNames dump in batches of lines, transposed into columns.
+    Yields dicts of column name -> tuple of values.
+    """
+    min_width = GEONAME_COLS['population'] + 1
+    with open(filepath, 'r', encoding='utf-8') as f:
+        while True:
+            lines = list(islice(f, batch_size))
+            if not lines:
+                break
+            rows = [parts for parts in (line.strip().split('\t') for line in lines)
+                    if len(parts) >= min_width]
+            if rows:
+                columns = list(zip(*(parts[:min_width] for parts in rows)))
+                yield {name: columns[i] for name, i in GEONAME_COLS.items() if i < min_width}
+
+
+def parse_numbers(values, convert):
+    """Convert a column of strings with convert(); unparseable values become None."""
+    try:
+        return list(map(convert, values))
+    except ValueError:
+        numbers = []
+        for value in values:
+            try:
+                numbers.append(convert(value))
+            except ValueError:
+                numbers.append(None)
+        return numbers
+
+
 def parse_cities(filepath, country_info):
     """
     Parse GeoNames cities file (tab-delimited).
@@ -130,57 +167,70 @@ def parse_cities(filepath, country_info):
     # Skip US cities - they're handled by the US geography system
     skip_countries = {'US'}
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) < 15:
+    for columns in read_geoname_columns(filepath):
+        # Keep populated places only (a no-op for citiesNNNN, filters allCountries)
+        country_codes = [code.strip() if feature_class == 'P' else ''
+                         for code, feature_class in zip(columns['country_code'],
+                                                        columns['feature_class'])]
+        lats = parse_numbers(columns['latitude'], float)
+        lngs = parse_numbers(columns['longitude'], float)
+        populations = parse_numbers((p or '0' for p in columns['population']), int)
+
+        for country_code, name, ascii_name, lat, lng, population in zip(
+                country_codes, columns['name'], columns['asciiname'], lats, lngs, populations):
+            if country_code in skip_countries:
                 continue
 
-            try:
-                country_code = parts[GEONAME_COLS['country_code']].strip()
-
-                # Skip US cities
-                if country_code in skip_countries:
-                    continue
-
-                # Get country name
-                country_name = code_to_name.get(country_code)
-                if not country_name:
-                    continue
-
-                name = parts[GEONAME_COLS['name']].strip()
-                ascii_name = parts[GEONAME_COLS['asciiname']].strip()
-                lat = float(parts[GEONAME_COLS['latitude']])
-                lng = float(parts[GEONAME_COLS['longitude']])
-                population = int(parts[GEONAME_COLS['population']] or 0)
-
-                place_data = {
-                    'name': name,
-                    'ascii_name': ascii_name,
-                    'country': country_name,
-                    'country_code': country_code,
-                    'lat': lat,
-                    'lng': lng,
-                    'population': population,
-                    'type': 'city'
-                }
+            country_name = code_to_name.get(country_code)
+            if not country_name or lat is None or lng is None or population is None:
+                continue
 
-                # Store with multiple key formats
-                keys = [
-                    f"{name}, {country_name}".lower(),
-                    f"{ascii_name}, {country_name}".lower(),
-                    f"{name}, {country_code}".lower(),
-                    f"{ascii_name}, {country_code}".lower(),
-                ]
+            name = name.strip()
+            ascii_name = ascii_name.strip()
+            place_data = {
+                'name': name,
+                'ascii_name': ascii_name,
+                'country': country_name,
+                'country_code': country_code,
+                'lat': lat,
+                'lng': lng,
+                'population': population,
+                'type': 'city'
+            }
+
+            # Store with multiple key formats
+            for key in alias_keys(name, ascii_name, country_name, country_code):
+                if key not in places:
+                    places[key] = place_data
 
-                for key in keys:
-                    if key not in places:
-                        places[key] = place_data
+    return places
 
-            except (ValueError, IndexError) as e:
-                continue
 
-    return places
+def build_world_gazetteer(places):
+    """
+    One entry per city in each field array, plus the alias -> record ID index
+    (see world_cities.py). Record IDs follow the order cities were first keyed.
+    """
+    gazetteer = {'name': [], 'ascii_name': [], 'country_code': [], 'lat': [], 'lng': [],
+                 'population': []}
+    fields = list(gazetteer)
+    countries = {}
+    index = {}
+    record_ids = {}
+
+    # Each place is stored under several keys; add each record once
+    for key, data in places.items():
+        record_id = record_ids.get(id(data))
+        if record_id is None:
+            record_id = record_ids[id(data)] = len(gazetteer['name'])
+            for field in fields:
+                gazetteer[field].append(data[field])
+            countries[data['country_code']] = data['country']
+        index[key] = record_id
+
+    gazetteer['countries'] = dict(sorted(countries.items()))
+    gazetteer['index'] = index
+    return gazetteer
 
 
 def build_city_countries_index(places):
@@ -191,7 +241,10 @@ def build_city_countries_index(places):
 
     seen = set()  # Avoid duplicates
 
-    for key, data in places.items():
+    # Each place is stored under several keys; visit each record once
+    unique_places = {id(data): data for data in places.values()}
+
+    for data in unique_places.values():
         city_name = data['name'].lower()
         country_info = {
             'country': data['country'],
@@ -202,7 +255,7 @@ def build_city_countries_index(places):
         }
 
         # Create unique key to avoid duplicates
-        unique_key = f"{city_name}|{data['country_code']}"
+        unique_key = (city_name, data['country_code'])
         if unique_key not in seen:
             seen.add(unique_key)
             city_countries[city_name].append(country_info)
@@ -210,7 +263,7 @@ def build_city_countries_index(places):
         # Also index ASCII name if different
         ascii_name = data['ascii_name'].lower()
         if ascii_name != city_name:
-            unique_key = f"{ascii_name}|{data['country_code']}"
+            unique_key = (ascii_name, data['country_code'])
             if unique_key not in seen:
                 seen.add(unique_key)
                 city_countries[ascii_name].append(country_info)
@@ -222,7 +275,7 @@ def build_city_countries_index(places):
     return dict(city_countries)
 
 
-def main():
+def main(cities_file=None):
     os.makedirs('data', exist_ok=True)
 
     # Download country info
@@ -232,11 +285,13 @@ def main():
     else:
         print(f"{countries_file} already exists, skipping download")
 
-    # Download cities data
+    # Download cities data (unless a local dump such as allCountries.txt was given)
     cities_zip = 'data/cities5000.zip'
-    cities_file = 'data/cities5000.txt'
 
-    if not os.path.exists(cities_file):
+    if cities_file:
+        print(f"Using local cities dump {cities_file}")
+    elif not os.path.exists('data/cities5000.txt'):
+        cities_file = 'data/cities5000.txt'
         if not os.path.exists(cities_zip):
             download_file(CITIES_URL, cities_zip)
 
@@ -246,6 +301,7 @@ def main():
             z.extractall('data')
         print(f"Extracted to {cities_file}")
     else:
+        cities_file = 'data/cities5000.txt'
         print(f"{cities_file} already exists, skipping download")
 
     # Parse country info
@@ -264,9 +320,11 @@ def main():
     # Save to JSON
     print("\nSaving processed data...")
 
-    with open('data/world_locations.json', 'w', encoding='utf-8') as f:
-        json.dump(places, f, ensure_ascii=False)
-    print(f"Saved {len(places)} locations to data/world_locations.json")
+    gazetteer = build_world_gazetteer(places)
+    gazetteer_path = os.path.join('data', WORLD_GAZETTEER_FILE)
+    with open(gazetteer_path, 'w', encoding='utf-8') as f:
+        json.dump(gazetteer, f, ensure_ascii=False, separators=(',', ':'))
+    print(f"Saved {len(gazetteer['name'])} cities under {len(places)} names to {gazetteer_path}")
 
     with open('data/city_countries_index.json', 'w', encoding='utf-8') as f:
         json.dump(city_countries, f, ensure_ascii=False)
@@ -296,4 +354,12 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Prepare world city data')
+    parser.add_argument('--cities-file',
+                        help='Local GeoNames dump to parse instead of cities5000 (e.g. allCountries.txt)')
+
+    args = parser.parse_args()
+
+    main(cities_file=args.cities_file)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Serve geography results from a snapshot file instead of MongoDB.
+
+A snapshot is an export of geography_counts, either as JSON
+(data/geography_results.json) or as a compact zlib-compressed pickle
+(.snap). Rows are held in memory sorted by count, with position lists per
+type, state and county, so the /api/geographies* queries are answered
+without a database. SnapshotProvider reloads the file when it changes;
+readers keep the old snapshot until the new one is fully loaded.
+
+Usage:
+    python snapshot.py export [--out data/geography_results.json]
+    python snapshot.py compact data/geography_results.json
+"""
+
+import json
+import os
+import pickle
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import islice
+
+from pymongo import MongoClient
+
+SNAPSHOT_SUFFIX = '.snap'
+
+# Fields exported from geography_counts and served by /api/geographies
+LOCATION_FIELDS = ('location_key', 'name', 'state', 'state_abbrev', 'county',
+                   'lat', 'lng', 'count', 'type')
+SEARCH_FIELDS = ('location_key', 'name', 'state', 'county', 'count', 'lat', 'lng', 'type')
+
+# Fields with a position index
+INDEXED_FIELDS = ('type', 'state', 'county')
+
+
+def load_rows(path):
+    """Rows from a JSON export or a compact .snap file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if path.endswith(SNAPSHOT_SUFFIX):
+        return pickle.loads(zlib.decompress(data))
+    return json.loads(data)
+
+
+def write_rows(rows, path):
+    """Atomically write rows as JSON, or as a compact .snap file."""
+    if path.endswith(SNAPSHOT_SUFFIX):
+        data = zlib.compress(pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL), 6)
+    else:
+        data = json.dumps(rows, ensure_ascii=False).encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class GeographySnapshot:
+    """In-memory, pre-indexed geography_counts rows."""
+
+    def __init__(self, rows):
+        # Highest count first; ties by key so results are stable
+        self.rows = sorted(rows, key=lambda r: (-(r.get('count') or 0), r.get('location_key', '')))
+        self.neg_counts = [-(r.get('count') or 0) for r in self.rows]
+        # (-count, location_key) per row, for resuming after a keyset position
+        self.order_keys = [(-(r.get('count') or 0), r.get('location_key', '')) for r in self.rows]
+
+        # Positions (in count order) of rows per indexed field value
+        self.positions = {field: defaultdict(list) for field in INDEXED_FIELDS}
+        for i, row in enumerate(self.rows):
+            for field, index in self.positions.items():
+                value = row.get(field)
+                if value:
+                    index[value].append(i)
+
+        keyed = sorted((row.get('location_key', ''), i) for i, row in enumerate(self.rows))
+        self.keys = [key for key, _ in keyed]
+        self.key_positions = [i for _, i in keyed]
+
+        counties_by_state = defaultdict(set)
+        for row in self.rows:
+            if row.get('state') and row.get('county'):
+                counties_by_state[row['state']].add(row['county'])
+        self.counties_by_state = {state: sorted(counties)
+                                  for state, counties in counties_by_state.items()}
+
+        self.filters = {
+            'states': sorted(self.positions['state']),
+            'counties': sorted(self.positions['county']),
+            'types': sorted(self.positions['type'])
+        }
+
+        counts = [-n for n in self.neg_counts]
+        self.stats = {
+            'total_locations': len(self.rows),
+            'total_places': len(self.positions['type'].get('place', [])),
+            'total_states': len(self.positions['type'].get('state', [])),
+            'hotspots_500plus': bisect_right(self.neg_counts, -500),
+            'total_mentions': sum(counts),
+            'max_mentions': counts[0] if counts else 0,
+            'avg_mentions': round(sum(counts) / len(counts), 2) if counts else 0
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def iter_locations(self, min_count=1, state='', county='', type_='', after=None):
+        """
+        Yield rows with coordinates and count >= min_count, highest count first
+        (ties by location_key), starting after the (count, location_key) after.
+        """
+        end = bisect_right(self.neg_counts, -min_count)
+        start = 0
+        if after:
+            start = bisect_right(self.order_keys, (-after[0], after[1]))
+        filters = [(field, value) for field, value in
+                   (('state', state), ('county', county), ('type', type_)) if value]
+
+        positions = range(start, end)
+        if filters:
+            # Walk the most selective index; check the other filters per row
+            positions = min((self.positions[field].get(value, []) for field, value in filters),
+                            key=len)
+            positions = positions[bisect_left(positions, start):bisect_left(positions, end)]
+
+        for i in positions:
+            row = self.rows[i]
+            if row.get('lat') is None or row.get('lng') is None:
+                continue
+            if all(row.get(field) == value for field, value in filters):
+                yield {field: row.get(field) for field in LOCATION_FIELDS}
+
+    def locations(self, min_count=1, limit=5000, state='', county='', type_=''):
+        """Up to limit rows from iter_locations."""
+        return list(islice(self.iter_locations(min_count, state, county, type_), limit))
+
+    def counties(self, state):
+        """Sorted counties with results in a state."""
+        return self.counties_by_state.get(state, [])
+
+    def search(self, prefix, limit=20):
+        """Rows whose location_key starts with prefix, highest count first."""
+        lo = bisect_left(self.keys, prefix)
+        hi = lo
+        while hi < len(self.keys) and self.keys[hi].startswith(prefix):
+            hi += 1
+
+        results = []
+        for i in sorted(self.key_positions[lo:hi]):
+            if len(results) >= limit:
+                break
+            row = self.rows[i]
+            if row.get('lat') is not None:
+                results.append({field: row.get(field) for field in SEARCH_FIELDS})
+        return results
+
+
+class SnapshotProvider:
+    """
+    The current GeographySnapshot for a file, reloaded when the file changes.
+    The file is checked at most once per check_interval seconds; a file that
+    fails to load (e.g. mid-write without a rename) keeps the old snapshot.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.mtime = os.stat(path).st_mtime_ns
+        self.snapshot = GeographySnapshot(load_rows(path))
+        self.checked = time.monotonic()
+        print(f"Loaded {len(self.snapshot)} locations from snapshot {path}")
+
+    def current(self):
+        now = time.monotonic()
+        if now - self.checked >= self.check_interval and self.lock.acquire(blocking=False):
+            try:
+                self.checked = now
+                self._reload_if_changed()
+            finally:
+                self.lock.release()
+        return self.snapshot
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.mtime:
+                return
+            snapshot = GeographySnapshot(load_rows(self.path))
+        except (OSError, ValueError, pickle.UnpicklingError, zlib.error) as e:
+            print(f"Keeping current snapshot; could not reload {self.path}: {e}")
+            return
+        # Swap in one assignment; requests in flight keep the old snapshot
+        self.snapshot = snapshot
+        self.mtime = mtime
+        print(f"Reloaded {len(snapshot)} locations from snapshot {self.path}")
+
+
+def export_results(mongo_uri='mongodb://localhost:27017', db_name='toxic_docs',
+                   out='data/geography_results.json'):
+    """Export geography_counts to a snapshot file."""
+    db = MongoClient(mongo_uri)[db_name]
+    projection = {'_id': 0, **{field: 1 for field in LOCATION_FIELDS}}
+    rows = list(db.geography_counts.find({}, projection))
+    write_rows(rows, out)
+    print(f"Exported {len(rows)} locations to {out}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export and compact geography snapshots')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export geography_counts from MongoDB')
+    export_parser.add_argument('--mongo-uri', default='mongodb://localhost:27017',
+                               help='MongoDB connection URI')
+    export_parser.add_argument('--db', default='toxic_docs', help='Database name')
+    export_parser.add_argument('--out', default='data/geography_results.json',
+                               help='Snapshot file (.json or .snap)')
+
+    compact_parser = subparsers.add_parser('compact', help='Convert a JSON export to .snap')
+    compact_parser.add_argument('path', help='JSON export to convert')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_results(args.mongo_uri, args.db, args.out)
+    else:
+        out = os.path.splitext(args.path)[0] + SNAPSHOT_SUFFIX
+        rows = load_rows(args.path)
+        write_rows(rows, out)
+        print(f"Wrote {len(rows)} locations to {out} "
+              f"({os.path.getsize(out)} bytes, from {os.path.getsize(args.path)})")
@@ -0,0 +1,166 @@
+"""
+In-memory spatial index over location coordinates.
+
+GridIndex buckets rows into cells of cell_deg degrees. Radius, bbox and
+k-nearest queries visit only the cells that can contain matches, then
+compute exact great-circle (haversine) distances over arrays of
+precomputed radians and cosines. SpatialIndexCache rebuilds the index when
+the stored results' generation changes (see generations.py).
+"""
+
+import math
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+KM_PER_MILE = 1.609344
+
+# Farthest any two points can be apart
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+class GridIndex:
+    """Rows with lat/lng bucketed into a regular lat/lng grid."""
+
+    def __init__(self, rows, cell_deg=1.0):
+        self.rows = [row for row in rows if row.get('lat') is not None and row.get('lng') is not None]
+        self.cell_deg = cell_deg
+        self.lng_cells = int(round(360 / cell_deg))
+        self.counts = array('q', (row.get('count') or 0 for row in self.rows))
+        self.lat_rad = array('d', (math.radians(row['lat']) for row in self.rows))
+        self.lng_rad = array('d', (math.radians(row['lng']) for row in self.rows))
+        self.cos_lat = array('d', map(math.cos, self.lat_rad))
+
+        self.cells = defaultdict(list)
+        for i, row in enumerate(self.rows):
+            self.cells[self._lat_cell(row['lat']), self._lng_cell(row['lng'])].append(i)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _lat_cell(self, lat):
+        return math.floor(lat / self.cell_deg)
+
+    def _lng_cell(self, lng):
+        return math.floor((lng + 180) / self.cell_deg) % self.lng_cells
+
+    def _candidates(self, south, north, west, east, min_count):
+        """Row indices in cells overlapping the box; west > east wraps the antimeridian."""
+        if east - west >= 360:
+            lng_cells = range(self.lng_cells)
+        else:
+            first = self._lng_cell(west)
+            n = math.floor((east - west) / self.cell_deg) + 2
+            if west > east:
+                n = math.floor((east + 360 - west) / self.cell_deg) + 2
+            lng_cells = [(first + i) % self.lng_cells for i in range(min(n, self.lng_cells))]
+
+        counts = self.counts
+        found = []
+        for lat_cell in range(self._lat_cell(max(south, -90)), self._lat_cell(min(north, 90)) + 1):
+            for lng_cell in lng_cells:
+                for i in self.cells.get((lat_cell, lng_cell), ()):
+                    if counts[i] >= min_count:
+                        found.append(i)
+        return found
+
+    def distances(self, lat, lng, indices):
+        """Haversine distances in km from (lat, lng) to each indexed row."""
+        lat1 = math.radians(lat)
+        lng1 = math.radians(lng)
+        cos1 = math.cos(lat1)
+        lat_rad, lng_rad, cos_lat = self.lat_rad, self.lng_rad, self.cos_lat
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        return [2 * EARTH_RADIUS_KM * asin(sqrt(min(1.0, sin((lat_rad[i] - lat1) / 2) ** 2 +
+                                                    cos1 * cos_lat[i] * sin((lng_rad[i] - lng1) / 2) ** 2)))
+                for i in indices]
+
+    def within(self, lat, lng, radius_km, min_count=1):
+        """(distance_km, row index) for rows within radius_km of (lat, lng)."""
+        lat_span = radius_km / KM_PER_DEGREE
+        south, north = lat - lat_span, lat + lat_span
+        # Longitude degrees shrink with cos(latitude); near the poles take every cell
+        cos_edge = math.cos(math.radians(min(max(abs(south), abs(north)), 90)))
+        if south <= -90 or north >= 90 or cos_edge < 1e-6 or lat_span / cos_edge >= 180:
+            west, east = -180, 180
+        else:
+            lng_span = lat_span / cos_edge
+            west, east = lng - lng_span, lng + lng_span
+            if west < -180:
+                west += 360
+            if east > 180:
+                east -= 360
+
+        indices = self._candidates(south, north, west, east, min_count)
+        return [(d, i) for d, i in zip(self.distances(lat, lng, indices), indices) if d <= radius_km]
+
+    def _result(self, i, distance=None):
+        row = dict(self.rows[i])
+        if distance is not None:
+            row['distance_km'] = round(distance, 3)
+        return row
+
+    def _rank_by_count(self, hits, limit):
+        hits.sort(key=lambda hit: (-self.counts[hit[1]], self.rows[hit[1]].get('location_key', '')))
+        return [self._result(i, d) for d, i in hits[:limit]]
+
+    def radius(self, lat, lng, radius_km, limit=100, min_count=1):
+        """Rows within radius_km, highest count first."""
+        return self._rank_by_count(self.within(lat, lng, radius_km, min_count), limit)
+
+    def nearest(self, lat, lng, k=10, min_count=1):
+        """The k rows closest to (lat, lng), nearest first."""
+        radius_km = 25.0
+        while True:
+            hits = self.within(lat, lng, radius_km, min_count)
+            if len(hits) >= k or radius_km >= MAX_DISTANCE_KM:
+                break
+            radius_km = min(radius_km * 4, MAX_DISTANCE_KM)
+        hits.sort()
+        return [self._result(i, d) for d, i in hits[:k]]
+
+    def bbox(self, south, west, north, east, limit=100, min_count=1):
+        """Rows inside a bounding box (west > east crosses the antimeridian), highest count first."""
+        hits = []
+        for i in self._candidates(south, north, west, east, min_count):
+            row = self.rows[i]
+            if not south <= row['lat'] <= north:
+                continue
+            lng = row['lng']
+            if (west <= lng <= east) if west <= east else (lng >= west or lng <= east):
+                hits.append((None, i))
+        return self._rank_by_count(hits, limit)
+
+
+class SpatialIndexCache:
+    """
+    A GridIndex over load_rows(), rebuilt when generation() changes.
+    The generation is checked at most once per check_interval seconds.
+    """
+
+    def __init__(self, load_rows, generation, check_interval=5.0):
+        self.load_rows = load_rows
+        self.generation = generation
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.index = None
+        self.built_generation = None
+        self.checked = 0
+
+    def current(self):
+        if self.index is None or time.monotonic() - self.checked >= self.check_interval:
+            with self.lock:
+                now = time.monotonic()
+                if self.index is None or now - self.checked >= self.check_interval:
+                    self.checked = now
+                    generation = self.generation()
+                    if self.index is None or generation != self.built_generation:
+                        start = time.perf_counter()
+                        self.index = GridIndex(self.load_rows())
+                        self.built_generation = generation
+                        print(f"Built spatial index over {len(self.index)} locations "
+                              f"in {time.perf_counter() - start:.2f}s (generation {generation})")
+        return self.index
@@ -0,0 +1,69 @@
+"""
+Warm-start snapshots of fully built extractors.
+
+Building an extractor parses the gazetteer JSON files, interns every location
+and compiles its patterns. save_warm_start pickles the built extractor once;
+load_warm_start restores it in a fraction of that time. A snapshot records
+the size and mtime of its source files (the data files and the extractor
+modules) and the extractor's parameters, and is ignored once any of them
+change.
+"""
+
+import os
+import pickle
+import sys
+
+WARM_START_VERSION = 1
+
+
+def source_signature(paths):
+    """(path, size, mtime_ns) for each source file; missing files are recorded as absent."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return signature
+
+
+def module_files(*classes):
+    """Source files of the modules defining the given classes."""
+    return [sys.modules[cls.__module__].__file__ for cls in classes]
+
+
+def save_warm_start(path, extractor, sources, params):
+    """Atomically write a built extractor with the signature of its sources."""
+    # Uncompressed: loading speed matters more than size here
+    data = pickle.dumps({
+        'version': WARM_START_VERSION,
+        'sources': source_signature(sources),
+        'params': params,
+        'extractor': extractor
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_warm_start(path, sources, params):
+    """The extractor saved at path, or None if there is none or it is out of date."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+        print(f"Ignoring unreadable warm-start snapshot {path}: {e}")
+        return None
+    if (snapshot.get('version') != WARM_START_VERSION or
+            snapshot.get('params') != params or
+            snapshot.get('sources') != source_signature(sources)):
+        print(f"Warm-start snapshot {path} is out of date; rebuilding")
+        return None
+    return snapshot['extractor']
@@ -0,0 +1,86 @@
+"""
+World city gazetteer as normalized record arrays.
+
+data/world_gazetteer.json (built by setup_world_data.py) holds one array per
+field with one entry per city, and a single index from each normalized alias
+("name, country", "ascii name, country", "name, cc", "ascii name, cc") to the
+city's record ID. WorldGazetteer answers the same keys as the older
+world_locations.json dict, which stored a full copy of the city under every
+alias.
+"""
+
+import json
+from collections.abc import Mapping
+
+WORLD_GAZETTEER_FILE = 'world_gazetteer.json'
+
+
+def alias_keys(name, ascii_name, country_name, country_code):
+    """Lookup keys for a city, in priority order."""
+    return (
+        f"{name}, {country_name}".lower(),
+        f"{ascii_name}, {country_name}".lower(),
+        f"{name}, {country_code}".lower(),
+        f"{ascii_name}, {country_code}".lower(),
+    )
+
+
+class WorldGazetteer(Mapping):
+    """Read-only mapping of city aliases to records; iter_cities() yields each city once."""
+
+    def __init__(self, data):
+        self.names = data['name']
+        self.ascii_names = data['ascii_name']
+        self.country_codes = data['country_code']
+        self.lats = data['lat']
+        self.lngs = data['lng']
+        self.populations = data['population']
+        self.country_names = data['countries']
+        self.index = data['index']
+        self._records = [None] * len(self.names)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def record(self, record_id):
+        """City record in the world_locations.json layout."""
+        record = self._records[record_id]
+        if record is None:
+            code = self.country_codes[record_id]
+            record = self._records[record_id] = {
+                'name': self.names[record_id],
+                'ascii_name': self.ascii_names[record_id],
+                'country': self.country_names[code],
+                'country_code': code,
+                'lat': self.lats[record_id],
+                'lng': self.lngs[record_id],
+                'population': self.populations[record_id],
+                'type': 'city'
+            }
+        return record
+
+    def get(self, key, default=None):
+        record_id = self.index.get(key)
+        return default if record_id is None else self.record(record_id)
+
+    def __getitem__(self, key):
+        return self.record(self.index[key])
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def cities(self):
+        """Number of distinct cities."""
+        return len(self.names)
+
+    def iter_cities(self):
+        """One record per city, in record ID order (values() has one per alias)."""
+        return (self.record(record_id) for record_id in range(len(self.names)))